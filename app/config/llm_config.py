@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, Optional
+import threading
 
 class LLMRuntimeConfig(BaseModel):
     provider: str = Field(default="openai")
@@ -15,3 +16,19 @@ llm_config = LLMRuntimeConfig(
     api_key=os.environ.get("OPENAI_API_KEY"),
     api_base=os.environ.get("OPENAI_API_BASE")
 )
+
+# Guards multi-field updates so readers never see half of a profile switch
+_llm_config_lock = threading.Lock()
+
+
+def update_llm_config(values: Dict[str, Any]) -> None:
+    """Apply several fields to ``llm_config`` as one change."""
+    with _llm_config_lock:
+        for key, value in values.items():
+            setattr(llm_config, key, value)
+
+
+def llm_config_snapshot() -> LLMRuntimeConfig:
+    """Return a consistent copy of ``llm_config`` for the duration of one call."""
+    with _llm_config_lock:
+        return llm_config.model_copy()
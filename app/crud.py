@@ -12,13 +12,35 @@ Both helpers intentionally keep persona and bio separate to avoid cross-contamin
 between UI descriptions and prompt personas.
 """
 
-from typing import List, Optional
+import html
+import json
+import re
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 
-from sqlalchemy import or_
+from sqlalchemy import delete, func, insert, literal, or_, select, update
 from sqlalchemy import text
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, lazyload, selectinload
 
 from app import models, schemas
+from app.database import engine as chat_engine
+from app.services import write_behind
+
+
+def _flush_or_commit(db: Session, obj: Any, commit: bool) -> None:
+    """
+    Flush ``obj`` so its generated id is available, then optionally commit.
+
+    With ``commit=False`` the id comes back from the INSERT itself and no
+    refresh SELECT is issued; callers batching several writes commit once.
+    ``commit=True`` keeps the old commit-and-refresh contract for routes
+    that return the ORM instance directly.
+    """
+    db.flush()
+    if commit:
+        db.commit()
+        db.refresh(obj)
 
 
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
@@ -59,7 +81,7 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
+def create_user(db: Session, user: schemas.UserCreate, commit: bool = True) -> models.User:
     """
     Create and persist a new user.
 
@@ -69,19 +91,38 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
         Chat database session.
     user : app.schemas.UserCreate
         Validated user payload with hashed password.
+    commit : bool
+        Commit immediately; pass False to leave the row flushed in the
+        caller's unit of work.
 
     Returns
     -------
     app.models.User
-        Newly created user.
+        Newly created user (id assigned).
     """
     db_user = models.User(username=user.username, hashed_password=user.hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    _flush_or_commit(db, db_user, commit)
     return db_user
 
 
+def update_user_password_hash(db: Session, user: models.User, hashed_password: str) -> None:
+    """
+    Replace a user's stored password hash, e.g. after a rehash on login.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    user : app.models.User
+        User to update.
+    hashed_password : str
+        New hash.
+    """
+    user.hashed_password = hashed_password
+    db.commit()
+
+
 def get_all_chats(db: Session, limit: int = 100) -> List[models.Chat]:
     """
     Return the most recent chats, newest first.
@@ -151,6 +192,8 @@ def get_messages_by_thread(db: Session, thread_id: int, limit: int = 50) -> List
     list[app.models.Chat]
         Chat rows ordered by timestamp asc.
     """
+    # Read-your-writes: land any queued rows for this thread first
+    write_behind.queue.barrier(thread_id)
     return (
         db.query(models.Chat)
         .filter(models.Chat.thread_id == thread_id)
@@ -160,7 +203,7 @@ def get_messages_by_thread(db: Session, thread_id: int, limit: int = 50) -> List
     )
 
 
-def create_chat_message(db: Session, chat: schemas.ChatMessageCreate) -> models.Chat:
+def create_chat_message(db: Session, chat: schemas.ChatMessageCreate, commit: bool = True) -> models.Chat:
     """
     Create and persist a chat message.
 
@@ -170,11 +213,14 @@ def create_chat_message(db: Session, chat: schemas.ChatMessageCreate) -> models.
         Chat database session.
     chat : app.schemas.ChatMessageCreate
         Message payload.
+    commit : bool
+        Commit immediately; pass False to leave the row flushed in the
+        caller's unit of work.
 
     Returns
     -------
     app.models.Chat
-        Newly created message.
+        Newly created message (id assigned).
     """
     db_chat = models.Chat(
         user_id=chat.user_id,
@@ -186,11 +232,46 @@ def create_chat_message(db: Session, chat: schemas.ChatMessageCreate) -> models.
         summary_of=chat.summary_of,
     )
     db.add(db_chat)
-    db.commit()
-    db.refresh(db_chat)
+    _flush_or_commit(db, db_chat, commit)
     return db_chat
 
 
+def queue_chat_messages(db: Session, chats: List[schemas.ChatMessageCreate]) -> bool:
+    """
+    Persist chat messages through the write-behind queue.
+
+    In sync mode, or when the queue is full, the rows are inserted before
+    returning. In async mode they land on the next flush, and
+    :func:`get_messages_by_thread` flushes them first.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session; only its engine is used.
+    chats : list[app.schemas.ChatMessageCreate]
+        Messages in conversation order, all for the same thread.
+
+    Returns
+    -------
+    bool
+        True if the rows were queued rather than written.
+    """
+    rows = [
+        {
+            "user_id": c.user_id,
+            "role": c.role,
+            "message": c.message,
+            "model_used": c.model_used,
+            "source_page": c.source_page,
+            "thread_id": c.thread_id,
+            "summary_of": c.summary_of,
+        }
+        for c in chats
+    ]
+    thread_id = chats[0].thread_id if chats else None
+    return write_behind.queue.write(db.get_bind(), models.Chat, rows, thread_id=thread_id)
+
+
 def get_thread_by_id(db: Session, thread_id: int) -> Optional[models.Thread]:
     """
     Return a thread by id.
@@ -210,6 +291,42 @@ def get_thread_by_id(db: Session, thread_id: int) -> Optional[models.Thread]:
     return db.query(models.Thread).filter(models.Thread.id == thread_id).first()
 
 
+def get_first_messages_by_threads(db: Session, thread_ids: List[int]) -> dict:
+    """
+    Return the earliest message of each thread in a single query.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    thread_ids : list[int]
+        Thread ids.
+
+    Returns
+    -------
+    dict[int, app.models.Chat]
+        First message per thread id; threads without messages are absent.
+    """
+    if not thread_ids:
+        return {}
+    for thread_id in thread_ids:
+        write_behind.queue.barrier(thread_id)
+    ranked = (
+        select(
+            models.Chat.id.label("chat_id"),
+            func.row_number()
+            .over(partition_by=models.Chat.thread_id, order_by=(models.Chat.timestamp.asc(), models.Chat.id.asc()))
+            .label("rn"),
+        )
+        .where(models.Chat.thread_id.in_(thread_ids))
+        .subquery()
+    )
+    rows = db.execute(
+        select(models.Chat).join(ranked, ranked.c.chat_id == models.Chat.id).where(ranked.c.rn == 1)
+    ).scalars()
+    return {row.thread_id: row for row in rows}
+
+
 def get_threads_by_user(db: Session, user_id: int) -> List[models.Thread]:
     """
     Return all threads for a user, newest first.
@@ -234,7 +351,7 @@ def get_threads_by_user(db: Session, user_id: int) -> List[models.Thread]:
     )
 
 
-def create_thread(db: Session, thread: schemas.ThreadCreate) -> models.Thread:
+def create_thread(db: Session, thread: schemas.ThreadCreate, commit: bool = True) -> models.Thread:
     """
     Create and persist a new thread.
 
@@ -244,11 +361,14 @@ def create_thread(db: Session, thread: schemas.ThreadCreate) -> models.Thread:
         Chat database session.
     thread : app.schemas.ThreadCreate
         Thread payload.
+    commit : bool
+        Commit immediately; pass False to leave the row flushed in the
+        caller's unit of work.
 
     Returns
     -------
     app.models.Thread
-        Newly created thread.
+        Newly created thread (id assigned).
     """
     db_thread = models.Thread(
         user_id=thread.user_id,
@@ -256,8 +376,7 @@ def create_thread(db: Session, thread: schemas.ThreadCreate) -> models.Thread:
         figure_slug=thread.figure_slug,
     )
     db.add(db_thread)
-    db.commit()
-    db.refresh(db_thread)
+    _flush_or_commit(db, db_thread, commit)
     return db_thread
 
 
@@ -281,6 +400,8 @@ def get_all_figures(db: Session, skip: int = 0, limit: int = 100) -> List[models
     """
     return (
         db.query(models.HistoricalFigure)
+        # Listing never shows contexts; skip the selectin load of every figure's chunks
+        .options(lazyload(models.HistoricalFigure.contexts))
         .order_by(models.HistoricalFigure.name.asc())
         .offset(skip)
         .limit(limit)
@@ -404,32 +525,114 @@ def get_figure_persona(db: Session, slug: str) -> str:
     return ""
 
 
-def search_figures(db: Session, query: str, limit: int = 20) -> List[models.HistoricalFigure]:
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# bm25() weights, in FIGURE_FTS_COLUMNS order: name, slug, era, roles, main_site, short_summary
+_FTS_WEIGHTS = (10.0, 6.0, 1.0, 2.0, 2.0, 1.0)
+_SNIPPET_OPEN, _SNIPPET_CLOSE = "\x02", "\x03"
+
+
+def _fts_match_expression(query: str, mode: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH string (quoted terms, optional prefix)."""
+    terms = _FTS_TOKEN_RE.findall(query)
+    if not terms:
+        return None
+    suffix = "*" if mode == "prefix" else ""
+    return " ".join(f'"{t}"{suffix}' for t in terms[:8])
+
+
+def _highlight(raw: Optional[str]) -> Optional[str]:
+    """HTML-escape an FTS snippet and turn its match markers into <mark> tags."""
+    if not raw:
+        return None
+    escaped = html.escape(raw)
+    return escaped.replace(_SNIPPET_OPEN, "<mark>").replace(_SNIPPET_CLOSE, "</mark>")
+
+
+def search_figures_ranked(
+    db: Session, query: str, limit: int = 20, mode: str = "prefix"
+) -> List[Tuple[models.HistoricalFigure, Optional[float], Optional[str]]]:
     """
-    Return up to `limit` figures matching the query by name or slug.
+    Search figures through the FTS5 index, best matches first.
 
     Parameters
     ----------
     db : sqlalchemy.orm.Session
         Figures database session.
     query : str
-        Case-insensitive substring to match in name or slug.
+        Free text; punctuation is ignored and every term must match.
     limit : int
         Maximum rows to return.
+    mode : str
+        ``"prefix"`` treats every term as a prefix (typeahead);
+        ``"fulltext"`` matches whole tokens only.
 
     Returns
     -------
-    list[app.models.HistoricalFigure]
-        Matching figures ordered by name.
+    list[tuple[app.models.HistoricalFigure, float | None, str | None]]
+        ``(figure, bm25 score, highlighted snippet)``. Lower scores rank
+        higher. Score and snippet are None when FTS5 is unavailable and
+        the LIKE fallback was used.
     """
-    q = f"%{query.strip()}%"
-    return (
-        db.query(models.HistoricalFigure)
-        .filter(or_(models.HistoricalFigure.name.ilike(q), models.HistoricalFigure.slug.ilike(q)))
-        .order_by(models.HistoricalFigure.name.asc())
-        .limit(limit)
-        .all()
+    match = _fts_match_expression(query, mode)
+    if match is None:
+        return []
+    weights = ", ".join(str(w) for w in _FTS_WEIGHTS)
+    sql = text(
+        "SELECT f.rowid AS id, "
+        f"bm25(historical_figures_fts, {weights}) AS score, "
+        f"snippet(historical_figures_fts, -1, :open, :close, '…', 12) AS snip "
+        "FROM historical_figures_fts AS f "
+        "WHERE historical_figures_fts MATCH :match "
+        "ORDER BY score LIMIT :limit"
     )
+    try:
+        rows = db.execute(sql, {"match": match, "limit": limit, "open": _SNIPPET_OPEN, "close": _SNIPPET_CLOSE}).all()
+    except OperationalError:
+        # No FTS5 table (older database or SQLite without FTS5): substring scan
+        db.rollback()
+        like = f"%{query.strip()}%"
+        figures = (
+            db.query(models.HistoricalFigure)
+            .options(lazyload(models.HistoricalFigure.contexts))
+            .filter(or_(models.HistoricalFigure.name.ilike(like), models.HistoricalFigure.slug.ilike(like)))
+            .order_by(models.HistoricalFigure.name.asc())
+            .limit(limit)
+            .all()
+        )
+        return [(f, None, None) for f in figures]
+    if not rows:
+        return []
+    by_id = {
+        f.id: f
+        for f in db.query(models.HistoricalFigure)
+        .options(lazyload(models.HistoricalFigure.contexts))
+        .filter(models.HistoricalFigure.id.in_([r.id for r in rows]))
+        .all()
+    }
+    return [(by_id[r.id], float(r.score), _highlight(r.snip)) for r in rows if r.id in by_id]
+
+
+def search_figures(db: Session, query: str, limit: int = 20, mode: str = "prefix") -> List[models.HistoricalFigure]:
+    """
+    Return up to `limit` figures matching the query, most relevant first.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session.
+    query : str
+        Search text matched against name, slug, era, roles, main site and summary.
+    limit : int
+        Maximum rows to return.
+    mode : str
+        ``"prefix"`` (typeahead) or ``"fulltext"``.
+
+    Returns
+    -------
+    list[app.models.HistoricalFigure]
+        Matching figures ordered by BM25 relevance.
+    """
+    return [fig for fig, _, _ in search_figures_ranked(db, query, limit=limit, mode=mode)]
 
 
 # Favorites CRUD
@@ -437,7 +640,7 @@ def get_favorites_by_user(db: Session, user_id: int) -> List[models.Favorite]:
     return db.query(models.Favorite).filter(models.Favorite.user_id == user_id).all()
 
 
-def add_favorite(db: Session, user_id: int, figure_slug: str) -> models.Favorite:
+def add_favorite(db: Session, user_id: int, figure_slug: str, commit: bool = True) -> models.Favorite:
     existing = (
         db.query(models.Favorite)
         .filter(models.Favorite.user_id == user_id, models.Favorite.figure_slug == figure_slug)
@@ -447,8 +650,7 @@ def add_favorite(db: Session, user_id: int, figure_slug: str) -> models.Favorite
         return existing
     fav = models.Favorite(user_id=user_id, figure_slug=figure_slug)
     db.add(fav)
-    db.commit()
-    db.refresh(fav)
+    _flush_or_commit(db, fav, commit)
     return fav
 
 
@@ -463,3 +665,223 @@ def remove_favorite(db: Session, user_id: int, figure_slug: str) -> bool:
     db.delete(fav)
     db.commit()
     return True
+
+
+# Guest sessions
+def reserve_guest_question(
+    db: Session, session_token: str, max_questions: int, now: datetime
+) -> Optional[Tuple[int, Optional[str], int]]:
+    """
+    Atomically claim one question from a guest session's quota.
+
+    A single conditional UPDATE increments ``question_count`` only while it is
+    below ``max_questions`` and the session has not expired, so concurrent
+    requests on the same cookie cannot overspend the quota.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    session_token : str
+        Guest cookie value.
+    max_questions : int
+        Per-session question limit.
+    now : datetime.datetime
+        Current UTC time (naive, matching stored values).
+
+    Returns
+    -------
+    tuple[int, str | None, int] | None
+        ``(session_id, figure_slug, question_count_after)``, or None when the
+        session is unknown, expired or out of questions.
+    """
+    gs = models.GuestSession
+    row = db.execute(
+        update(gs)
+        .where(
+            gs.session_token == session_token,
+            gs.question_count < max_questions,
+            or_(gs.expires_at.is_(None), gs.expires_at > now),
+        )
+        .values(question_count=gs.question_count + 1)
+        .returning(gs.id, gs.figure_slug, gs.question_count)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return (row[0], row[1], row[2]) if row else None
+
+
+def release_guest_question(db: Session, session_id: int) -> None:
+    """
+    Return a quota slot claimed by :func:`reserve_guest_question` (e.g. after an LLM failure).
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    session_id : int
+        Guest session id.
+    """
+    gs = models.GuestSession
+    db.execute(
+        update(gs)
+        .where(gs.id == session_id, gs.question_count > 0)
+        .values(question_count=gs.question_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def get_guest_history(db: Session, session_id: int) -> List[dict]:
+    """
+    Return a guest transcript as ``{"role", "message"}`` dicts, oldest first.
+
+    Only the two columns needed for prompt assembly are selected.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    session_id : int
+        Guest session id.
+
+    Returns
+    -------
+    list[dict]
+        Transcript entries.
+    """
+    gm = models.GuestMessage
+    rows = db.execute(
+        select(gm.role, gm.message).where(gm.session_id == session_id).order_by(gm.id.asc())
+    ).all()
+    return [{"role": r.role, "message": r.message} for r in rows]
+
+
+def add_guest_turn(db: Session, session_id: int, user_message: str, answer: str, model_used: Optional[str]) -> None:
+    """
+    Persist a guest question and its answer in one transaction.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    session_id : int
+        Guest session id.
+    user_message : str
+        Guest question.
+    answer : str
+        Assistant answer.
+    model_used : str | None
+        Model that produced the answer.
+    """
+    db.add_all(
+        [
+            models.GuestMessage(session_id=session_id, role="user", message=user_message, model_used=model_used),
+            models.GuestMessage(session_id=session_id, role="assistant", message=answer, model_used=model_used),
+        ]
+    )
+    db.commit()
+
+
+def transfer_guest_transcript(
+    db: Session, session_id: int, user_id: int, title: str, figure_slug: Optional[str]
+) -> Optional[Tuple[int, int]]:
+    """
+    Move a guest transcript into a new user thread in one transaction.
+
+    The thread row, the copied messages (INSERT ... SELECT, keeping each
+    message's original timestamp and order) and the deletion of the guest
+    rows are committed together, so a failure leaves nothing half-migrated.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    session_id : int
+        Guest session id.
+    user_id : int
+        Receiving user id.
+    title : str
+        Title for the new thread.
+    figure_slug : str | None
+        Figure slug for the new thread.
+
+    Returns
+    -------
+    tuple[int, int] | None
+        ``(thread_id, transferred_messages)``, or None if the session was
+        already upgraded or removed concurrently.
+    """
+    gm = models.GuestMessage
+    try:
+        thread_id = db.execute(
+            insert(models.Thread)
+            .values(user_id=user_id, title=title, figure_slug=figure_slug)
+            .returning(models.Thread.id)
+        ).scalar_one()
+        copied = db.execute(
+            insert(models.Chat).from_select(
+                ["user_id", "role", "message", "model_used", "thread_id", "timestamp"],
+                select(
+                    literal(user_id),
+                    gm.role,
+                    gm.message,
+                    gm.model_used,
+                    literal(thread_id),
+                    func.coalesce(gm.timestamp, func.current_timestamp()),
+                )
+                .where(gm.session_id == session_id)
+                .order_by(gm.id.asc()),
+            )
+        ).rowcount
+        db.execute(delete(gm).where(gm.session_id == session_id))
+        removed = db.execute(delete(models.GuestSession).where(models.GuestSession.id == session_id)).rowcount
+        if removed != 1:
+            db.rollback()
+            return None
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return thread_id, copied
+
+
+def add_audit_log(
+    db: Optional[Session],
+    actor_user_id: int,
+    action: str,
+    object_type: str,
+    object_id: Optional[str] = None,
+    diff: Optional[dict] = None,
+    ip: Optional[str] = None,
+) -> None:
+    """
+    Record an administrative action through the write-behind queue.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session | None
+        Chat database session whose engine receives the row; None uses the
+        default chat engine (for routers that only hold a figures session).
+    actor_user_id : int
+        Admin performing the action.
+    action : str
+        Verb such as ``"update"`` or ``"delete"``.
+    object_type : str
+        Kind of object acted on, e.g. ``"figure_context"``.
+    object_id : str | None
+        Identifier of the object.
+    diff : dict | None
+        Changed fields, stored as JSON.
+    ip : str | None
+        Client address.
+    """
+    row = {
+        "actor_user_id": actor_user_id,
+        "action": action,
+        "object_type": object_type,
+        "object_id": object_id,
+        "diff_json": json.dumps(diff, default=str) if diff is not None else None,
+        "ip": ip,
+    }
+    write_behind.queue.write(db.get_bind() if db is not None else chat_engine, models.AuditLog, [row])
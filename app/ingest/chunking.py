@@ -0,0 +1,383 @@
+"""
+Token-aware text chunking for RAG ingestion.
+
+Chunks are sized in embedding-model tokens rather than words so that each
+chunk fits inside the embedding window of ``all-MiniLM-L6-v2`` (256 word
+pieces) instead of being silently truncated at embed time. Boundaries follow
+sentence, paragraph or heading structure, and every chunk records its
+character offsets in the source text.
+
+Strategies
+----------
+sentence
+    Pack whole sentences up to the token budget.
+paragraph
+    Pack whole paragraphs; oversized paragraphs fall back to sentences.
+heading
+    Like ``paragraph``, but never lets a chunk cross a section heading
+    (Markdown ``#``, wiki ``== x ==`` or ALL-CAPS lines).
+
+Environment
+-----------
+RAG_CHUNK_STRATEGY : str
+    Default strategy name (default "paragraph").
+RAG_CHUNK_MAX_TOKENS : int
+    Token budget per chunk (default 200).
+RAG_CHUNK_OVERLAP_TOKENS : int
+    Tokens of trailing context repeated at the start of the next chunk (default 32).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Span = Tuple[int, int]
+TokenCounter = Callable[[str], int]
+SpanStrategy = Callable[[str, "ChunkerConfig", TokenCounter], Iterator[Span]]
+
+_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+_WORD_RE = re.compile(r"\S+")
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])[\"'\)\]]*\s+(?=[\"'\(\[]?[A-Z0-9])|\n\s*\n|\n(?=\s*[-*•]\s)")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n\s*")
+_HEADING_RE = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]+\S.*|=+[ \t]*\S.*?[ \t]*=+|[A-Z][A-Z0-9 ,'&:\-]{2,80})[ \t]*$",
+    re.M,
+)
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """
+    A chunk of source text with its position.
+
+    Attributes
+    ----------
+    text : str
+        Chunk text, equal to ``source[start:end]``.
+    start : int
+        Character offset of the first character in the source.
+    end : int
+        Character offset one past the last character.
+    index : int
+        Zero-based position of the chunk within the document.
+    token_count : int
+        Token count according to the active counter.
+    """
+
+    text: str
+    start: int
+    end: int
+    index: int
+    token_count: int
+
+
+@dataclass(frozen=True)
+class ChunkerConfig:
+    """
+    Chunking parameters.
+
+    Attributes
+    ----------
+    strategy : str
+        Registered strategy name.
+    max_tokens : int
+        Token budget per chunk.
+    overlap_tokens : int
+        Trailing tokens repeated at the start of the next chunk.
+    """
+
+    strategy: str = "paragraph"
+    max_tokens: int = 200
+    overlap_tokens: int = 32
+
+    @classmethod
+    def from_env(cls, strategy: Optional[str] = None) -> "ChunkerConfig":
+        """
+        Build a config from RAG_CHUNK_* environment variables.
+
+        Parameters
+        ----------
+        strategy : str | None
+            Overrides RAG_CHUNK_STRATEGY when given.
+
+        Returns
+        -------
+        ChunkerConfig
+            Validated configuration.
+        """
+        name = (strategy or os.getenv("RAG_CHUNK_STRATEGY") or cls.strategy).strip().lower()
+        if name not in _STRATEGIES:
+            raise ValueError(f"Unknown chunk strategy '{name}'. Available: {', '.join(sorted(_STRATEGIES))}")
+        max_tokens = max(16, int(os.getenv("RAG_CHUNK_MAX_TOKENS", str(cls.max_tokens)) or cls.max_tokens))
+        overlap = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", str(cls.overlap_tokens)) or cls.overlap_tokens)
+        return cls(strategy=name, max_tokens=max_tokens, overlap_tokens=max(0, min(overlap, max_tokens // 2)))
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Estimate WordPiece tokens without loading a tokenizer.
+
+    Each word or punctuation mark counts as one token, plus one extra per
+    six characters beyond the first six in long words, which tracks
+    MiniLM's tokenizer closely on English prose.
+
+    Parameters
+    ----------
+    text : str
+        Input text.
+
+    Returns
+    -------
+    int
+        Estimated token count.
+    """
+    n = 0
+    for m in _PIECE_RE.finditer(text):
+        n += 1 + max(0, len(m.group()) - 6) // 6
+    return n
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    """
+    Return the embedding model's tokenizer as a counter when available locally.
+
+    Only locally cached tokenizer files are used (no network). Falls back to
+    :func:`approximate_token_count`.
+
+    Returns
+    -------
+    callable
+        ``(text) -> int`` token counter.
+    """
+    try:
+        from transformers import AutoTokenizer
+
+        tok = AutoTokenizer.from_pretrained(_EMBEDDING_MODEL, local_files_only=True)
+
+        def _count(text: str) -> int:
+            return len(tok.encode(text, add_special_tokens=False, truncation=False))
+
+        return _count
+    except Exception:
+        return approximate_token_count
+
+
+def _trimmed(source: str, start: int, end: int) -> Optional[Span]:
+    while start < end and source[start].isspace():
+        start += 1
+    while end > start and source[end - 1].isspace():
+        end -= 1
+    return (start, end) if end > start else None
+
+
+def _split_spans(source: str, start: int, end: int, pattern: re.Pattern) -> Iterator[Span]:
+    pos = start
+    for m in pattern.finditer(source, start, end):
+        span = _trimmed(source, pos, m.start())
+        if span:
+            yield span
+        pos = m.end()
+    span = _trimmed(source, pos, end)
+    if span:
+        yield span
+
+
+def _pack(
+    source: str,
+    spans: Iterable[Span],
+    cfg: ChunkerConfig,
+    count: TokenCounter,
+    split_long: Optional[Callable[[Span], Iterator[Span]]] = None,
+) -> Iterator[Span]:
+    """Greedily merge consecutive spans up to the token budget, with span-level overlap."""
+    buf: List[Tuple[int, int, int]] = []
+    total = 0
+    for s, e in spans:
+        t = count(source[s:e])
+        if t > cfg.max_tokens and split_long is not None:
+            if buf:
+                yield buf[0][0], buf[-1][1]
+                buf, total = [], 0
+            yield from split_long((s, e))
+            continue
+        if buf and total + t > cfg.max_tokens:
+            yield buf[0][0], buf[-1][1]
+            keep: List[Tuple[int, int, int]] = []
+            kept = 0
+            for item in reversed(buf):
+                if kept + item[2] > cfg.overlap_tokens:
+                    break
+                keep.insert(0, item)
+                kept += item[2]
+            buf, total = keep, kept
+            while buf and total + t > cfg.max_tokens:
+                total -= buf.pop(0)[2]
+        buf.append((s, e, t))
+        total += t
+    if buf:
+        yield buf[0][0], buf[-1][1]
+
+
+def _word_windows(source: str, span: Span, cfg: ChunkerConfig, count: TokenCounter) -> Iterator[Span]:
+    words = ((m.start(), m.end()) for m in _WORD_RE.finditer(source, span[0], span[1]))
+    return _pack(source, words, cfg, count)
+
+
+def _sentence_spans(source: str, span: Span, cfg: ChunkerConfig, count: TokenCounter) -> Iterator[Span]:
+    sentences = _split_spans(source, span[0], span[1], _SENTENCE_BREAK_RE)
+    return _pack(source, sentences, cfg, count, lambda sp: _word_windows(source, sp, cfg, count))
+
+
+def _paragraph_spans(source: str, span: Span, cfg: ChunkerConfig, count: TokenCounter) -> Iterator[Span]:
+    paragraphs = _split_spans(source, span[0], span[1], _PARAGRAPH_BREAK_RE)
+    return _pack(source, paragraphs, cfg, count, lambda sp: _sentence_spans(source, sp, cfg, count))
+
+
+def _section_bounds(source: str) -> Iterator[Span]:
+    starts = [m.start() for m in _HEADING_RE.finditer(source)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    for i, s in enumerate(starts):
+        e = starts[i + 1] if i + 1 < len(starts) else len(source)
+        if e > s:
+            yield s, e
+
+
+def _strategy_sentence(source: str, cfg: ChunkerConfig, count: TokenCounter) -> Iterator[Span]:
+    return _sentence_spans(source, (0, len(source)), cfg, count)
+
+
+def _strategy_paragraph(source: str, cfg: ChunkerConfig, count: TokenCounter) -> Iterator[Span]:
+    return _paragraph_spans(source, (0, len(source)), cfg, count)
+
+
+def _strategy_heading(source: str, cfg: ChunkerConfig, count: TokenCounter) -> Iterator[Span]:
+    for section in _section_bounds(source):
+        yield from _paragraph_spans(source, section, cfg, count)
+
+
+_STRATEGIES: Dict[str, SpanStrategy] = {
+    "sentence": _strategy_sentence,
+    "paragraph": _strategy_paragraph,
+    "heading": _strategy_heading,
+}
+
+
+def register_strategy(name: str, fn: SpanStrategy) -> None:
+    """
+    Register a custom chunking strategy.
+
+    Parameters
+    ----------
+    name : str
+        Strategy name used in configuration.
+    fn : callable
+        ``(source, config, counter) -> Iterator[(start, end)]``.
+    """
+    _STRATEGIES[name.strip().lower()] = fn
+
+
+def available_strategies() -> List[str]:
+    """Return registered strategy names."""
+    return sorted(_STRATEGIES)
+
+
+def iter_chunks(
+    text: str,
+    config: Optional[ChunkerConfig] = None,
+    counter: Optional[TokenCounter] = None,
+    *,
+    base_offset: int = 0,
+    start_index: int = 0,
+) -> Iterator[Chunk]:
+    """
+    Lazily split text into token-bounded chunks.
+
+    Parameters
+    ----------
+    text : str
+        Source text.
+    config : ChunkerConfig | None
+        Chunking parameters; defaults to :meth:`ChunkerConfig.from_env`.
+    counter : callable | None
+        Token counter; defaults to :func:`get_token_counter`.
+    base_offset : int
+        Added to chunk offsets (used when ``text`` is a slice of a larger document).
+    start_index : int
+        Index assigned to the first chunk.
+
+    Yields
+    ------
+    Chunk
+        Chunks in document order.
+    """
+    cfg = config or ChunkerConfig.from_env()
+    count = counter or get_token_counter()
+    idx = start_index
+    for s, e in _STRATEGIES[cfg.strategy](text, cfg, count):
+        body = text[s:e]
+        yield Chunk(text=body, start=base_offset + s, end=base_offset + e, index=idx, token_count=count(body))
+        idx += 1
+
+
+def stream_chunks(
+    pieces: Iterable[str],
+    config: Optional[ChunkerConfig] = None,
+    counter: Optional[TokenCounter] = None,
+    buffer_chars: int = 64 * 1024,
+) -> Iterator[Chunk]:
+    """
+    Chunk a long document delivered in pieces (e.g. PDF pages) with bounded memory.
+
+    Pieces are concatenated into a buffer; once it exceeds ``buffer_chars``
+    everything up to the last paragraph break is chunked and released.
+    Offsets refer to the concatenation of all pieces.
+
+    Parameters
+    ----------
+    pieces : Iterable[str]
+        Consecutive slices of the document.
+    config : ChunkerConfig | None
+        Chunking parameters.
+    counter : callable | None
+        Token counter.
+    buffer_chars : int
+        Approximate maximum characters held before flushing.
+
+    Yields
+    ------
+    Chunk
+        Chunks in document order.
+    """
+    cfg = config or ChunkerConfig.from_env()
+    count = counter or get_token_counter()
+    buf = ""
+    base = 0
+    idx = 0
+    for piece in pieces:
+        buf += piece
+        if len(buf) < buffer_chars:
+            continue
+        cut = -1
+        for m in _PARAGRAPH_BREAK_RE.finditer(buf):
+            cut = m.end()
+        if cut <= 0:
+            m = None
+            for m in _SENTENCE_BREAK_RE.finditer(buf):
+                pass
+            cut = m.end() if m else -1
+        if cut <= 0:
+            continue
+        head, buf = buf[:cut], buf[cut:]
+        for chunk in iter_chunks(head, cfg, count, base_offset=base, start_index=idx):
+            idx += 1
+            yield chunk
+        base += cut
+    if buf:
+        yield from iter_chunks(buf, cfg, count, base_offset=base, start_index=idx)
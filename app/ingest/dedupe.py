@@ -0,0 +1,82 @@
+"""
+Content fingerprints for figure-context deduplication.
+
+``content_sha256`` backs the exact-duplicate unique index on
+``figure_contexts (figure_slug, content_sha256)``. ``simhash64`` produces a
+64-bit locality-sensitive signature so near-duplicates (re-extracted PDFs,
+whitespace or punctuation changes) can be found by Hamming distance.
+
+The fingerprint functions live in :mod:`app.utils.fingerprint` and are
+re-exported here. SimHash costs far more than SHA-256, so it is only
+computed while near-duplicate filtering is on (RAG_NEAR_DUP_MAX_DISTANCE
+> 0, at most ``MAX_NEAR_DUP_DISTANCE``). Rows stored while it was off are
+fingerprinted lazily when it is next used.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+from app.utils.fingerprint import content_sha256, near_dup_max_distance, simhash64  # noqa: F401  (re-exported)
+
+_MASK64 = (1 << 64) - 1
+# Beyond this, bands get so narrow that nearly every signature is a candidate
+MAX_NEAR_DUP_DISTANCE = 15
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Return the number of differing bits between two 64-bit signatures."""
+    return bin((a ^ b) & _MASK64).count("1")
+
+
+class NearDuplicateIndex:
+    """
+    In-memory banded index over SimHash signatures.
+
+    Signatures are split into ``max_distance + 1`` disjoint bands covering
+    all 64 bits. By the pigeonhole principle any two signatures within
+    ``max_distance`` share at least one band exactly, so only band-mates
+    need a full Hamming comparison.
+    """
+
+    def __init__(self, max_distance: int = 3, signatures: Iterable[Optional[int]] = ()) -> None:
+        if not 0 <= max_distance <= MAX_NEAR_DUP_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_NEAR_DUP_DISTANCE}, got {max_distance}")
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        # Widths differ by at most one bit and sum to 64
+        widths = [64 // bands + (1 if i < 64 % bands else 0) for i in range(bands)]
+        self._slices = [(sum(widths[:i]), (1 << w) - 1) for i, w in enumerate(widths)]
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        for sig in signatures:
+            if sig is not None:
+                self.add(sig)
+
+    def _band_keys(self, sig: int) -> List[int]:
+        u = sig & _MASK64
+        return [(u >> shift) & mask for shift, mask in self._slices]
+
+    def add(self, sig: int) -> None:
+        """Insert a signature."""
+        for band, key in zip(self._bands, self._band_keys(sig)):
+            band.setdefault(key, []).append(sig)
+
+    def find(self, sig: int) -> Optional[int]:
+        """
+        Return an indexed signature within ``max_distance`` of ``sig``.
+
+        Parameters
+        ----------
+        sig : int
+            Query signature.
+
+        Returns
+        -------
+        int | None
+            A matching signature, or None.
+        """
+        for band, key in zip(self._bands, self._band_keys(sig)):
+            for other in band.get(key, ()):
+                if hamming_distance(sig, other) <= self.max_distance:
+                    return other
+        return None
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Response, status
+import anyio.to_thread
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, HTMLResponse
 import os
 from pathlib import Path
 
 from app import crud, models, schemas
+from app import models_llm_profile  # noqa: F401  (registers llm_profiles before create_all)
 from app.database import Base, engine as chat_engine, get_db_chat
 from app.figures_database import FigureBase, engine as figures_engine, FigureSessionLocal
 from sqlalchemy.orm import Session
@@ -21,16 +23,56 @@ from app.routers import figures as figures_router
 from app.routers import guest as guest_router
 from app.routers import admin_rag as admin_rag_router
 from app.routers import admin_llm as admin_llm_router
+from app.routers import admin_profile as admin_profile_router
 from app.routers import ask as ask_router
+from app.routers import metrics as metrics_router
+from app.services import auth_pool, embedding_jobs, llm_profiles, rate_limit, write_behind
+from app.services.guest_sweeper import sweeper as guest_sweeper
+from app.utils import metrics, sql_stats
+from app.utils.migrations import migrate_figure_tables, migrate_guest_tables, migrate_llm_profile_tables
 from app.utils.security import get_current_user
-
-
-app = FastAPI(title="Places in Time History Chat")
+from app.utils.static_assets import StaticAssetStore
+from app.utils.profiler import ProfilerMiddleware, profiler
+from app.utils.timing import TimingMiddleware
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    # Queued LLM callers hold sync threadpool threads; leave room for other routes
+    rate_limit.fit_to_threadpool(anyio.to_thread.current_default_thread_limiter().total_tokens)
+    # Background workers run per process; they coordinate through the databases.
+    llm_profiles.cache.start(chat_engine)
+    embedding_jobs.workers.start()
+    guest_sweeper.start(chat_engine)
+    write_behind.queue.start()
+    static_assets.preload()
+    metrics.registry.start()
+    try:
+        yield
+    finally:
+        # Flush queued chat/audit rows before the process exits
+        write_behind.queue.stop()
+        guest_sweeper.stop()
+        embedding_jobs.workers.stop()
+        auth_pool.pool.shutdown()
+        metrics.registry.stop()
+        profiler.stop()
+        llm_profiles.cache.stop()
+
+
+app = FastAPI(title="Places in Time History Chat", lifespan=_lifespan)
 
 
 # Ensure databases have required tables for tests/runtime
 Base.metadata.create_all(bind=chat_engine)
+migrate_guest_tables(chat_engine)
+migrate_llm_profile_tables(chat_engine)
 FigureBase.metadata.create_all(bind=figures_engine)
+migrate_figure_tables(figures_engine)
+metrics.instrument_engine(chat_engine, "chat")
+metrics.instrument_engine(figures_engine, "figures")
+sql_stats.instrument(chat_engine, "chat")
+sql_stats.instrument(figures_engine, "figures")
 
 
 # Include routers
@@ -40,7 +82,9 @@ app.include_router(figures_router.router)
 app.include_router(guest_router.router)
 app.include_router(admin_rag_router.router)
 app.include_router(admin_llm_router.router)
+app.include_router(admin_profile_router.router)
 app.include_router(ask_router.router)
+app.include_router(metrics_router.router)
 
 
 @app.get("/health")
@@ -61,42 +105,49 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so "total" covers CORS and routing too
+app.add_middleware(TimingMiddleware)
+# Per-route latency for /metrics; outside timing so it sees the full request
+app.add_middleware(metrics.MetricsMiddleware)
+# Idle unless an admin arms a request-profiling session
+app.add_middleware(ProfilerMiddleware)
+
+# Files are read, hashed and compressed once and served from memory (ETag/304, gzip/br)
+static_assets = StaticAssetStore(STATIC_DIR)
 
-if STATIC_DIR.exists():
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR), html=False), name="static")
 
+@app.api_route("/static/{rel:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def static_file(rel: str, request: Request):
+    return static_assets.response(request, rel)
 
-def _send_static(rel: str) -> HTMLResponse:
-    path = STATIC_DIR / rel
-    if not path.exists():
-        raise HTTPException(status_code=404, detail="Not found")
-    return HTMLResponse(path.read_text(encoding="utf-8"))
+
+def _send_static(request: Request, rel: str) -> Response:
+    return static_assets.response(request, rel)
 
 
 @app.get("/", response_class=HTMLResponse)
-def spa_index():
-    return _send_static("index.html")
+def spa_index(request: Request):
+    return _send_static(request, "index.html")
 
 
 @app.get("/dashboard", response_class=HTMLResponse)
-def spa_dashboard():
-    return _send_static("index.html")
+def spa_dashboard(request: Request):
+    return _send_static(request, "index.html")
 
 
 @app.get("/admin/ui", response_class=HTMLResponse)
-def admin_ui():
-    return _send_static("admin.html")
+def admin_ui(request: Request):
+    return _send_static(request, "admin.html")
 
 
 @app.get("/admin/figure_rag.html", response_class=HTMLResponse)
-def admin_figure_rag_page():
-    return _send_static("figure_rag.html")
+def admin_figure_rag_page(request: Request):
+    return _send_static(request, "figure_rag.html")
 
 
 # Compatibility aliases for tests expecting root /register and /login
 @app.post("/register")
 async def register_alias(payload: dict, db: Session = Depends(get_db_chat)):
-    from app.utils.security import hash_password
     username = (payload.get("username") or "").strip()
     password = payload.get("password") or ""
     if not username or not password:
@@ -107,18 +158,19 @@ async def register_alias(payload: dict, db: Session = Depends(get_db_chat)):
         # Idempotent behavior for tests: return a fresh token for existing user
         token = create_access_token(data={"sub": existing.username})
         return {"user_id": existing.id, "username": existing.username, "access_token": token, "token_type": "bearer"}
-    user = crud.create_user(db, schemas.UserCreate(username=username, hashed_password=hash_password(password)))
+    hashed = await auth_pool.hash_password_async(password)
+    user = crud.create_user(db, schemas.UserCreate(username=username, hashed_password=hashed))
     token = create_access_token(data={"sub": user.username})
     return {"user_id": user.id, "username": user.username, "access_token": token, "token_type": "bearer"}
 
 
 @app.post("/login")
 async def login_alias(payload: dict, db: Session = Depends(get_db_chat)):
-    from app.utils.security import verify_password, create_access_token
+    from app.utils.security import create_access_token
     username = (payload.get("username") or "").strip()
     password = payload.get("password") or ""
     user = crud.get_user_by_username(db, username=username)
-    if not user or not verify_password(password, user.hashed_password):
+    if not await auth_pool.authenticate_user(db, user, password):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     token = create_access_token(data={"sub": user.username})
     return {"user_id": user.id, "username": user.username, "access_token": token, "token_type": "bearer"}
@@ -134,7 +186,7 @@ def create_thread(thread: schemas.ThreadCreate, db: Session = Depends(get_db_cha
 
 
 @app.delete("/threads/{thread_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_thread(thread_id: int, db: Session = Depends(get_db_chat), current_user: models.User = Depends(get_current_user)):
+def delete_thread(thread_id: int, db: Session = Depends(get_db_chat), current_user: schemas.UserRead = Depends(get_current_user)):
     t = crud.get_thread_by_id(db, thread_id)
     if not t:
         # The tests expect 204 on deletion of existing thread; if not exists, mirror 404 when fetching later
@@ -147,7 +199,7 @@ def delete_thread(thread_id: int, db: Session = Depends(get_db_chat), current_us
 
 
 @app.get("/threads/{thread_id}")
-def get_thread(thread_id: int, db: Session = Depends(get_db_chat), current_user: models.User = Depends(get_current_user)):
+def get_thread(thread_id: int, db: Session = Depends(get_db_chat), current_user: schemas.UserRead = Depends(get_current_user)):
     t = crud.get_thread_by_id(db, thread_id)
     if not t:
         raise HTTPException(status_code=404, detail="Thread not found")
@@ -157,15 +209,17 @@ def get_thread(thread_id: int, db: Session = Depends(get_db_chat), current_user:
 
 
 @app.get("/threads/user/{user_id}")
-def list_threads(user_id: int, db: Session = Depends(get_db_chat), current_user: models.User = Depends(get_current_user)):
+def list_threads(user_id: int, db: Session = Depends(get_db_chat), current_user: schemas.UserRead = Depends(get_current_user)):
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Forbidden")
     rows = crud.get_threads_by_user(db, user_id)
+    first_messages = crud.get_first_messages_by_threads(db, [t.id for t in rows])
     out = []
     for t in rows:
-        # Compute first user message preview
-        msgs = [m for m in crud.get_messages_by_thread(db, t.id, limit=1) if m.role == "user"]
-        first_msg = msgs[0] if msgs else None
+        # Preview the thread's opening message when the user wrote it
+        first_msg = first_messages.get(t.id)
+        if first_msg is not None and first_msg.role != "user":
+            first_msg = None
         out.append(
             {
                 "id": t.id,
@@ -181,12 +235,12 @@ def list_threads(user_id: int, db: Session = Depends(get_db_chat), current_user:
 
 # Favorites compatibility endpoints at /user/favorites
 @app.get("/user/favorites")
-def list_favorites(db: Session = Depends(get_db_chat), current_user: models.User = Depends(get_current_user)):
+def list_favorites(db: Session = Depends(get_db_chat), current_user: schemas.UserRead = Depends(get_current_user)):
     return crud.get_favorites_by_user(db, int(current_user.id))
 
 
 @app.post("/user/favorites/{figure_slug}", status_code=status.HTTP_201_CREATED)
-def add_favorite(figure_slug: str, db: Session = Depends(get_db_chat), current_user: models.User = Depends(get_current_user)):
+def add_favorite(figure_slug: str, db: Session = Depends(get_db_chat), current_user: schemas.UserRead = Depends(get_current_user)):
     # Ensure figure exists in figures DB
     with FigureSessionLocal() as fig_db:
         fig = crud.get_figure_by_slug(fig_db, slug=figure_slug)
@@ -197,7 +251,7 @@ def add_favorite(figure_slug: str, db: Session = Depends(get_db_chat), current_u
 
 
 @app.delete("/user/favorites/{figure_slug}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_favorite(figure_slug: str, db: Session = Depends(get_db_chat), current_user: models.User = Depends(get_current_user)):
+def remove_favorite(figure_slug: str, db: Session = Depends(get_db_chat), current_user: schemas.UserRead = Depends(get_current_user)):
     ok = crud.remove_favorite(db, int(current_user.id), figure_slug)
     if not ok:
         raise HTTPException(status_code=404, detail="Favorite not found")
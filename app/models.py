@@ -8,11 +8,12 @@ actions.
 """
 
 import json
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, func, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, func, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
 
 from app.database import Base
 from app.figures_database import FigureBase
+from app.utils.fingerprint import content_sha256, simhash64, simhash_on_write
 
 
 class Chat(Base):
@@ -177,6 +178,9 @@ class FigureContext(FigureBase):
     """
 
     __tablename__ = "figure_contexts"
+    __table_args__ = (
+        Index("uq_figure_contexts_slug_sha256", "figure_slug", "content_sha256", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     figure_slug = Column(String, index=True)
@@ -185,6 +189,72 @@ class FigureContext(FigureBase):
     content_type = Column(String)
     content = Column(Text)
     is_manual = Column(Integer, default=0)
+    # Position of an ingested chunk within its extracted source text (null for manual rows)
+    chunk_index = Column(Integer, nullable=True)
+    char_start = Column(Integer, nullable=True)
+    char_end = Column(Integer, nullable=True)
+    # Fingerprints maintained from content: exact-dedupe key and 64-bit SimHash.
+    # The SimHash is set on write only when near-duplicate filtering was on at
+    # process start; otherwise it stays null until near-dup ingest fills it in.
+    content_sha256 = Column(String(64), nullable=True)
+    content_simhash = Column(Integer, nullable=True)
+
+    @validates("content")
+    def _fingerprint_content(self, key: str, value: str) -> str:
+        """Keep content fingerprints in sync whenever content is assigned."""
+        self.content_sha256 = content_sha256(value)
+        self.content_simhash = simhash64(value) if simhash_on_write() else None
+        return value
+
+
+class EmbeddingJob(FigureBase):
+    """
+    A durable request to embed a set of figure contexts into the vector store.
+
+    Jobs live in the figures database so every worker process sees the same
+    state. Progress counters are updated atomically as tasks complete.
+    """
+
+    __tablename__ = "embedding_jobs"
+
+    id = Column(String, primary_key=True)
+    figure_slug = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)
+    total = Column(Integer, nullable=False, default=0)
+    done = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    finished_at = Column(Float, nullable=True)
+
+    tasks = relationship("EmbeddingTask", back_populates="job", cascade="all, delete-orphan")
+
+
+class EmbeddingTask(FigureBase):
+    """
+    One claimable batch of context ids belonging to an EmbeddingJob.
+
+    Workers claim a task with a conditional UPDATE on status, so a task is
+    processed by exactly one worker even across processes.
+    """
+
+    __tablename__ = "embedding_tasks"
+    __table_args__ = (
+        Index("ix_embedding_tasks_claim", "status", "available_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, ForeignKey("embedding_jobs.id"), nullable=False, index=True)
+    context_ids = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(Float, nullable=False)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(Float, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    job = relationship("EmbeddingJob", back_populates="tasks")
 
 
 class GuestSession(Base):
@@ -199,13 +269,13 @@ class GuestSession(Base):
     figure_slug = Column(String, nullable=True)
     question_count = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    expires_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
 
     messages = relationship(
         "GuestMessage",
         back_populates="session",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="select",
     )
 
 
@@ -217,7 +287,7 @@ class GuestMessage(Base):
     __tablename__ = "guest_messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("guest_sessions.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("guest_sessions.id"), nullable=False, index=True)
     role = Column(String, nullable=False)
     message = Column(Text, nullable=False)
     model_used = Column(String, nullable=True)
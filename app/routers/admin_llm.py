@@ -2,29 +2,93 @@
 Admin LLM configuration and health endpoints.
 
 Exposes:
-- PATCH /admin/llm
+- GET   /admin/llm                              active profile as seen by this worker
+- PATCH /admin/llm                              edit the active profile (all workers)
+- GET   /admin/llm/profiles
+- PUT   /admin/llm/profiles/{name}
+- POST  /admin/llm/profiles/{name}/activate     switch every worker to a profile
 - GET   /admin/llm/health
 - GET   /admin/health/llm (compat)
+- GET   /admin/llm/admission
+- GET   /admin/timings
 """
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
 
+from app import schemas
 from app.config.llm_config import llm_config
+from app.database import get_db_chat
 import app.services.llm_client as llm_mod
+from app.services import llm_profiles, rate_limit, single_flight
+from app.utils import timing
 from app.utils.security import admin_required
 
 router = APIRouter(prefix="/admin", tags=["Admin LLM"])
 
 
+def _profile_fields(payload: schemas.LlmProfileFields) -> dict:
+    # The schema rejects api_base (see llm_profiles.HTTP_FIELDS) and out-of-range values
+    return payload.model_dump(include=set(llm_profiles.HTTP_FIELDS), exclude_none=True)
+
+
+def _upsert(db: Session, name: str, payload: schemas.LlmProfileFields):
+    try:
+        return llm_profiles.upsert_profile(db, name, _profile_fields(payload), fields=llm_profiles.HTTP_FIELDS)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+def _commit_and_apply(db: Session) -> None:
+    # Other workers pick the change up from llm_profile_revision on their next poll
+    db.commit()
+    llm_profiles.cache.refresh(db.get_bind(), force=True)
+
+
+@router.get("/llm")
+def get_llm(_=Depends(admin_required)):
+    return llm_profiles.cache.status()
+
+
 @router.patch("/llm")
-def patch_llm(payload: dict, _=Depends(admin_required)):
-    provider = (payload.get("provider") or llm_config.provider)
-    model = (payload.get("model") or llm_config.model)
-    llm_config.provider = provider
-    llm_config.model = model
-    return {"active": {"provider": llm_config.provider, "model": llm_config.model}}
+def patch_llm(payload: schemas.LlmProfilePatch, db: Session = Depends(get_db_chat), _=Depends(admin_required)):
+    # Edits the active profile (or creates "default"); payload may name another profile to edit and activate
+    active = llm_profiles.get_active_profile(db)
+    name = payload.profile or (active.name if active else "default")
+    _upsert(db, name, payload)
+    llm_profiles.activate_profile(db, name)
+    _commit_and_apply(db)
+    return {
+        "active": {"provider": llm_config.provider, "model": llm_config.model},
+        "profile": name,
+        "revision": llm_profiles.cache.revision,
+    }
+
+
+@router.get("/llm/profiles")
+def list_llm_profiles(db: Session = Depends(get_db_chat), _=Depends(admin_required)):
+    active, rows = llm_profiles.list_profiles(db)
+    return {"active": active, "revision": llm_profiles.cache.revision, "profiles": [llm_profiles.profile_dict(r) for r in rows]}
+
+
+@router.put("/llm/profiles/{name}")
+def put_llm_profile(
+    name: str, payload: schemas.LlmProfileFields, db: Session = Depends(get_db_chat), _=Depends(admin_required)
+):
+    row = _upsert(db, name, payload)
+    _commit_and_apply(db)
+    return llm_profiles.profile_dict(row)
+
+
+@router.post("/llm/profiles/{name}/activate")
+def activate_llm_profile(name: str, db: Session = Depends(get_db_chat), _=Depends(admin_required)):
+    row = llm_profiles.activate_profile(db, name)
+    if row is None:
+        raise HTTPException(status_code=404, detail="LLM profile not found")
+    _commit_and_apply(db)
+    return {"active": llm_profiles.profile_dict(row), "revision": llm_profiles.cache.revision}
 
 
 @router.get("/llm/health")
@@ -38,3 +102,15 @@ def llm_health(_=Depends(admin_required)):
 def llm_health_compat(_=Depends(admin_required)):
     # Alias for older path used in tests
     return llm_health()
+
+
+@router.get("/llm/admission")
+def llm_admission(_=Depends(admin_required)):
+    # Rate-limit counters, LLM gate occupancy and request coalescing for this worker process
+    return {**rate_limit.stats(), "coalescing": {"mode": single_flight.llm_mode(), **single_flight.llm_flights.stats()}}
+
+
+@router.get("/timings")
+def stage_timings(_=Depends(admin_required)):
+    # Per-stage latency histograms (ask/guest pipeline, RAG, LLM) for this worker process
+    return {"enabled": timing.enabled(), "buckets_ms": list(timing.BUCKETS_MS), "stages": timing.stats()}
@@ -0,0 +1,105 @@
+"""
+Admin profiling endpoints (per worker process).
+
+Exposes:
+- POST   /admin/profile/requests   profile the next N requests matching a route prefix
+- POST   /admin/profile/process    profile the whole process for T seconds
+- GET    /admin/profile            status of the current or last session
+- GET    /admin/profile/result     download as collapsed stacks, pstats or a JSON top list
+- DELETE /admin/profile            stop the running session (results are kept)
+
+Sessions belong to the worker that received the start call. Under several
+gunicorn workers, read the ``pid`` in the status to confirm which one.
+"""
+
+from __future__ import annotations
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+
+from app.utils import profiler as profiler_mod
+from app.utils.profiler import profiler
+from app.utils.security import get_admin_user
+
+router = APIRouter(prefix="/admin/profile", tags=["Admin Profiling"])
+
+
+def _require_enabled() -> None:
+    if not profiler_mod.enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled (PROFILER_ENABLED=false)")
+
+
+def _start(kind: str, **kwargs) -> dict:
+    _require_enabled()
+    try:
+        session = profiler.start(kind, **kwargs)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    return session.status()
+
+
+@router.post("/requests", status_code=status.HTTP_202_ACCEPTED)
+def profile_requests(
+    route: str = Query(..., min_length=1, description="Path prefix to capture, e.g. /ask"),
+    count: int = Query(5, ge=1, le=1000, description="Number of matching requests to profile."),
+    timeout: float = Query(300, gt=0, description="Give up after this many seconds."),
+    interval_ms: Optional[float] = Query(None, ge=0.5, le=1000, description="Sampling interval."),
+    _=Depends(get_admin_user),
+) -> dict:
+    """Arm the profiler for the next ``count`` requests whose path starts with ``route``."""
+    return _start("requests", route=route, count=count, seconds=timeout, interval_ms=interval_ms)
+
+
+@router.post("/process", status_code=status.HTTP_202_ACCEPTED)
+def profile_process(
+    seconds: float = Query(10, gt=0, description="How long to sample this process."),
+    interval_ms: Optional[float] = Query(None, ge=0.5, le=1000, description="Sampling interval."),
+    _=Depends(get_admin_user),
+) -> dict:
+    """Sample every thread of this worker for ``seconds``."""
+    return _start("process", seconds=seconds, interval_ms=interval_ms)
+
+
+@router.get("")
+def profile_status(_=Depends(get_admin_user)) -> dict:
+    session = profiler.session
+    if session is None:
+        return {"state": "idle"}
+    return session.status()
+
+
+@router.delete("")
+def profile_stop(_=Depends(get_admin_user)) -> dict:
+    session = profiler.stop()
+    if session is None:
+        return {"state": "idle"}
+    return session.status()
+
+
+@router.get("/result")
+def profile_result(
+    format: Literal["collapsed", "pstats", "top"] = Query("collapsed"),
+    weight: Literal["wall", "cpu"] = Query("wall", description="Weight stacks by wall-clock samples or thread CPU time."),
+    limit: int = Query(30, ge=1, le=500, description="Rows per list for format=top."),
+    _=Depends(get_admin_user),
+):
+    """Return the collected profile; partial results are available while a session runs."""
+    session = profiler.session
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profiling session in this process")
+    weights = session.weights(weight)
+    if format == "top":
+        return {"session": session.status(), "weight": weight, **profiler_mod.top(weights, limit)}
+    name = f"profile-{session.id}-{weight}"
+    if format == "pstats":
+        return Response(
+            content=profiler_mod.pstats_bytes(weights),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{name}.pstats"'},
+        )
+    return Response(
+        content=profiler_mod.collapsed(weights),
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{name}.collapsed.txt"'},
+    )
@@ -10,22 +10,39 @@ Notes
 
 from __future__ import annotations
 
-from typing import Generator, List, Optional, Tuple, Dict
+from typing import Generator, Iterable, List, Optional, Tuple, Dict
 
+import asyncio
+import json
+import logging
+import os
 import re
 import html as html_mod
-import os
-import tempfile
-import time
-import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, HttpUrl
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app import models
+from app import crud, models, schemas
 from app.figures_database import FigureSessionLocal
+from app.ingest.chunking import Chunk, ChunkerConfig, iter_chunks, stream_chunks
+from app.ingest.dedupe import (
+    MAX_NEAR_DUP_DISTANCE,
+    NearDuplicateIndex,
+    content_sha256,
+    near_dup_max_distance,
+    simhash64,
+)
+from app.services import embedding_jobs, rate_limit
 from app.utils.security import get_admin_user
+from app.utils.uploads import SpooledUpload, docx_to_text, iter_pdf_pages, pypdf_to_text, spool_file, spool_upload
+from app.vector.context_embedder import embed_contexts
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin/rag", tags=["Admin RAG"])
 
@@ -38,17 +55,12 @@ def get_figure_db() -> Generator[Session, None, None]:
         db.close()
 
 
-# --- upload job registry -------------------------------------------------
-# lightweight in-memory job store for uploads -> background embedding job progress
-# NOTE: this is process-local. For multi-instance deployments prefer Redis/persistent store.
-_UPLOAD_JOBS: Dict[str, Dict] = {}
-
-
 class UploadFileResult(BaseModel):
     filename: str
     type: str
     size: int
     ok: bool = True
+    sha256: Optional[str] = None
 
 
 class UploadResponse(BaseModel):
@@ -67,72 +79,49 @@ def _html_to_text(html: str) -> str:
     return text
 
 
-def _chunk_text(text: str, chunk_size: int = 750, overlap: int = 50) -> List[str]:
-    tokens = text.split()
-    out = []
-    i = 0
-    while i < len(tokens):
-        chunk = tokens[i : i + chunk_size]
-        out.append(" ".join(chunk))
-        i += chunk_size - overlap
-    return out
+def _chunker_config(strategy: Optional[str] = None) -> ChunkerConfig:
+    """Return the chunker config from the environment, rejecting unknown strategies with 400."""
+    try:
+        return ChunkerConfig.from_env(strategy)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 
-# Attempt fast PDF extraction via PyMuPDF, fall back to pdfminer if not available.
-def _pdf_to_text(data: bytes) -> str:
-    try:
-        import fitz
-
-        with tempfile.NamedTemporaryFile(delete=False) as tf:
-            tf.write(data)
-            tf.flush()
-            path = tf.name
-        doc = fitz.open(path)
-        txt = []
-        for p in doc:
-            txt.append(p.get_text())
-        doc.close()
-        try:
-            os.unlink(path)
-        except Exception:
-            pass
-        return "\n".join(txt)
-    except Exception:
-        # fallback to pdfminer.six
-        try:
-            from pdfminer.high_level import extract_text
+def _chunk_text(text: str, strategy: Optional[str] = None) -> List[str]:
+    """Split text into token-bounded chunks (see app.ingest.chunking)."""
+    return [c.text for c in iter_chunks(text, ChunkerConfig.from_env(strategy))]
 
-            with tempfile.NamedTemporaryFile(delete=False) as tf:
-                tf.write(data)
-                tf.flush()
-                path = tf.name
-            text = extract_text(path)
-            try:
-                os.unlink(path)
-            except Exception:
-                pass
-            return text
-        except Exception:
-            return ""
 
+def _extract_upload_segments(spooled: SpooledUpload) -> Tuple[Iterable[str], str]:
+    """Return (text segments, content_type) for a spooled upload based on its extension.
 
-def _docx_to_text(data: bytes) -> str:
+    PDFs are yielded page by page so long documents are chunked incrementally.
+    """
+    ft = spooled.filename.lower()
+    if ft.endswith(".pdf"):
+        return iter_pdf_pages(spooled.path), "document"
+    if ft.endswith(".docx"):
+        return [docx_to_text(spooled.path)], "document"
+    if ft.endswith(".html") or ft.endswith(".htm"):
+        return [_html_to_text(spooled.read_text(errors="ignore"))], "html"
+    # treat as plain text
     try:
-        from docx import Document
-
-        with tempfile.NamedTemporaryFile(delete=False) as tf:
-            tf.write(data)
-            tf.flush()
-            path = tf.name
-        doc = Document(path)
-        paragraphs = [p.text for p in doc.paragraphs]
-        try:
-            os.unlink(path)
-        except Exception:
-            pass
-        return "\n".join(paragraphs)
+        return [spooled.read_text(errors="strict")], "text"
     except Exception:
-        return ""
+        return [], "text"
+
+
+def _ingest_spooled(
+    db: Session,
+    figure_slug: str,
+    spooled: SpooledUpload,
+    config: ChunkerConfig,
+    auto_embed: bool = False,
+) -> Tuple[List[int], List[UploadFileResult]]:
+    """Extract, chunk and ingest a spooled upload while its temp file still exists."""
+    segments, content_type = _extract_upload_segments(spooled)
+    chunks = stream_chunks(segments, config)
+    return _ingest_chunks(db, figure_slug, chunks, source_name=spooled.filename, content_type=content_type, auto_embed=auto_embed)
 
 
 def _ingest_uploaded_text(
@@ -142,66 +131,131 @@ def _ingest_uploaded_text(
     source_name: Optional[str] = None,
     content_type: str = "document",
     auto_embed: bool = False,
+    config: Optional[ChunkerConfig] = None,
+) -> Tuple[List[int], List[UploadFileResult]]:
+    """Chunk text and create FigureContext rows."""
+    if not text or not text.strip():
+        return [], []
+    chunks = iter_chunks(text, config or ChunkerConfig.from_env())
+    return _ingest_chunks(db, figure_slug, chunks, source_name=source_name, content_type=content_type, auto_embed=auto_embed)
+
+
+_INGEST_BATCH_SIZE = 256
+
+
+def _near_dup_index(db: Session, figure_slug: str) -> Optional[NearDuplicateIndex]:
+    """
+    Load existing SimHash signatures for a figure when near-duplicate filtering is enabled.
+
+    Rows stored while filtering was off have no signature yet; they are
+    fingerprinted here, once, the first time the figure is checked.
+    """
+    max_distance = near_dup_max_distance()
+    if max_distance <= 0:
+        return None
+    missing = db.execute(
+        select(models.FigureContext.id, models.FigureContext.content).where(
+            models.FigureContext.figure_slug == figure_slug,
+            models.FigureContext.content_simhash.is_(None),
+            models.FigureContext.content_sha256.is_not(None),
+        )
+    ).all()
+    if missing:
+        db.execute(
+            update(models.FigureContext),
+            [{"id": ctx_id, "content_simhash": simhash64(content)} for ctx_id, content in missing],
+        )
+    sigs = db.execute(
+        select(models.FigureContext.content_simhash).where(
+            models.FigureContext.figure_slug == figure_slug,
+            models.FigureContext.content_simhash.is_not(None),
+        )
+    ).scalars()
+    return NearDuplicateIndex(max_distance=min(max_distance, MAX_NEAR_DUP_DISTANCE), signatures=sigs)
+
+
+def _ingest_chunks(
+    db: Session,
+    figure_slug: str,
+    chunks: Iterable[Chunk],
+    source_name: Optional[str] = None,
+    content_type: str = "document",
+    auto_embed: bool = False,
 ) -> Tuple[List[int], List[UploadFileResult]]:
-    """Chunk text and create FigureContext rows using existing model columns.
+    """Create FigureContext rows for chunks, recording their source offsets.
 
-    Dedupe by exact content match (figure_slug + content) to avoid duplicates.
+    Duplicates are detected by (figure_slug, content_sha256) with one indexed
+    lookup per batch, and new rows are inserted in batches. When
+    RAG_NEAR_DUP_MAX_DISTANCE > 0, chunks whose SimHash is within that
+    Hamming distance of an existing chunk are skipped as near-duplicates.
     """
     results: List[UploadFileResult] = []
     ctx_ids: List[int] = []
-    if not text or not text.strip():
-        return ctx_ids, results
-
-    chunks = _chunk_text(text)
-    for i, c in enumerate(chunks):
-        exists = (
-            db.query(models.FigureContext)
-            .filter(models.FigureContext.figure_slug == figure_slug)
-            .filter(models.FigureContext.content == c)
-            .first()
-        )
-        if exists:
-            results.append(UploadFileResult(filename=f"chunk-{i}", type="chunk", size=len(c), ok=False))
-            continue
-        row = models.FigureContext(
-            figure_slug=figure_slug,
-            source_name=source_name or "upload",
-            source_url=None,
-            content_type=content_type,
-            content=c,
-            is_manual=0,
+    near = _near_dup_index(db, figure_slug)
+    seen: set[str] = set()
+
+    def _flush(batch: List[Chunk]) -> None:
+        hashes = {c.text: content_sha256(c.text) for c in batch}
+        existing = set(
+            db.execute(
+                select(models.FigureContext.content_sha256).where(
+                    models.FigureContext.figure_slug == figure_slug,
+                    models.FigureContext.content_sha256.in_([h for h in hashes.values() if h]),
+                )
+            ).scalars()
         )
-        db.add(row)
-        db.flush()
-        ctx_ids.append(row.id)
-        results.append(UploadFileResult(filename=f"chunk-{i}", type="chunk", size=len(c), ok=True))
+        rows: List[Tuple[models.FigureContext, UploadFileResult]] = []
+        for chunk in batch:
+            c = chunk.text
+            sha = hashes[c]
+            result = UploadFileResult(filename=f"chunk-{chunk.index}", type="chunk", size=len(c), ok=False, sha256=sha)
+            results.append(result)
+            if not sha or sha in existing or sha in seen:
+                continue
+            row = models.FigureContext(
+                figure_slug=figure_slug,
+                source_name=source_name or "upload",
+                source_url=None,
+                content_type=content_type,
+                content=c,
+                is_manual=0,
+                chunk_index=chunk.index,
+                char_start=chunk.start,
+                char_end=chunk.end,
+            )
+            if near is not None:
+                if row.content_simhash is None:
+                    row.content_simhash = simhash64(c)
+                if row.content_simhash is not None:
+                    if near.find(row.content_simhash) is not None:
+                        continue
+                    near.add(row.content_simhash)
+            seen.add(sha)
+            rows.append((row, result))
+        if rows:
+            db.add_all([r for r, _ in rows])
+            db.flush()
+            for row, result in rows:
+                ctx_ids.append(row.id)
+                result.ok = True
+
+    batch: List[Chunk] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= _INGEST_BATCH_SIZE:
+            _flush(batch)
+            batch = []
+    if batch:
+        _flush(batch)
     db.commit()
     if auto_embed and ctx_ids:
         try:
-            _embed_context_ids(db, ctx_ids, figure_slug)
-        except Exception:
-            pass
+            embed_contexts(db, ctx_ids)
+        except Exception as exc:
+            logger.warning("Auto-embed for %s failed: %s", figure_slug, exc)
     return ctx_ids, results
 
 
-def _embed_context_ids(db: Session, ctx_ids: List[int], figure_slug: str) -> None:
-    """Embed contexts by id using their content field."""
-    try:
-        from app.services.embedding_client import get_embedding
-        from app.vector.chroma_client import ensure_collection
-
-        emb = get_embedding
-        coll = ensure_collection(figure_slug)
-        rows = db.query(models.FigureContext).filter(models.FigureContext.id.in_(ctx_ids)).all()
-        for r in rows:
-            vec = emb(r.content or "")  # compute embedding (vec unused if coll handles raw text)
-            coll.add_documents([r.content or ""], metadatas=[{"id": r.id}])
-        db.commit()
-    except Exception:
-        db.rollback()
-
-
-
 # ---------- Schemas ----------
 
 
@@ -213,6 +267,9 @@ class ContextRead(BaseModel):
     content_type: Optional[str] = None
     content: Optional[str] = None
     is_manual: Optional[int] = 0
+    chunk_index: Optional[int] = None
+    char_start: Optional[int] = None
+    char_end: Optional[int] = None
     # embedded status is inferred externally (vector store); omit field to match model columns
 
 
@@ -232,12 +289,41 @@ class ContextUpdate(BaseModel):
     is_manual: Optional[int] = None
 
 
+def _audit(request: Request, admin: Optional[schemas.UserRead], action: str, ctx_id: int, diff: dict) -> None:
+    """Queue an audit row for a context change (skipped when no admin user is resolved)."""
+    actor_id = getattr(admin, "id", None)
+    if actor_id is not None:
+        crud.add_audit_log(None, actor_id, action, "figure_context", str(ctx_id), diff, rate_limit.client_ip(request))
+
+
+def _save_context(db: Session, ctx: models.FigureContext) -> None:
+    """Commit a FigureContext, rejecting content already stored for the figure with 409."""
+    if ctx.content_sha256:
+        q = select(models.FigureContext.id).where(
+            models.FigureContext.figure_slug == ctx.figure_slug,
+            models.FigureContext.content_sha256 == ctx.content_sha256,
+        )
+        if ctx.id is not None:
+            q = q.where(models.FigureContext.id != ctx.id)
+        with db.no_autoflush:
+            duplicate = db.execute(q).first()
+        if duplicate:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Identical context already exists for this figure")
+    db.add(ctx)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Identical context already exists for this figure")
+
+
 # ---------- Endpoints ----------
 
 @router.get("/contexts", response_model=List[ContextRead])
 def list_contexts_by_figure(
     figure_slug: str = Query(..., min_length=1, description="Slug of the figure"),
-    _: models.User = Depends(get_admin_user),
+    _: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> List[ContextRead]:
     """
@@ -256,7 +342,8 @@ def list_contexts_by_figure(
 def update_context(
     ctx_id: int,
     patch: ContextUpdate,
-    _: models.User = Depends(get_admin_user),
+    request: Request,
+    admin: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> ContextRead:
     """
@@ -277,16 +364,20 @@ def update_context(
     if patch.is_manual is not None:
         ctx.is_manual = int(patch.is_manual)  # type: ignore[assignment]
 
-    db_fig.add(ctx)
-    db_fig.commit()
+    _save_context(db_fig, ctx)
     db_fig.refresh(ctx)
+    diff = patch.model_dump(exclude_none=True, exclude={"content"})
+    if patch.content is not None:
+        diff["content_sha256"] = ctx.content_sha256
+    _audit(request, admin, "update", ctx_id, diff)
     return ctx  # type: ignore[return-value]
 
 
 @router.delete("/contexts/{ctx_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_context(
     ctx_id: int,
-    _: models.User = Depends(get_admin_user),
+    request: Request,
+    admin: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ):
     """
@@ -295,8 +386,10 @@ def delete_context(
     ctx = db_fig.query(models.FigureContext).filter(models.FigureContext.id == ctx_id).first()
     if not ctx:
         raise HTTPException(status_code=404, detail="Context not found")
+    slug = ctx.figure_slug
     db_fig.delete(ctx)
     db_fig.commit()
+    _audit(request, admin, "delete", ctx_id, {"figure_slug": slug})
     return None
 
 
@@ -318,7 +411,7 @@ class RagSummaryResponse(BaseModel):
 
 @router.get("/sources", response_model=RagSummaryResponse)
 def rag_sources_summary(
-    _: models.User = Depends(get_admin_user),
+    _: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ):
     """
@@ -405,7 +498,8 @@ def rag_sources_summary(
 @router.post("/sources", response_model=ContextRead, status_code=status.HTTP_201_CREATED)
 def create_manual_source(
     payload: ContextCreate,
-    _: models.User = Depends(get_admin_user),
+    request: Request,
+    admin: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> ContextRead:
     """
@@ -424,9 +518,9 @@ def create_manual_source(
         content=payload.content or "",
         is_manual=1,
     )
-    db_fig.add(ctx)
-    db_fig.commit()
+    _save_context(db_fig, ctx)
     db_fig.refresh(ctx)
+    _audit(request, admin, "create", ctx.id, {"figure_slug": payload.figure_slug, "source_name": payload.source_name})
     return ctx  # type: ignore[return-value]
 
 
@@ -434,14 +528,16 @@ def create_manual_source(
 def upload_sources(
     figure_slug: str = Query(..., min_length=1, description="Slug of the figure to attach uploads to"),
     files: list[UploadFile] | None = None,
-    _: models.User = Depends(get_admin_user),
+    _: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> list[ContextRead]:
     """
     Accept one or more uploaded files (PDFs etc), extract text (best-effort), and create FigureContext entries.
 
     This is a simple, robust helper to restore drag-and-drop ingestion from the admin UI.
-    For PDFs we use PyPDF2 to extract text; other types fall back to raw bytes->utf-8 text.
+    Files are spooled to disk in chunks (never fully buffered in memory); identical files
+    within one request are skipped by SHA-256, as is text already stored for the figure. For PDFs we use PyPDF2 to extract text;
+    other types fall back to utf-8 decoding.
     """
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded")
@@ -452,41 +548,34 @@ def upload_sources(
         raise HTTPException(status_code=404, detail="Figure not found")
 
     created: list[models.FigureContext] = []
+    seen_hashes: set[str] = set()
     for up in files:
         filename = getattr(up, "filename", "uploaded") or "uploaded"
         content = ""
         try:
-            # Try PDF extraction via PyPDF2 if file looks like PDF
-            data = up.file.read()
-            up.file.seek(0)
-            if data[:4] == b"%PDF":
-                try:
-                    from PyPDF2 import PdfReader
-
-                    reader = PdfReader(up.file)
-                    pages = []
-                    for p in reader.pages:
-                        txt = p.extract_text() or ""
-                        pages.append(txt)
-                    content = "\n\n".join(pages)
-                except Exception:
-                    # Fallback to raw decode
-                    try:
-                        content = data.decode("utf-8", errors="replace")
-                    except Exception:
-                        content = ""
-            else:
-                # Non-PDF: try to decode as text
-                try:
-                    content = data.decode("utf-8", errors="replace")
-                except Exception:
-                    content = ""
+            with spool_file(up.file, filename) as spooled:
+                if spooled.sha256 in seen_hashes:
+                    continue
+                seen_hashes.add(spooled.sha256)
+                # Try PDF extraction via PyPDF2 if file looks like PDF, else fall back to raw decode
+                if spooled.looks_like_pdf():
+                    content = pypdf_to_text(spooled.path) or ""
+                if not content:
+                    content = spooled.read_text(errors="replace")
         finally:
             try:
                 up.file.close()
             except Exception:
                 pass
 
+        sha = content_sha256(content)
+        if sha and db_fig.execute(
+            select(models.FigureContext.id).where(
+                models.FigureContext.figure_slug == figure_slug,
+                models.FigureContext.content_sha256 == sha,
+            )
+        ).first():
+            continue
         ctx = models.FigureContext(
             figure_slug=figure_slug,
             source_name=filename,
@@ -505,64 +594,122 @@ def upload_sources(
 
 
 @router.get("/upload-jobs/{job_id}")
-async def upload_job_status(job_id: str):
-    job = _UPLOAD_JOBS.get(job_id)
+def upload_job_status(
+    job_id: str,
+    _: schemas.UserRead = Depends(get_admin_user),
+    db_fig: Session = Depends(get_figure_db),
+) -> dict:
+    """
+    Return progress for a background embedding job.
+
+    Jobs are persisted in the figures database, so any worker can answer.
+    """
+    job = embedding_jobs.job_status(db_fig, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
     return job
 
 
+@router.get("/upload-jobs/{job_id}/events")
+async def upload_job_events(
+    job_id: str,
+    request: Request,
+    _: schemas.UserRead = Depends(get_admin_user),
+) -> StreamingResponse:
+    """
+    Stream job progress as Server-Sent Events until the job reaches a terminal state.
+
+    Emits a ``progress`` event whenever the snapshot changes, a comment
+    heartbeat every 15 seconds, and a final ``end`` event.
+    """
+
+    def _snapshot() -> Optional[dict]:
+        with FigureSessionLocal() as s:
+            return embedding_jobs.job_status(s, job_id)
+
+    first = await run_in_threadpool(_snapshot)
+    if first is None:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    async def _events():
+        last: Optional[dict] = None
+        snap: Optional[dict] = first
+        idle = 0.0
+        while True:
+            if snap is None:
+                yield "event: end\ndata: {}\n\n"
+                return
+            if snap != last:
+                yield f"event: progress\ndata: {json.dumps(snap)}\n\n"
+                last = snap
+                idle = 0.0
+            if snap["status"] in embedding_jobs.TERMINAL_STATUSES:
+                yield f"event: end\ndata: {json.dumps(snap)}\n\n"
+                return
+            if idle >= 15.0:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(1.0)
+            idle += 1.0
+            snap = await run_in_threadpool(_snapshot)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/upload-jobs/{job_id}/cancel")
+def cancel_upload_job(
+    job_id: str,
+    _: schemas.UserRead = Depends(get_admin_user),
+    db_fig: Session = Depends(get_figure_db),
+) -> dict:
+    """
+    Cancel a background embedding job; unclaimed batches are dropped.
+    """
+    if embedding_jobs.job_status(db_fig, job_id) is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    embedding_jobs.cancel_job(db_fig, job_id)
+    return embedding_jobs.job_status(db_fig, job_id) or {}
+
+
 @router.post("/figure/{figure_slug}/upload", response_model=UploadResponse)
 async def upload_figure_files(
     figure_slug: str,
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     auto_embed: Optional[bool] = Query(False),
+    chunk_strategy: Optional[str] = Query(None, description="Chunking strategy: sentence, paragraph or heading"),
     db: Session = Depends(get_figure_db),
     _admin=Depends(get_admin_user),
 ):
     resp = UploadResponse()
     all_new_ctx_ids: List[int] = []
+    config = _chunker_config(chunk_strategy)
+    seen_hashes: set[str] = set()
     for f in files:
-        content = await f.read()
-        ft = (f.filename or "").lower()
-        if ft.endswith(".pdf"):
-            text = _pdf_to_text(content)
-            ctx_ids, results = _ingest_uploaded_text(db, figure_slug, text, source_name=f.filename, content_type="document", auto_embed=auto_embed)
-        elif ft.endswith(".docx"):
-            text = _docx_to_text(content)
-            ctx_ids, results = _ingest_uploaded_text(db, figure_slug, text, source_name=f.filename, content_type="document", auto_embed=auto_embed)
-        elif ft.endswith(".html") or ft.endswith(".htm"):
-            text = _html_to_text(content.decode(errors="ignore"))
-            ctx_ids, results = _ingest_uploaded_text(db, figure_slug, text, source_name=f.filename, content_type="html", auto_embed=auto_embed)
-        else:
-            # treat as plain text
-            try:
-                text = content.decode()
-            except Exception:
-                text = ""
-            ctx_ids, results = _ingest_uploaded_text(db, figure_slug, text, source_name=f.filename, content_type="text", auto_embed=auto_embed)
+        spooled = await spool_upload(f)
+        try:
+            if spooled.sha256 in seen_hashes:
+                resp.results.append(
+                    UploadFileResult(filename=spooled.filename, type="file", size=spooled.size, ok=False, sha256=spooled.sha256)
+                )
+                continue
+            seen_hashes.add(spooled.sha256)
+            ctx_ids, results = await run_in_threadpool(_ingest_spooled, db, figure_slug, spooled, config, bool(auto_embed))
+        finally:
+            spooled.cleanup()
+            await f.close()
         resp.results.extend(results)
         all_new_ctx_ids.extend(ctx_ids)
 
-    # If not auto_embed, schedule background embedding job
+    # If not auto_embed, schedule a durable background embedding job
     if all_new_ctx_ids and not auto_embed:
-        job_id = uuid.uuid4().hex
-        _UPLOAD_JOBS[job_id] = {"created_at": time.time(), "total": len(all_new_ctx_ids), "done": 0, "status": "queued"}
-
-        def _bg(ctx_ids: List[int], jid: str):
-            _UPLOAD_JOBS[jid]["status"] = "running"
-            # embed in batches
-            for i, cid in enumerate(ctx_ids):
-                try:
-                    _embed_context_ids(db, [cid], figure_slug)
-                    _UPLOAD_JOBS[jid]["done"] += 1
-                except Exception:
-                    pass
-            _UPLOAD_JOBS[jid]["status"] = "done"
-
-        background_tasks.add_task(_bg, all_new_ctx_ids, job_id)
-        resp.job_id = job_id
+        job = embedding_jobs.enqueue_embedding_job(db, figure_slug, all_new_ctx_ids)
+        resp.job_id = job.id
 
     return resp
 
@@ -572,16 +719,21 @@ async def upload_figure_files(
 @router.post("/contexts/{ctx_id}/embed")
 def embed_single_context(
     ctx_id: int,
-    _: models.User = Depends(get_admin_user),
+    _: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> ContextRead:
     ctx = db_fig.query(models.FigureContext).filter(models.FigureContext.id == ctx_id).first()
     if not ctx:
         raise HTTPException(status_code=404, detail="Context not found")
     try:
-        _embed_context_ids(db_fig, [ctx.id], ctx.figure_slug)
+        report = embed_contexts(db_fig, [ctx.id])
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Embedding failed: {exc}")
+    result = report.results[0]
+    if result.status == "failed":
+        raise HTTPException(status_code=502, detail=f"Embedding failed: {result.error}")
+    if result.status == "skipped":
+        raise HTTPException(status_code=400, detail="Context has no content to embed")
     db_fig.refresh(ctx)
     return ctx  # type: ignore[return-value]
 
@@ -589,41 +741,51 @@ def embed_single_context(
 @router.post("/figure/{figure_slug}/embed-all")
 def embed_all_contexts(
     figure_slug: str,
-    _: models.User = Depends(get_admin_user),
+    _: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> dict:
-    rows = (
-        db_fig.query(models.FigureContext)
-        .filter(models.FigureContext.figure_slug == figure_slug)
-        .order_by(models.FigureContext.id.asc())
-        .all()
+    """
+    Embed every context of a figure in batches and upsert them into the vector store.
+
+    Returns counts per status, timing, and per-id results. Responds 502 when
+    nothing could be embedded because the backend failed.
+    """
+    ids = list(
+        db_fig.execute(
+            select(models.FigureContext.id)
+            .where(models.FigureContext.figure_slug == figure_slug)
+            .order_by(models.FigureContext.id.asc())
+        ).scalars()
     )
-    ids = [r.id for r in rows]
     if not ids:
-        return {"embedded": 0}
+        return {"embedded": 0, "skipped": 0, "missing": 0, "failed": 0, "results": []}
     try:
-        _embed_context_ids(db_fig, ids, figure_slug)
+        report = embed_contexts(db_fig, ids)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Embed-all failed: {exc}")
-    return {"embedded": len(ids)}
+    if report.failed and not report.count("embedded"):
+        raise HTTPException(status_code=502, detail=f"Embed-all failed: {report.failed[0].error}")
+    return report.as_dict()
 
 
 class IngestSourcePayload(BaseModel):
     source: str = Field(..., description="Source key e.g. 'wikipedia'")
     url: Optional[str] = Field(None, description="Override URL if not in figure metadata")
     auto_embed: bool = False
+    chunk_strategy: Optional[str] = Field(None, description="Chunking strategy: sentence, paragraph or heading")
 
 
 @router.post("/figure/{figure_slug}/ingest-source")
 def ingest_source(
     figure_slug: str,
     payload: IngestSourcePayload,
-    _: models.User = Depends(get_admin_user),
+    _: schemas.UserRead = Depends(get_admin_user),
     db_fig: Session = Depends(get_figure_db),
 ) -> dict:
     fig = db_fig.query(models.HistoricalFigure).filter(models.HistoricalFigure.slug == figure_slug).first()
     if not fig:
         raise HTTPException(status_code=404, detail="Figure not found")
+    config = _chunker_config(payload.chunk_strategy)
     import json, requests
     wiki_links = {}
     try:
@@ -664,5 +826,6 @@ def ingest_source(
         source_name=source,
         content_type="ingest",
         auto_embed=payload.auto_embed,
+        config=config,
     )
     return {"created": len(new_ids), "chunks": [r.dict() for r in chunk_results], "auto_embedded": payload.auto_embed}
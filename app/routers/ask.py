@@ -11,13 +11,15 @@ from __future__ import annotations
 from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session
 
-from app import crud, models, schemas
+from app import crud, schemas
 from app.database import get_db_chat
 from app.figures_database import FigureSessionLocal
+from app.services import rate_limit, write_behind
 from app.utils.prompt import build_prompt
 from app.utils.security import get_current_user
+from app.utils.timing import span
 from app.services.llm_client import llm_client
 
 
@@ -34,6 +36,7 @@ def get_figure_db():
 
 def generate_answer(context: Dict[str, Any], prompt: List[Dict[str, str]], *, model: Optional[str] = None, temperature: Optional[float] = None) -> Tuple[str, Dict[str, Any]]:
     """Call the LLM client and return (answer, usage). Separated for test monkeypatching."""
+    # LlmClient takes the LLM gate slot itself, so coalesced followers do not hold one
     resp = llm_client.generate(messages=prompt, model=model, temperature=temperature)
     text = ""
     choices = resp.get("choices") or []
@@ -44,42 +47,51 @@ def generate_answer(context: Dict[str, Any], prompt: List[Dict[str, str]], *, mo
     return text, usage
 
 
-@router.post("/ask")
-def ask(payload: schemas.AskRequest, db: Session = Depends(get_db_chat), fig_db: Session = Depends(get_figure_db), current_user: models.User = Depends(get_current_user)):
-    # Validate user
-    if not crud.get_user_by_id(db, payload.user_id or 0):
-        raise HTTPException(status_code=404, detail="User not found")
+@router.post("/ask", dependencies=[Depends(rate_limit.limit_user)])
+def ask(payload: schemas.AskRequest, db: Session = Depends(get_db_chat), fig_db: Session = Depends(get_figure_db), current_user: schemas.UserRead = Depends(get_current_user)):
+    # Validate user; the authenticated user was already resolved (and cached) by get_current_user
+    with span("validate_user"):
+        if payload.user_id != current_user.id and not crud.get_user_by_id(db, payload.user_id or 0):
+            raise HTTPException(status_code=404, detail="User not found")
 
-    # Validate/ensure thread
+    # Validate an existing thread (reads only; nothing is written until the answer is known)
     thread_id = payload.thread_id
     if thread_id is not None:
-        thread = crud.get_thread_by_id(db, thread_id)
+        with span("thread_lookup"):
+            thread = crud.get_thread_by_id(db, thread_id)
         if not thread:
             raise HTTPException(status_code=404, detail="Thread not found")
         if thread.user_id != current_user.id:
             raise HTTPException(status_code=403, detail="Forbidden")
-    else:
-        # Create a new thread if none provided
-        t = crud.create_thread(db, schemas.ThreadCreate(user_id=payload.user_id, title=payload.figure_slug or "Chat", figure_slug=payload.figure_slug))
-        thread_id = t.id
 
-    # Persist the user message
-    crud.create_chat_message(db, schemas.ChatMessageCreate(user_id=payload.user_id, role="user", message=payload.message, model_used=payload.model_used, source_page=payload.source_page, thread_id=thread_id))
+    def _persist_user_turn() -> int:
+        # Thread and user message are flushed, not committed; ids come back from the INSERTs.
+        tid = thread_id
+        if tid is None:
+            t = crud.create_thread(db, schemas.ThreadCreate(user_id=payload.user_id, title=payload.figure_slug or "Chat", figure_slug=payload.figure_slug), commit=False)
+            tid = t.id
+        crud.create_chat_message(db, schemas.ChatMessageCreate(user_id=payload.user_id, role="user", message=payload.message, model_used=payload.model_used, source_page=payload.source_page, thread_id=tid), commit=False)
+        return tid
 
     # For preview-only posts (no LLM call)
     if payload.skip_llm:
+        with span("persist"):
+            thread_id = _persist_user_turn()
+            db.commit()
         return {"ok": True, "thread_id": thread_id}
 
     # Load figure + contexts (if provided)
     figure = None
     if payload.figure_slug:
-        figure = crud.get_figure_by_slug(fig_db, slug=payload.figure_slug)
-
-    # Build prompt including minimal history for the thread
-    history = [
-        {"role": c.role, "message": c.message}
-        for c in crud.get_messages_by_thread(db, thread_id, limit=50)
-    ]
+        with span("figure_load"):
+            figure = crud.get_figure_by_slug(fig_db, slug=payload.figure_slug)
+
+    # Prior turns only; build_prompt appends the current message itself
+    with span("history"):
+        history = [
+            {"role": c.role, "message": c.message}
+            for c in crud.get_messages_by_thread(db, thread_id, limit=50)
+        ] if thread_id is not None else []
     messages, sources = build_prompt(
         figure=figure,
         user_message=payload.message,
@@ -89,15 +101,50 @@ def ask(payload: schemas.AskRequest, db: Session = Depends(get_db_chat), fig_db:
         debug=False,
     )
 
-    answer, usage = generate_answer({"figure": payload.figure_slug}, messages, model=payload.model_used)
-
-    # Persist assistant message
-    msg = crud.create_chat_message(db, schemas.ChatMessageCreate(user_id=payload.user_id, role="assistant", message=answer, model_used=payload.model_used, source_page=payload.source_page, thread_id=thread_id))
+    # No write is pending during the LLM call, so SQLite's write lock is not held across it
+    try:
+        with span("llm"):
+            answer, usage = generate_answer({"figure": payload.figure_slug}, messages, model=payload.model_used)
+    except Exception:
+        # Keep the question so the user can see and retry it
+        db.rollback()
+        _persist_user_turn()
+        db.commit()
+        raise
+
+    if write_behind.queue.is_async:
+        # Only a new thread is written on the response path; both messages go
+        # through the write-behind queue and land before the thread is read again.
+        if thread_id is None:
+            t = crud.create_thread(db, schemas.ThreadCreate(user_id=payload.user_id, title=payload.figure_slug or "Chat", figure_slug=payload.figure_slug), commit=False)
+            thread_id = t.id
+            db.commit()
+        turn = [
+            schemas.ChatMessageCreate(user_id=payload.user_id, role=role, message=text, model_used=payload.model_used, source_page=payload.source_page, thread_id=thread_id)
+            for role, text in (("user", payload.message), ("assistant", answer))
+        ]
+        with span("persist"):
+            crud.queue_chat_messages(db, turn)
+        return {
+            "answer": answer,
+            "sources": sources,
+            "usage": usage,
+            "thread_id": thread_id,
+            # Row ids are assigned at flush time
+            "id": None,
+        }
+
+    # One transaction (one fsync) for thread, user message and answer
+    with span("persist"):
+        thread_id = _persist_user_turn()
+        msg = crud.create_chat_message(db, schemas.ChatMessageCreate(user_id=payload.user_id, role="assistant", message=answer, model_used=payload.model_used, source_page=payload.source_page, thread_id=thread_id), commit=False)
+        msg_id = msg.id
+        db.commit()
 
     return {
         "answer": answer,
         "sources": sources,
         "usage": usage,
         "thread_id": thread_id,
-        "id": msg.id,
+        "id": msg_id,
     }
@@ -11,14 +11,14 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy.orm import Session
 
-from app import crud, schemas, models
+from app import crud, schemas
 from app.database import get_db_chat
 from app.routers.deps import get_credentials
+from app.services.auth_pool import authenticate_user, hash_password_async, pool as auth_pool
 from app.settings import get_settings
 from app.utils.security import (
+    admin_required,
     create_access_token,
-    hash_password,
-    verify_password,
     get_current_user,
 )
 
@@ -89,7 +89,7 @@ async def login_for_access_token(
     Authenticate a user and return a user-scoped JWT access token.
     """
     user = crud.get_user_by_username(db, username=credentials.username)
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not await authenticate_user(db, user, credentials.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
 
     access_token = create_access_token(
@@ -117,7 +117,7 @@ async def register_user(
 
     _validate_password_strength(payload.password)
 
-    hashed_pw = hash_password(payload.password)
+    hashed_pw = await hash_password_async(payload.password)
     user_schema = schemas.UserCreate(username=payload.email, hashed_password=hashed_pw)
     user = crud.create_user(db, user_schema)
 
@@ -147,7 +147,7 @@ async def admin_stepup(
     user = crud.get_user_by_username(db, username=current_user.username)
     if not user or user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
-    if not verify_password(payload.password, user.hashed_password):
+    if not await authenticate_user(db, user, payload.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
 
     admin_token = create_access_token(data={"sub": user.username}, scope="admin")
@@ -168,7 +168,7 @@ async def admin_login(
     user = crud.get_user_by_username(db, username=credentials.username)
     if not user or user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
-    if not verify_password(credentials.password, user.hashed_password):
+    if not await authenticate_user(db, user, credentials.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
 
     user_token = create_access_token(
@@ -186,7 +186,7 @@ async def admin_login(
 
 
 @router.get("/me")
-async def auth_me(current_user: models.User = Depends(get_current_user)) -> dict:
+async def auth_me(current_user: schemas.UserRead = Depends(get_current_user)) -> dict:
     """Return the current authenticated user's basic profile.
 
     This leverages the standard user-scoped bearer token produced by /auth/login or /auth/register.
@@ -195,5 +195,11 @@ async def auth_me(current_user: models.User = Depends(get_current_user)) -> dict
     return {
         "user_id": current_user.id,
         "username": current_user.username,
-        "role": getattr(current_user, "role", None),
+        "role": current_user.role,
     }
+
+
+@router.get("/admin/pool-stats")
+def auth_pool_stats(_=Depends(admin_required)) -> dict:
+    """Return password-hashing pool occupancy and queue-wait counters for this worker."""
+    return auth_pool.stats()
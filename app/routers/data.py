@@ -3,34 +3,131 @@ Data download routes for exporting application artifacts.
 """
 
 import os
-from typing import Optional
+import re
+import sqlite3
+from typing import Iterator, Literal, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app.services.db_snapshot import snapshots
 
 router = APIRouter(tags=["Data"])
 
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK = 256 * 1024
+_MEDIA = {"identity": "application/octet-stream", "gzip": "application/gzip", "zstd": "application/zstd"}
+_SUFFIX = {"identity": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive (start, end) for a single byte range, None to send the whole file."""
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None  # multi-range or malformed: ignore and send 200
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        start, end = max(0, size - int(m.group(2))), size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(_CHUNK, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
 
-def _resolve_data_dir() -> str:
-    """
-    Resolves the directory containing data assets.
-    """
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    default_dir = os.path.join(base_dir, "data")
-    return os.getenv("DATA_DIR", default_dir)
+
+def _negotiate(request: Request, available: dict) -> str:
+    accept = request.headers.get("accept-encoding", "").lower()
+    for encoding in ("zstd", "gzip"):
+        if encoding in available and encoding in accept:
+            return encoding
+    return "identity"
 
 
 @router.get("/download_db")
-def download_figures_db() -> FileResponse:
+async def download_figures_db(
+    request: Request,
+    compression: Optional[Literal["none", "gzip", "zstd"]] = Query(
+        None,
+        description="Download a compressed file (figures.db.gz / .zst) instead of figures.db. "
+        "Without it, gzip/zstd is applied as Content-Encoding when the client accepts it and no Range is requested.",
+    ),
+) -> Response:
     """
-    Streams the figures database file as an attachment.
+    Serve a consistent snapshot of the figures database as an attachment.
+
+    The snapshot is taken with the SQLite backup API and reused until the
+    database changes. Responses carry a strong ETag, honour If-None-Match,
+    and support single byte ranges (with If-Range) so downloads can resume.
     """
-    data_dir = _resolve_data_dir()
-    db_path = os.path.join(data_dir, "figures.db")
-    if not os.path.isfile(db_path):
+    try:
+        snap = await run_in_threadpool(snapshots.get)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Database file not found")
-    return FileResponse(
-        db_path,
-        media_type="application/octet-stream",
-        filename="figures.db",
+    except sqlite3.DatabaseError:
+        raise HTTPException(status_code=500, detail="Database file is not a readable SQLite database")
+
+    range_header = request.headers.get("range")
+    if compression is not None:
+        variant = "identity" if compression == "none" else compression
+        if variant not in snap.files:
+            raise HTTPException(status_code=400, detail=f"{compression} compression is not available on this server")
+        transfer_encoding = None
+    elif range_header is None:
+        # Ranges apply to the encoded bytes, so only negotiate encoding for whole-file requests.
+        variant = _negotiate(request, snap.files)
+        transfer_encoding = None if variant == "identity" else variant
+    else:
+        variant, transfer_encoding = "identity", None
+
+    path = snap.files[variant]
+    size = os.path.getsize(path)
+    etag = snap.etag(variant)
+    filename = "figures.db" + ("" if transfer_encoding else _SUFFIX[variant])
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Vary": "Accept-Encoding",
+    }
+    if transfer_encoding:
+        headers["Content-Encoding"] = transfer_encoding
+
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or etag in {t.strip() for t in inm.split(",")}):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if_range = request.headers.get("if-range")
+    byte_range = _parse_range(range_header, size) if (if_range is None or if_range.strip() == etag) else None
+    media_type = "application/octet-stream" if transfer_encoding else _MEDIA[variant]
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_iter_file(path, 0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers,
     )
@@ -1,14 +1,15 @@
 """Figures API router for Places in Time History Chat."""
 
-from typing import Generator, List
+from typing import Generator, List, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Response
 from sqlalchemy.orm import Session
 
-from app import crud, schemas, models
+from app import crud, schemas
 from app.utils.security import get_current_user
 from app.figures_database import FigureSessionLocal
 from app.database import get_db_chat
+from app.utils.http_cache import cached_json_response
 
 router = APIRouter(prefix="/figures", tags=["Figures"])
 
@@ -28,26 +29,40 @@ def get_figure_db() -> Generator[Session, None, None]:
     status_code=status.HTTP_200_OK,
 )
 def list_figures(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of records to skip."),
     limit: int = Query(100, ge=1, le=500, description="Maximum records to return."),
     db: Session = Depends(get_figure_db),
-) -> List[schemas.HistoricalFigureRead]:
-    """Return a paginated list of historical figures."""
-    return crud.get_all_figures(db, skip=skip, limit=limit)
+) -> Response:
+    """Return a paginated list of historical figures (ETag/304, cached per catalogue revision)."""
+    return cached_json_response(
+        request,
+        db,
+        ("figures", skip, limit),
+        lambda: [schemas.HistoricalFigureRead.model_validate(f) for f in crud.get_all_figures(db, skip=skip, limit=limit)],
+    )
 
 
 @router.get(
     "/search",
-    response_model=List[schemas.HistoricalFigureRead],
+    response_model=List[schemas.FigureSearchHit],
     status_code=status.HTTP_200_OK,
 )
 def search_figures(
-    q: str = Query(..., min_length=1, description="Query string to match against name or slug."),
+    q: str = Query(..., min_length=1, description="Search text matched against name, slug, era, roles, site and summary."),
     limit: int = Query(20, ge=1, le=100, description="Maximum number of matches to return."),
+    mode: Literal["prefix", "fulltext"] = Query("prefix", description="prefix for typeahead, fulltext for whole-word matches."),
+    highlight: bool = Query(True, description="Include an HTML snippet with matches wrapped in <mark>."),
     db: Session = Depends(get_figure_db),
-) -> List[schemas.HistoricalFigureRead]:
-    """Return figures whose name or slug contains the query string (case-insensitive)."""
-    return crud.search_figures(db, q, limit=limit)
+) -> List[schemas.FigureSearchHit]:
+    """Return figures matching the query, ranked by BM25 relevance."""
+    hits = crud.search_figures_ranked(db, q, limit=limit, mode=mode)
+    return [
+        schemas.FigureSearchHit.model_validate(fig).model_copy(
+            update={"score": score, "snippet": snippet if highlight else None}
+        )
+        for fig, score, snippet in hits
+    ]
 
 
 # Favorites endpoints BEFORE slug routes to avoid any matching ambiguity
@@ -61,28 +76,38 @@ def search_figures(
 )
 def get_figure_by_slug(
     slug: str,
+    request: Request,
     db: Session = Depends(get_figure_db),
-) -> schemas.HistoricalFigureDetail:
-    """Return full details for a single historical figure."""
-    figure = crud.get_figure_by_slug(db, slug=slug)
-    if not figure:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Figure not found",
-        )
-    return figure
+) -> Response:
+    """Return full details for a single historical figure (ETag/304, cached per catalogue revision)."""
+
+    def build() -> schemas.HistoricalFigureDetail:
+        figure = crud.get_figure_by_slug(db, slug=slug)
+        if not figure:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Figure not found",
+            )
+        return schemas.HistoricalFigureDetail.model_validate(figure)
+
+    return cached_json_response(request, db, ("figure", slug), build)
 
 
 @router.get("/{slug}/bio", status_code=status.HTTP_200_OK)
 def get_figure_bio(
     slug: str,
+    request: Request,
     db: Session = Depends(get_figure_db),  # must be figures DB
-) -> dict:
+) -> Response:
     """
     Return a concise description (bio/summary) for a given figure slug.
     """
-    desc = crud.get_figure_description(db, slug)
-    return {"slug": slug, "description": desc}
+    return cached_json_response(
+        request,
+        db,
+        ("bio", slug),
+        lambda: {"slug": slug, "description": crud.get_figure_description(db, slug)},
+    )
 
 
 @router.get(
@@ -92,15 +117,10 @@ def get_figure_bio(
 )
 def list_favorites(
     db: Session = Depends(get_db_chat),
-    current_user: models.User = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ):
     """Return the authenticated user's favorited figures."""
-    user_id_val = getattr(current_user, 'id', None)
-    if hasattr(user_id_val, 'expression'):
-        user_id_val = current_user.__dict__.get('id', None)
-    if user_id_val is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    return crud.get_favorites_by_user(db, int(user_id_val))
+    return crud.get_favorites_by_user(db, current_user.id)
 
 
 @router.post(
@@ -112,19 +132,14 @@ def add_favorite(
     figure_slug: str,
     db: Session = Depends(get_db_chat),  # chat DB for favorites table
     fig_db: Session = Depends(get_figure_db),  # figures DB for existence check
-    current_user: models.User = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ):
     """Add a figure to the authenticated user's favorites."""
     # Validate figure exists (optional but helpful)
     fig = crud.get_figure_by_slug(fig_db, slug=figure_slug)
     if not fig:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Figure not found")
-    user_id_val = getattr(current_user, 'id', None)
-    if hasattr(user_id_val, 'expression'):
-        user_id_val = current_user.__dict__.get('id', None)
-    if user_id_val is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    return crud.add_favorite(db, int(user_id_val), figure_slug)
+    return crud.add_favorite(db, current_user.id, figure_slug)
 
 
 @router.delete(
@@ -134,15 +149,10 @@ def add_favorite(
 def remove_favorite(
     figure_slug: str,
     db: Session = Depends(get_db_chat),
-    current_user: models.User = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ):
     """Remove a figure from the authenticated user's favorites."""
-    user_id_val = getattr(current_user, 'id', None)
-    if hasattr(user_id_val, 'expression'):
-        user_id_val = current_user.__dict__.get('id', None)
-    if user_id_val is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    ok = crud.remove_favorite(db, int(user_id_val), figure_slug)
+    ok = crud.remove_favorite(db, current_user.id, figure_slug)
     if not ok:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Favorite not found")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
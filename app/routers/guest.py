@@ -18,11 +18,14 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session, selectinload
 
 from app import crud, models, schemas
-from app.database import get_db_chat
+from app.database import engine as chat_engine, get_db_chat
 from app.figures_database import FigureSessionLocal
+from app.services import rate_limit
 from app.settings import get_settings
 from app.utils.prompt import build_prompt
-from app.utils.security import get_current_user
+from app.services.guest_sweeper import sweeper
+from app.utils.security import get_admin_user, get_current_user
+from app.utils.timing import span
 
 router = APIRouter(prefix="/guest", tags=["Guest"])
 
@@ -181,7 +184,25 @@ def start_guest_session(
     )
 
 
-@router.post("/ask", response_model=GuestAskResponse)
+def _raise_unreserved(db: Session, guest_token: str) -> None:
+    """
+    Explain why a quota reservation failed with the matching HTTP error.
+
+    Raises
+    ------
+    fastapi.HTTPException
+        400 for an unknown session, 401 if expired, 403 if the limit is reached.
+    """
+    gs = models.GuestSession
+    row = db.query(gs.expires_at, gs.question_count).filter(gs.session_token == guest_token).first()
+    if row is None:
+        raise HTTPException(status_code=400, detail="Invalid guest session")
+    if row.expires_at and row.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=401, detail="Guest session expired")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Guest question limit reached")
+
+
+@router.post("/ask", response_model=GuestAskResponse, dependencies=[Depends(rate_limit.limit_guest)])
 def guest_ask(
     payload: GuestAskRequest,
     response: Response,
@@ -213,47 +234,43 @@ def guest_ask(
     if not guest_token:
         raise HTTPException(status_code=400, detail="Guest session not found")
     limits = _get_limits()
-    session = (
-        db.query(models.GuestSession)
-        .filter(models.GuestSession.session_token == guest_token)
-        .first()
-    )
-    if not session:
-        raise HTTPException(status_code=400, detail="Invalid guest session")
-    if session.expires_at and session.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=401, detail="Guest session expired")
-    if session.question_count >= limits["max_questions"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Guest question limit reached")
+    with span("quota_reserve"):
+        reserved = crud.reserve_guest_question(db, guest_token, limits["max_questions"], datetime.utcnow())
+    if reserved is None:
+        _raise_unreserved(db, guest_token)
+    session_id, figure_slug, question_count = reserved
 
-    figure = (
-        figure_db.query(models.HistoricalFigure)
-        .options(selectinload(models.HistoricalFigure.contexts))
-        .filter(models.HistoricalFigure.slug == session.figure_slug)
-        .first()
-    )
-    if not figure:
-        raise HTTPException(status_code=404, detail="Figure not found for this session")
-
-    history_before = (
-        db.query(models.GuestMessage)
-        .filter(models.GuestMessage.session_id == session.id)
-        .order_by(models.GuestMessage.id.asc())
-        .all()
-    )
-    history_dicts = [{"role": m.role, "message": m.message} for m in history_before]
-
-    messages, sources = build_prompt(
-        figure=figure,
-        user_message=payload.message,
-        thread_history=history_dicts,
-        max_context_chars=4000,
-        use_rag=_settings.rag_enabled,
-        debug=_settings.guest_prompt_debug,
-    )
+    try:
+        with span("figure_load"):
+            figure = (
+                figure_db.query(models.HistoricalFigure)
+                .options(selectinload(models.HistoricalFigure.contexts))
+                .filter(models.HistoricalFigure.slug == figure_slug)
+                .first()
+            )
+        if not figure:
+            raise HTTPException(status_code=404, detail="Figure not found for this session")
+
+        with span("history"):
+            history = crud.get_guest_history(db, session_id)
+        messages, sources = build_prompt(
+            figure=figure,
+            user_message=payload.message,
+            thread_history=history,
+            max_context_chars=4000,
+            use_rag=_settings.rag_enabled,
+            debug=_settings.guest_prompt_debug,
+        )
 
-    from app.config.llm_config import llm_config
-    model_name = payload.model_used or llm_config.model
-    resp = llm_client.generate(messages=messages, model=model_name, temperature=llm_config.temperature)
+        from app.config.llm_config import llm_config_snapshot
+        cfg = llm_config_snapshot()
+        model_name = payload.model_used or cfg.model
+        with span("llm"):
+            resp = llm_client.generate(messages=messages, model=model_name, temperature=cfg.temperature, config=cfg)
+    except Exception:
+        # Nothing was answered; give the reserved question back.
+        crud.release_guest_question(db, session_id)
+        raise
     answer = resp["choices"][0]["message"]["content"].strip() if resp.get("choices") else ""
     usage = resp.get("usage", {
         "prompt_tokens": None,
@@ -261,12 +278,10 @@ def guest_ask(
         "total_tokens": None,
     })
 
-    db.add(models.GuestMessage(session_id=session.id, role="user", message=payload.message, model_used=model_name))
-    db.add(models.GuestMessage(session_id=session.id, role="assistant", message=answer, model_used=model_name))
-    session.question_count += 1
-    db.commit()
+    with span("persist"):
+        crud.add_guest_turn(db, session_id, payload.message, answer, model_name)
 
-    remaining = max(0, limits["max_questions"] - session.question_count)
+    remaining = max(0, limits["max_questions"] - question_count)
     return GuestAskResponse(
         answer=answer,
         sources=sources,
@@ -280,7 +295,7 @@ def guest_ask(
 def upgrade_guest_session(
     response: Response,
     db: Session = Depends(get_db_chat),
-    current_user: models.User = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
     guest_token: Optional[str] = Cookie(default=None, alias="guest_session"),
 ) -> GuestUpgradeResponse:
     """
@@ -292,7 +307,7 @@ def upgrade_guest_session(
         Response instance to clear cookies on completion.
     db : sqlalchemy.orm.Session
         Chat database session.
-    current_user : app.models.User
+    current_user : app.schemas.UserRead
         Authenticated user.
     guest_token : str | None
         Guest session cookie value.
@@ -305,7 +320,7 @@ def upgrade_guest_session(
     if not guest_token:
         raise HTTPException(status_code=400, detail="Guest session not found")
     session = (
-        db.query(models.GuestSession)
+        db.query(models.GuestSession.id, models.GuestSession.figure_slug)
         .filter(models.GuestSession.session_token == guest_token)
         .first()
     )
@@ -313,39 +328,31 @@ def upgrade_guest_session(
         raise HTTPException(status_code=400, detail="Invalid guest session")
 
     title = f"Guest chat with {session.figure_slug or 'figure'}"
-    thread_schema = schemas.ThreadCreate(
-        user_id=current_user.id,
-        title=title,
-        figure_slug=session.figure_slug,
-    )
-    thread = crud.create_thread(db, thread_schema)
-
-    messages = (
-        db.query(models.GuestMessage)
-        .filter(models.GuestMessage.session_id == session.id)
-        .order_by(models.GuestMessage.id.asc())
-        .all()
-    )
-    for m in messages:
-        chat_schema = schemas.ChatMessageCreate(
-            user_id=current_user.id,
-            role=m.role,
-            message=m.message,
-            model_used=m.model_used,
-            source_page=None,
-            thread_id=thread.id,
-            summary_of=None,
-        )
-        crud.create_chat_message(db, chat_schema)
-
-    db.query(models.GuestMessage).filter(models.GuestMessage.session_id == session.id).delete()
-    db.delete(session)
-    db.commit()
+    transferred = crud.transfer_guest_transcript(db, session.id, current_user.id, title, session.figure_slug)
+    if transferred is None:
+        raise HTTPException(status_code=409, detail="Guest session was already upgraded")
+    thread_id, count = transferred
 
     response.delete_cookie("guest_session", path="/")
     return GuestUpgradeResponse(
         upgraded=True,
         user_id=current_user.id,
-        thread_id=thread.id,
-        transferred_messages=len(messages),
+        thread_id=thread_id,
+        transferred_messages=count,
     )
+
+
+@router.get("/admin/sweep")
+def guest_sweep_stats(_: schemas.UserRead = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Return the last expired-session sweep report and running totals for this worker.
+    """
+    return sweeper.stats()
+
+
+@router.post("/admin/sweep")
+def run_guest_sweep(_: schemas.UserRead = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Delete expired guest sessions now and return the sweep report.
+    """
+    return sweeper.run_once(chat_engine).as_dict()
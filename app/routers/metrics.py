@@ -0,0 +1,123 @@
+"""
+Prometheus scrape endpoint and the domain metrics read at scrape time.
+
+Exposes:
+- GET /metrics
+
+Request, LLM, embedding and DB-pool metrics are recorded where they happen
+(see ``app.utils.metrics``). This module adds the values that are read
+from existing state instead:
+
+- per-process: pipeline stage histograms from ``app.utils.timing`` (including
+  ``chroma_query`` and ``embed_query``), catalogue cache hits, LLM gate
+  occupancy and write-behind queue depth;
+- database-wide, evaluated once per scrape: guest session counts and
+  embedding job/task queue depth.
+"""
+
+from __future__ import annotations
+
+import hmac
+import os
+import time
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func
+
+from app import models
+from app.database import SessionLocal
+from app.figures_database import FigureSessionLocal
+from app.services import rate_limit, single_flight, write_behind
+from app.utils import metrics, timing
+from app.utils.http_cache import response_cache
+
+router = APIRouter(tags=["Metrics"])
+
+
+def _stage_families() -> metrics.Families:
+    bounds = [b / 1000.0 for b in timing.BUCKETS_MS]
+    samples = []
+    for name, hist in sorted(timing.histograms().items()):
+        with hist._lock:
+            samples.append([{"stage": name}, {"counts": list(hist.counts), "sum": hist.total_ms / 1000.0}])
+    return {
+        "pit_stage_duration_seconds": {
+            "type": "histogram",
+            "help": "Pipeline stage latency from request timing spans (llm, rag, embed_query, chroma_query, ...).",
+            "buckets": bounds,
+            "samples": samples,
+        }
+    }
+
+
+def _process_families() -> metrics.Families:
+    cache = response_cache.stats()
+    gate = rate_limit.stats()["llm"]
+    queue = write_behind.queue.stats()
+    flights = single_flight.llm_flights.stats()
+    return {
+        "pit_cache_requests_total": metrics.counter_family(
+            "Response cache lookups by result.",
+            [({"cache": "catalog", "result": r}, cache[k]) for r, k in (("hit", "hits"), ("miss", "misses"), ("not_modified", "not_modified"))],
+        ),
+        "pit_cache_entries": metrics.gauge_family("Entries held in the response cache.", [({"cache": "catalog"}, cache["entries"])]),
+        "pit_llm_gate_inflight": metrics.gauge_family("LLM calls holding an admission slot.", [({}, gate["inflight"])]),
+        "pit_llm_gate_waiting": metrics.gauge_family("LLM calls queued for an admission slot.", [({}, gate["waiting"])]),
+        "pit_llm_coalesce_inflight": metrics.gauge_family(
+            "Coalesced LLM calls in flight (keys) and followers waiting on them.",
+            [({"kind": "keys"}, flights["inflight_keys"]), ({"kind": "waiting"}, flights["waiting"])],
+        ),
+        "pit_write_behind_pending_rows": metrics.gauge_family("Rows queued for write-behind persistence.", [({}, queue["pending_rows"])]),
+    }
+
+
+def _database_families() -> metrics.Families:
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        active, total = db.query(
+            func.coalesce(
+                func.sum(case((models.GuestSession.expires_at.is_(None), 1), (models.GuestSession.expires_at > now, 1), else_=0)), 0
+            ),
+            func.count(models.GuestSession.id),
+        ).one()
+    with FigureSessionLocal() as fig_db:
+        tasks = fig_db.query(models.EmbeddingTask.status, func.count()).group_by(models.EmbeddingTask.status).all()
+        jobs = fig_db.query(models.EmbeddingJob.status, func.count()).group_by(models.EmbeddingJob.status).all()
+        oldest = fig_db.query(func.min(models.EmbeddingTask.available_at)).filter(models.EmbeddingTask.status == "queued").scalar()
+    return {
+        "pit_guest_sessions": metrics.gauge_family(
+            "Guest sessions in the database by state.",
+            [({"state": "active"}, active), ({"state": "expired"}, total - active)],
+        ),
+        "pit_embedding_tasks": metrics.gauge_family("Embedding tasks by status (queued = queue depth).", [({"status": s}, n) for s, n in tasks]),
+        "pit_embedding_jobs": metrics.gauge_family("Embedding jobs by status.", [({"status": s}, n) for s, n in jobs]),
+        "pit_embedding_queue_oldest_age_seconds": metrics.gauge_family(
+            "Age of the oldest queued embedding task.", [({}, max(0.0, time.time() - oldest) if oldest else 0.0)]
+        ),
+    }
+
+
+metrics.register_callback(_stage_families)
+metrics.register_callback(_process_families)
+metrics.register_callback(_database_families, scope="global")
+
+
+def _authorised(request: Request) -> bool:
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        return True
+    header = request.headers.get("authorization", "")
+    return hmac.compare_digest(header, f"Bearer {token}")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request) -> Response:
+    """Serve all metrics, merged across workers, in the Prometheus text format."""
+    if not metrics.enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not _authorised(request):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    body = await run_in_threadpool(metrics.registry.render)
+    return Response(content=body, media_type=metrics.CONTENT_TYPE)
@@ -3,7 +3,7 @@ Pydantic schemas for request and response validation, including admin RBAC and a
 """
 
 from datetime import datetime
-from typing import Any, List, Optional
+from typing import Any, List, Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -188,6 +188,15 @@ class HistoricalFigureRead(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class FigureSearchHit(HistoricalFigureRead):
+    """
+    Search result: a figure summary plus its relevance score and highlighted snippet.
+    """
+
+    score: Optional[float] = None
+    snippet: Optional[str] = None
+
+
 class HistoricalFigureDetail(HistoricalFigureRead):
     """
     Detailed schema for a single historical figure.
@@ -281,3 +290,25 @@ class FavoriteRead(BaseModel):
     figure_slug: str
 
     model_config = {"from_attributes": True}
+
+
+class LlmProfileFields(BaseModel):
+    """
+    LLM profile settings accepted by the admin API; omitted fields keep their value.
+
+    ``api_base`` is not accepted: it decides where the server's API key is sent.
+    """
+
+    provider: Optional[Literal["openai", "openrouter"]] = None
+    model: Optional[str] = Field(default=None, min_length=1)
+    temperature: Optional[float] = Field(default=None, ge=0, le=2)
+    top_p: Optional[float] = Field(default=None, ge=0, le=1)
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+
+    model_config = {"extra": "forbid"}
+
+
+class LlmProfilePatch(LlmProfileFields):
+    """Body of ``PATCH /admin/llm``; ``profile`` names the profile to edit and activate."""
+
+    profile: Optional[str] = Field(default=None, min_length=1)
@@ -0,0 +1,179 @@
+"""
+Bounded executor for password hashing and verification.
+
+bcrypt_sha256 costs 100-300 ms of CPU per call. Running it inline in an
+``async def`` endpoint blocks the event loop, so a burst of logins stalls
+every other request on the worker. This module runs hashing on a small
+dedicated thread pool (the bcrypt backend releases the GIL) and caps the
+number of waiting jobs. Once the cap is reached, callers get 503 with
+Retry-After instead of an ever-growing queue.
+
+Environment
+-----------
+AUTH_POOL_WORKERS : int
+    Hashing threads per process (default min(4, CPU count)).
+AUTH_POOL_MAX_PENDING : int
+    Maximum running plus queued hash jobs before rejecting (default 64).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.utils.security import hash_password, verify_and_update_password
+
+T = TypeVar("T")
+
+
+def _pool_settings() -> Tuple[int, int]:
+    workers = int(os.getenv("AUTH_POOL_WORKERS", str(min(4, os.cpu_count() or 1))) or 1)
+    max_pending = int(os.getenv("AUTH_POOL_MAX_PENDING", "64") or 64)
+    return max(1, workers), max(1, max_pending)
+
+
+class AuthPool:
+    """
+    Thread pool with an admission cap and queueing metrics.
+
+    Parameters
+    ----------
+    workers : int | None
+        Thread count; defaults to AUTH_POOL_WORKERS.
+    max_pending : int | None
+        Admission cap; defaults to AUTH_POOL_MAX_PENDING.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None) -> None:
+        env_workers, env_pending = _pool_settings()
+        self.workers = workers or env_workers
+        self.max_pending = max_pending or env_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+            "run_ms_total": 0.0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="auth-hash")
+            return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run ``fn(*args)`` on the pool and await the result.
+
+        Raises
+        ------
+        fastapi.HTTPException
+            503 when the pool already has ``max_pending`` jobs.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication is busy, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self._stats["submitted"] += 1
+        enqueued = time.perf_counter()
+
+        def _task() -> Tuple[T, float, float]:
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - enqueued, time.perf_counter() - started
+
+        try:
+            loop = asyncio.get_running_loop()
+            result, waited, ran = await loop.run_in_executor(self._get_executor(), _task)
+        finally:
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_wait_ms_total"] += waited * 1000
+            self._stats["queue_wait_ms_max"] = max(self._stats["queue_wait_ms_max"], waited * 1000)
+            self._stats["run_ms_total"] += ran * 1000
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool size, occupancy and timing counters."""
+        with self._lock:
+            snap: Dict[str, Any] = dict(self._stats)
+            snap["pending"] = self._pending
+        done = snap["completed"] or 1
+        snap.update(
+            workers=self.workers,
+            max_pending=self.max_pending,
+            queue_wait_ms_avg=round(snap["queue_wait_ms_total"] / done, 2),
+            run_ms_avg=round(snap["run_ms_total"] / done, 2),
+        )
+        return snap
+
+    def shutdown(self) -> None:
+        """Stop the executor; a new one is created on next use."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+pool = AuthPool()
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the auth pool."""
+    return await pool.run(hash_password, password)
+
+
+async def verify_and_update_async(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the auth pool.
+
+    Returns
+    -------
+    tuple[bool, str | None]
+        Whether it matched, and a replacement hash when the stored one is stale.
+    """
+    return await pool.run(verify_and_update_password, password, hashed)
+
+
+async def authenticate_user(db: Session, user: Optional[models.User], password: str) -> bool:
+    """
+    Check a password for a (possibly missing) user, upgrading a stale hash on success.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Chat database session.
+    user : app.models.User | None
+        User looked up by username.
+    password : str
+        Submitted password.
+
+    Returns
+    -------
+    bool
+        True if the user exists and the password matches.
+    """
+    ok, new_hash = await verify_and_update_async(password, user.hashed_password if user else None)
+    if ok and user is not None and new_hash:
+        crud.update_user_password_hash(db, user, new_hash)
+    return ok and user is not None
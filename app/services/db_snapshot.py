@@ -0,0 +1,211 @@
+"""
+Consistent, cached snapshots of figures.db for download.
+
+Copying the live database file can tear it if a write lands mid-copy. The
+snapshot is instead taken with SQLite's online backup API, which yields a
+consistent image while readers and writers carry on. Snapshots are cached
+on disk together with gzip and (if the optional ``zstandard`` package is
+installed) zstd-compressed copies. Each snapshot is keyed by the database
+revision: the ``catalog_revision`` counter plus the size and mtime of the
+database and its WAL. A new one is built only after the database changes.
+
+Environment
+-----------
+DATA_DIR : str
+    Optional override; when set, ``DATA_DIR/figures.db`` is exported instead
+    of the database the app is connected to (FIGURES_DB_PATH).
+SNAPSHOT_CACHE_DIR : str
+    Where snapshot artifacts are written (default ``<tmp>/pit_db_snapshots``).
+SNAPSHOT_GZIP_LEVEL : int
+    gzip level for the compressed artifact (default 6).
+SNAPSHOT_ZSTD_LEVEL : int
+    zstd level for the compressed artifact (default 10).
+SNAPSHOT_PRUNE_GRACE_SECONDS : float
+    Older snapshot files are deleted only once they are at least this old,
+    so a download another worker is still serving is not pulled away
+    (default 600).
+
+Several workers may build the same revision at once. Every artifact is
+written to a temp file unique to the build and then published with
+``os.replace``, so the last finished build wins and no file is ever
+half-written.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from app.figures_database import engine as figures_engine
+
+try:  # optional dependency
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depends on environment
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_COPY_CHUNK = 1024 * 1024
+
+
+def _snapshot_settings() -> Dict[str, object]:
+    return {
+        "cache_dir": os.getenv("SNAPSHOT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "pit_db_snapshots"),
+        "gzip_level": int(os.getenv("SNAPSHOT_GZIP_LEVEL", "6") or 6),
+        "zstd_level": int(os.getenv("SNAPSHOT_ZSTD_LEVEL", "10") or 10),
+        "prune_grace": float(os.getenv("SNAPSHOT_PRUNE_GRACE_SECONDS", "600") or 0),
+    }
+
+
+def source_path() -> str:
+    """Return the figures database path to export (DATA_DIR override, else the app's engine)."""
+    data_dir = os.getenv("DATA_DIR")
+    if data_dir:
+        return os.path.join(data_dir, "figures.db")
+    return os.path.abspath(figures_engine.url.database or "figures.db")
+
+
+def _stat_sig(path: str) -> str:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "-"
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def revision_key(path: str) -> str:
+    """
+    Return a short key that changes whenever the database content may have changed.
+    """
+    revision = "-"
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT revision FROM catalog_revision WHERE id = 1").fetchone()
+            revision = str(row[0]) if row else "-"
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+    raw = "|".join((path, revision, _stat_sig(path), _stat_sig(path + "-wal")))
+    return hashlib.sha256(raw.encode()).hexdigest()[:20]
+
+
+@dataclass
+class Snapshot:
+    """A built snapshot: one file per encoding (``identity``, ``gzip``, ``zstd``)."""
+
+    key: str
+    files: Dict[str, str] = field(default_factory=dict)
+    built_at: float = 0.0
+    build_ms: float = 0.0
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.key}-{encoding}"'
+
+
+class SnapshotCache:
+    """Build snapshots on demand and reuse them until the revision key changes."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._current: Optional[Snapshot] = None
+        self.builds = 0
+
+    def get(self, path: Optional[str] = None) -> Snapshot:
+        """
+        Return the snapshot for the current database revision, building it if needed.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the source database does not exist.
+        sqlite3.DatabaseError
+            If the source is not a readable SQLite database.
+        """
+        path = path or source_path()
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        key = revision_key(path)
+        with self._lock:
+            snap = self._current
+            if snap is not None and snap.key == key and all(os.path.isfile(p) for p in snap.files.values()):
+                return snap
+            previous = snap.key if snap is not None else None
+            snap = self._build(path, key, previous)
+            self._current = snap
+            return snap
+
+    def _build(self, path: str, key: str, previous: Optional[str] = None) -> Snapshot:
+        cfg = _snapshot_settings()
+        cache_dir = str(cfg["cache_dir"])
+        os.makedirs(cache_dir, exist_ok=True)
+        started = time.perf_counter()
+        base = os.path.join(cache_dir, f"figures-{key}.db")
+        # Unique per build: concurrent builds in other workers never share a temp file
+        suffix = f"{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp = f"{base}.{suffix}"
+
+        src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        dst = sqlite3.connect(tmp)
+        try:
+            # Copies in steps so writers are not blocked for the whole copy.
+            src.backup(dst, pages=1024)
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, base)
+        files = {"identity": base}
+
+        gz_tmp = f"{base}.gz.{suffix}"
+        with open(base, "rb") as fin, gzip.open(gz_tmp, "wb", compresslevel=int(cfg["gzip_level"])) as fout:
+            shutil.copyfileobj(fin, fout, _COPY_CHUNK)
+        os.replace(gz_tmp, f"{base}.gz")
+        files["gzip"] = f"{base}.gz"
+
+        if zstandard is not None:
+            zst_tmp = f"{base}.zst.{suffix}"
+            with open(base, "rb") as fin, open(zst_tmp, "wb") as fout:
+                zstandard.ZstdCompressor(level=int(cfg["zstd_level"])).copy_stream(fin, fout)
+            os.replace(zst_tmp, f"{base}.zst")
+            files["zstd"] = f"{base}.zst"
+
+        keep = {f"figures-{key}.db"} | ({f"figures-{previous}.db"} if previous else set())
+        self._prune(cache_dir, keep, float(cfg["prune_grace"]))
+        self.builds += 1
+        build_ms = (time.perf_counter() - started) * 1000
+        logger.info("Built figures.db snapshot %s in %.0f ms (%s)", key, build_ms, ", ".join(files))
+        return Snapshot(key=key, files=files, built_at=time.time(), build_ms=build_ms)
+
+    @staticmethod
+    def _prune(cache_dir: str, keep: set, grace: float) -> None:
+        """
+        Delete other revisions' files (and abandoned temp files) older than ``grace`` seconds.
+
+        Files for ``keep`` prefixes are never touched. The grace period covers
+        snapshots another worker still holds as its current one.
+        """
+        cutoff = time.time() - grace
+        for name in os.listdir(cache_dir):
+            if not name.startswith("figures-") or any(name.startswith(k) and not name.endswith(".tmp") for k in keep):
+                continue
+            full = os.path.join(cache_dir, name)
+            try:
+                if os.path.getmtime(full) <= cutoff:
+                    os.remove(full)
+            except OSError:
+                pass
+
+
+snapshots = SnapshotCache()
@@ -6,10 +6,12 @@ Supports OpenAI, OpenRouter, and local SentenceTransformer providers.
 
 import logging
 import os
+import time
 from typing import List, Optional
 from sentence_transformers import SentenceTransformer
 from openai import OpenAI
 from app.settings import get_settings
+from app.utils import metrics
 
 _DIMENSIONS = {"local": 384, "openai": 1536}
 _LOCAL_MODEL = "all-MiniLM-L6-v2"
@@ -55,6 +57,8 @@ class EmbeddingClient:
         if not isinstance(text, str) or not text.strip():
             return [0.0] * self.get_embedding_dimension()
         arm = get_ab_arm(user_id)
+        started = time.perf_counter()
+        outcome = "ok"
         try:
             if self.provider == "openai" and isinstance(self.client, OpenAI):
                 response = self.client.embeddings.create(
@@ -75,14 +79,73 @@ class EmbeddingClient:
                     self.provider, _LOCAL_MODEL, arm
                 )
                 return embedding
+            outcome = "fallback"
             logging.info(
                 "Embedding call provider=%s model=%s arm=%s token_usage=0 (fallback)",
                 self.provider, "unknown", arm
             )
             return [0.0] * self.get_embedding_dimension()
         except Exception as e:
+            outcome = "error"
             logging.error(
                 "Embedding call failed provider=%s model=%s arm=%s error=%s",
                 self.provider, _OPENAI_MODEL if self.provider == "openai" else _LOCAL_MODEL, arm, str(e)
             )
             return [0.0] * self.get_embedding_dimension()
+        finally:
+            metrics.EMBEDDING_DURATION.labels(self.provider, "single", outcome).observe(time.perf_counter() - started)
+            metrics.EMBEDDING_TEXTS.labels(self.provider, "single").inc()
+
+    def get_embeddings(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        """
+        Embed many texts with one provider call per batch.
+
+        Unlike :meth:`get_embedding`, failures raise instead of returning zero
+        vectors, so callers never store placeholder embeddings.
+
+        Parameters
+        ----------
+        texts : list[str]
+            Non-empty texts to embed.
+        batch_size : int
+            Texts per provider request.
+
+        Returns
+        -------
+        list[list[float]]
+            One vector per input text, in order.
+
+        Raises
+        ------
+        RuntimeError
+            If no embedding backend is available.
+        """
+        if not texts:
+            return []
+        out: List[List[float]] = []
+        started = time.perf_counter()
+        try:
+            self._embed_batches(texts, batch_size, out)
+        except Exception:
+            metrics.EMBEDDING_DURATION.labels(self.provider, "batch", "error").observe(time.perf_counter() - started)
+            raise
+        metrics.EMBEDDING_DURATION.labels(self.provider, "batch", "ok").observe(time.perf_counter() - started)
+        metrics.EMBEDDING_TEXTS.labels(self.provider, "batch").inc(len(texts))
+        logging.info("Batch embedding provider=%s texts=%d", self.provider, len(texts))
+        return out
+
+    def _embed_batches(self, texts: List[str], batch_size: int, out: List[List[float]]) -> None:
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            if self.provider == "openai" and isinstance(self.client, OpenAI):
+                response = self.client.embeddings.create(
+                    input=[t.replace("\n", " ") for t in batch],
+                    model=_OPENAI_MODEL,
+                )
+                out.extend(d.embedding for d in sorted(response.data, key=lambda d: d.index))
+            elif isinstance(self.client, SentenceTransformer):
+                out.extend(
+                    v.tolist() for v in self.client.encode(batch, batch_size=batch_size, convert_to_tensor=False)
+                )
+            else:
+                raise RuntimeError(f"Embedding backend '{self.provider}' is not available")
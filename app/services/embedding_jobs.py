@@ -0,0 +1,506 @@
+"""
+Durable background embedding jobs backed by the figures database.
+
+Jobs and their tasks are stored in ``embedding_jobs`` / ``embedding_tasks`` so
+that status survives restarts and is visible from every gunicorn worker.
+Each worker process runs a small pool of threads that claim tasks with an
+atomic conditional UPDATE, embed the task's batch of contexts in one call,
+and record progress. Failed tasks are retried with exponential backoff;
+tasks whose worker died are reclaimed once their lease expires, and fail
+for good once they have used up their attempts.
+
+A claim is identified by the worker id and the attempt number. Outcomes are
+recorded only while that claim still holds, so a slow worker whose lease
+was reclaimed cannot count its batch a second time.
+
+A finished job is ``done`` when every batch succeeded, ``failed`` when none
+did, and ``partial`` otherwise.
+
+Environment
+-----------
+RAG_JOB_WORKERS : int
+    Worker threads per process (default 1, 0 disables).
+RAG_JOB_BATCH_SIZE : int
+    Context ids per task (default 32).
+RAG_JOB_MAX_ATTEMPTS : int
+    Attempts before a task is marked failed (default 5).
+RAG_JOB_LEASE_SECONDS : int
+    Seconds before a running task is considered abandoned (default 300).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.figures_database import FigureSessionLocal
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"done", "partial", "failed", "cancelled"}
+
+EmbedFn = Callable[[Session, List[int], str], Any]
+
+
+def _job_settings() -> Dict[str, Any]:
+    """
+    Return job queue tunables from the environment.
+
+    Returns
+    -------
+    dict
+        Worker count, batch size, retry and lease settings.
+    """
+    return {
+        "workers": int(os.getenv("RAG_JOB_WORKERS", "1") or "1"),
+        "batch_size": max(1, int(os.getenv("RAG_JOB_BATCH_SIZE", "32") or "32")),
+        "max_attempts": max(1, int(os.getenv("RAG_JOB_MAX_ATTEMPTS", "5") or "5")),
+        "lease_seconds": int(os.getenv("RAG_JOB_LEASE_SECONDS", "300") or "300"),
+        "backoff_base": float(os.getenv("RAG_JOB_BACKOFF_SECONDS", "2") or "2"),
+        "poll_interval": float(os.getenv("RAG_JOB_POLL_SECONDS", "1") or "1"),
+    }
+
+
+def _default_embed_fn(db: Session, ctx_ids: List[int], figure_slug: str) -> Any:
+    from app.vector.context_embedder import embed_contexts
+
+    report = embed_contexts(db, ctx_ids)
+    if report.failed:
+        raise RuntimeError(report.failed[0].error or "embedding failed")
+    return report
+
+
+def enqueue_embedding_job(
+    db: Session,
+    figure_slug: str,
+    ctx_ids: List[int],
+    batch_size: Optional[int] = None,
+) -> models.EmbeddingJob:
+    """
+    Create a job and split its context ids into claimable tasks.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session.
+    figure_slug : str
+        Figure the contexts belong to.
+    ctx_ids : list[int]
+        FigureContext ids to embed.
+    batch_size : int | None
+        Ids per task; defaults to RAG_JOB_BATCH_SIZE.
+
+    Returns
+    -------
+    app.models.EmbeddingJob
+        The persisted job.
+    """
+    size = batch_size or _job_settings()["batch_size"]
+    now = time.time()
+    job = models.EmbeddingJob(
+        id=uuid.uuid4().hex,
+        figure_slug=figure_slug,
+        status="queued",
+        total=len(ctx_ids),
+        done=0,
+        failed=0,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    db.add_all(
+        [
+            models.EmbeddingTask(
+                job_id=job.id,
+                context_ids=json.dumps(ctx_ids[i : i + size]),
+                status="queued",
+                attempts=0,
+                available_at=now,
+            )
+            for i in range(0, len(ctx_ids), size)
+        ]
+    )
+    db.commit()
+    _wake_workers()
+    return job
+
+
+def job_status(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a JSON-serializable progress snapshot for a job.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session.
+    job_id : str
+        Job identifier.
+
+    Returns
+    -------
+    dict | None
+        Progress fields, or None if the job does not exist.
+    """
+    job = db.get(models.EmbeddingJob, job_id)
+    if job is None:
+        return None
+    return {
+        "job_id": job.id,
+        "figure_slug": job.figure_slug,
+        "status": job.status,
+        "total": job.total,
+        "done": job.done,
+        "failed": job.failed,
+        "last_error": job.last_error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def cancel_job(db: Session, job_id: str) -> bool:
+    """
+    Cancel a job and any of its tasks that have not been claimed yet.
+
+    Tasks already running finish their current batch but are not retried.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session.
+    job_id : str
+        Job identifier.
+
+    Returns
+    -------
+    bool
+        True if the job existed and was not already finished.
+    """
+    now = time.time()
+    res = db.execute(
+        text(
+            "UPDATE embedding_jobs SET status = 'cancelled', updated_at = :now, finished_at = :now "
+            "WHERE id = :id AND status NOT IN ('done', 'partial', 'failed', 'cancelled')"
+        ),
+        {"id": job_id, "now": now},
+    )
+    db.execute(
+        text("UPDATE embedding_tasks SET status = 'cancelled' WHERE job_id = :id AND status = 'queued'"),
+        {"id": job_id},
+    )
+    db.commit()
+    return res.rowcount == 1
+
+
+def _reclaim_expired(db: Session, lease_seconds: int, max_attempts: int) -> None:
+    rows = db.execute(
+        text(
+            "SELECT id, job_id, context_ids, attempts FROM embedding_tasks "
+            "WHERE status = 'running' AND claimed_at < :cutoff"
+        ),
+        {"cutoff": time.time() - lease_seconds},
+    ).fetchall()
+    for task_id, job_id, context_ids, attempts in rows:
+        # Matching on attempts skips tasks another worker reclaimed in the meantime
+        params = {"id": task_id, "attempts": attempts}
+        if attempts < max_attempts:
+            db.execute(
+                text(
+                    "UPDATE embedding_tasks SET status = 'queued', claimed_by = NULL "
+                    "WHERE id = :id AND status = 'running' AND attempts = :attempts"
+                ),
+                params,
+            )
+            continue
+        err = f"lease expired on attempt {attempts}"
+        res = db.execute(
+            text(
+                "UPDATE embedding_tasks SET status = 'failed', claimed_by = NULL, last_error = :err "
+                "WHERE id = :id AND status = 'running' AND attempts = :attempts"
+            ),
+            {**params, "err": err},
+        )
+        if res.rowcount != 1:
+            continue
+        now = time.time()
+        db.execute(
+            text("UPDATE embedding_jobs SET failed = failed + :n, last_error = :err, updated_at = :now WHERE id = :id"),
+            {"n": len(json.loads(context_ids)), "err": err, "now": now, "id": job_id},
+        )
+        _finalize_job(db, job_id)
+        logger.error("Embedding task %s failed permanently: %s", task_id, err)
+
+
+def claim_task(db: Session, worker_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim the oldest runnable task.
+
+    A candidate is selected and then claimed with ``UPDATE ... WHERE status =
+    'queued'``; if another worker won the race the update matches no rows
+    and the next candidate is tried.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session.
+    worker_id : str
+        Identifier recorded on the claimed task.
+
+    Returns
+    -------
+    dict | None
+        Task fields (id, job_id, figure_slug, context_ids, attempts,
+        worker_id) or None.
+    """
+    cfg = _job_settings()
+    _reclaim_expired(db, cfg["lease_seconds"], cfg["max_attempts"])
+    db.commit()
+    for _ in range(5):
+        now = time.time()
+        row = db.execute(
+            text(
+                """
+                SELECT t.id, t.job_id, t.context_ids, t.attempts, j.figure_slug
+                FROM embedding_tasks t
+                JOIN embedding_jobs j ON j.id = t.job_id
+                WHERE t.status = 'queued' AND t.available_at <= :now AND j.status IN ('queued', 'running')
+                ORDER BY t.available_at, t.id
+                LIMIT 1
+                """
+            ),
+            {"now": now},
+        ).fetchone()
+        if row is None:
+            db.rollback()
+            return None
+        res = db.execute(
+            text(
+                "UPDATE embedding_tasks SET status = 'running', claimed_by = :worker, claimed_at = :now, "
+                "attempts = attempts + 1 WHERE id = :id AND status = 'queued'"
+            ),
+            {"worker": worker_id, "now": now, "id": row[0]},
+        )
+        if res.rowcount != 1:
+            db.rollback()
+            continue
+        db.execute(
+            text("UPDATE embedding_jobs SET status = 'running', updated_at = :now WHERE id = :id AND status = 'queued'"),
+            {"now": now, "id": row[1]},
+        )
+        db.commit()
+        return {
+            "id": row[0],
+            "job_id": row[1],
+            "context_ids": json.loads(row[2]),
+            "attempts": row[3] + 1,
+            "figure_slug": row[4],
+            "worker_id": worker_id,
+        }
+    return None
+
+
+def _finalize_job(db: Session, job_id: str) -> None:
+    now = time.time()
+    db.execute(
+        text(
+            """
+            UPDATE embedding_jobs
+            SET status = CASE WHEN failed = 0 THEN 'done' WHEN done = 0 THEN 'failed' ELSE 'partial' END,
+                finished_at = :now, updated_at = :now
+            WHERE id = :id
+              AND status IN ('queued', 'running')
+              AND NOT EXISTS (
+                  SELECT 1 FROM embedding_tasks
+                  WHERE job_id = :id AND status IN ('queued', 'running')
+              )
+            """
+        ),
+        {"id": job_id, "now": now},
+    )
+
+
+# Matches the task only while the caller's claim still holds
+_OWNED = "id = :id AND status = 'running' AND claimed_by = :worker AND attempts = :attempts"
+
+
+def process_task(db: Session, task: Dict[str, Any], embed_fn: Optional[EmbedFn] = None) -> None:
+    """
+    Embed one claimed task and record the outcome.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session owned by the worker.
+    task : dict
+        Task returned by :func:`claim_task`. If its lease was reclaimed
+        meanwhile, the outcome is discarded.
+    embed_fn : callable | None
+        ``(db, ctx_ids, figure_slug)`` embedding function.
+    """
+    cfg = _job_settings()
+    fn = embed_fn or _default_embed_fn
+    ids = task["context_ids"]
+    owned = {"id": task["id"], "worker": task["worker_id"], "attempts": task["attempts"]}
+    job = db.execute(
+        text("SELECT status FROM embedding_jobs WHERE id = :id"), {"id": task["job_id"]}
+    ).fetchone()
+    if job is None or job[0] == "cancelled":
+        db.execute(text(f"UPDATE embedding_tasks SET status = 'cancelled' WHERE {_OWNED}"), owned)
+        db.commit()
+        return
+    try:
+        fn(db, ids, task["figure_slug"])
+    except Exception as exc:
+        db.rollback()
+        now = time.time()
+        err = str(exc)[:1000]
+        if task["attempts"] < cfg["max_attempts"]:
+            delay = cfg["backoff_base"] * (2 ** (task["attempts"] - 1))
+            res = db.execute(
+                text(
+                    "UPDATE embedding_tasks SET status = 'queued', available_at = :at, last_error = :err, "
+                    f"claimed_by = NULL WHERE {_OWNED}"
+                ),
+                {**owned, "at": now + delay, "err": err},
+            )
+            if res.rowcount != 1:
+                db.commit()
+                logger.warning("Embedding task %s lease was reclaimed; discarding this attempt's failure", task["id"])
+                return
+            db.execute(
+                text("UPDATE embedding_jobs SET last_error = :err, updated_at = :now WHERE id = :id"),
+                {"err": err, "now": now, "id": task["job_id"]},
+            )
+            logger.warning("Embedding task %s failed (attempt %s), retrying in %.1fs: %s", task["id"], task["attempts"], delay, err)
+        else:
+            res = db.execute(
+                text(f"UPDATE embedding_tasks SET status = 'failed', last_error = :err WHERE {_OWNED}"),
+                {**owned, "err": err},
+            )
+            if res.rowcount != 1:
+                db.commit()
+                logger.warning("Embedding task %s lease was reclaimed; discarding this attempt's failure", task["id"])
+                return
+            db.execute(
+                text(
+                    "UPDATE embedding_jobs SET failed = failed + :n, last_error = :err, updated_at = :now WHERE id = :id"
+                ),
+                {"n": len(ids), "err": err, "now": now, "id": task["job_id"]},
+            )
+            _finalize_job(db, task["job_id"])
+            logger.error("Embedding task %s failed permanently: %s", task["id"], err)
+        db.commit()
+        return
+    now = time.time()
+    res = db.execute(text(f"UPDATE embedding_tasks SET status = 'done' WHERE {_OWNED}"), owned)
+    if res.rowcount != 1:
+        # Another worker owns the task now; its outcome is the one that counts
+        db.commit()
+        logger.warning("Embedding task %s lease was reclaimed; discarding this attempt's result", task["id"])
+        return
+    db.execute(
+        text("UPDATE embedding_jobs SET done = done + :n, updated_at = :now WHERE id = :id"),
+        {"n": len(ids), "now": now, "id": task["job_id"]},
+    )
+    _finalize_job(db, task["job_id"])
+    db.commit()
+
+
+def run_pending(embed_fn: Optional[EmbedFn] = None, max_tasks: Optional[int] = None, worker_id: str = "inline") -> int:
+    """
+    Synchronously drain runnable tasks in the calling thread.
+
+    Parameters
+    ----------
+    embed_fn : callable | None
+        Embedding function override.
+    max_tasks : int | None
+        Stop after this many tasks.
+    worker_id : str
+        Identifier recorded on claimed tasks.
+
+    Returns
+    -------
+    int
+        Number of tasks processed.
+    """
+    processed = 0
+    with FigureSessionLocal() as db:
+        while max_tasks is None or processed < max_tasks:
+            task = claim_task(db, worker_id)
+            if task is None:
+                break
+            process_task(db, task, embed_fn)
+            processed += 1
+    return processed
+
+
+class EmbeddingJobWorkers:
+    """
+    Per-process pool of threads that poll for and process embedding tasks.
+    """
+
+    def __init__(self) -> None:
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self, count: Optional[int] = None) -> None:
+        """
+        Start worker threads if not already running.
+
+        Parameters
+        ----------
+        count : int | None
+            Number of threads; defaults to RAG_JOB_WORKERS.
+        """
+        if self._threads:
+            return
+        n = _job_settings()["workers"] if count is None else count
+        self._stop.clear()
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(max(0, n)):
+            t = threading.Thread(target=self._run, args=(f"{base}:{i}",), name=f"embedding-job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Signal worker threads to exit and wait briefly for them."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def wake(self) -> None:
+        """Wake idle workers so newly enqueued work is picked up immediately."""
+        self._wake.set()
+
+    def _run(self, worker_id: str) -> None:
+        poll = _job_settings()["poll_interval"]
+        while not self._stop.is_set():
+            try:
+                worked = run_pending(max_tasks=1, worker_id=worker_id)
+            except Exception:
+                logger.exception("Embedding worker %s crashed while processing; continuing", worker_id)
+                worked = 0
+            if not worked:
+                self._wake.wait(poll)
+                self._wake.clear()
+
+
+workers = EmbeddingJobWorkers()
+
+
+def _wake_workers() -> None:
+    workers.wake()
@@ -0,0 +1,273 @@
+"""
+Periodic removal of expired guest sessions and their messages.
+
+``GuestSession.expires_at`` is only checked when a guest asks a question,
+so abandoned sessions would otherwise stay in chat.db forever. The sweeper
+deletes them in small batches. Each batch runs in its own short
+transaction, so request handlers never wait long on the SQLite write lock.
+When the database uses ``auto_vacuum=INCREMENTAL``, it then returns a
+bounded number of free pages to the filesystem.
+
+Environment
+-----------
+GUEST_SWEEP_INTERVAL_SECONDS : int
+    Seconds between sweeps per process (default 900, 0 disables).
+GUEST_RETENTION_HOURS : float
+    Grace period after ``expires_at`` before a session is deleted (default 24).
+GUEST_SWEEP_BATCH_SIZE : int
+    Sessions deleted per transaction (default 500).
+GUEST_SWEEP_VACUUM_PAGES : int
+    Pages released by ``PRAGMA incremental_vacuum`` per sweep (default 2000, 0 disables).
+GUEST_SWEEP_ENABLE_AUTO_VACUUM : bool
+    Convert the database to ``auto_vacuum=INCREMENTAL`` on startup if needed.
+    This runs a one-off full VACUUM, which locks the file while it rebuilds
+    (default false).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _sweep_settings() -> Dict[str, Any]:
+    return {
+        "interval": float(os.getenv("GUEST_SWEEP_INTERVAL_SECONDS", "900") or 0),
+        "retention": timedelta(hours=float(os.getenv("GUEST_RETENTION_HOURS", "24") or 0)),
+        "batch_size": max(1, int(os.getenv("GUEST_SWEEP_BATCH_SIZE", "500") or 500)),
+        "vacuum_pages": max(0, int(os.getenv("GUEST_SWEEP_VACUUM_PAGES", "2000") or 0)),
+        "enable_auto_vacuum": (os.getenv("GUEST_SWEEP_ENABLE_AUTO_VACUUM", "false") or "").lower() in {"1", "true", "yes"},
+    }
+
+
+@dataclass
+class SweepReport:
+    """
+    Result of one sweep.
+
+    Attributes
+    ----------
+    sessions : int
+        Guest sessions deleted.
+    messages : int
+        Guest messages deleted.
+    batches : int
+        Delete transactions executed.
+    bytes_before / bytes_after : int
+        Database file size (page_count * page_size) around the sweep.
+    free_bytes : int
+        Space on the SQLite freelist after the sweep (reusable, not yet returned to the OS).
+    duration_ms : float
+        Wall time.
+    """
+
+    sessions: int = 0
+    messages: int = 0
+    batches: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    free_bytes: int = 0
+    duration_ms: float = 0.0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        """Bytes returned to the filesystem."""
+        return max(0, self.bytes_before - self.bytes_after)
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = asdict(self)
+        out["bytes_reclaimed"] = self.bytes_reclaimed
+        return out
+
+
+def _pragma(conn, name: str) -> int:
+    return int(conn.execute(text(f"PRAGMA {name}")).scalar() or 0)
+
+
+def _db_size(engine: Engine) -> tuple[int, int]:
+    with engine.connect() as conn:
+        page_size = _pragma(conn, "page_size")
+        return _pragma(conn, "page_count") * page_size, _pragma(conn, "freelist_count") * page_size
+
+
+def ensure_incremental_auto_vacuum(engine: Engine) -> bool:
+    """
+    Switch the database to ``auto_vacuum=INCREMENTAL`` if it is not already.
+
+    Changing the mode of an existing database requires a full VACUUM, so this
+    is only called when GUEST_SWEEP_ENABLE_AUTO_VACUUM is set.
+
+    Returns
+    -------
+    bool
+        True if the database is (now) in incremental mode.
+    """
+    with engine.connect() as conn:
+        if _pragma(conn, "auto_vacuum") == _AUTO_VACUUM_INCREMENTAL:
+            return True
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.commit()
+        conn.exec_driver_sql("VACUUM")
+        return _pragma(conn, "auto_vacuum") == _AUTO_VACUUM_INCREMENTAL
+
+
+def sweep_expired(
+    engine: Engine,
+    *,
+    now: Optional[datetime] = None,
+    retention: Optional[timedelta] = None,
+    batch_size: Optional[int] = None,
+    vacuum_pages: Optional[int] = None,
+) -> SweepReport:
+    """
+    Delete guest sessions expired for longer than the retention period.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        Chat database engine.
+    now : datetime.datetime | None
+        Current naive UTC time; defaults to ``datetime.utcnow()``.
+    retention : datetime.timedelta | None
+        Grace period after expiry; defaults to GUEST_RETENTION_HOURS.
+    batch_size : int | None
+        Sessions per delete transaction; defaults to GUEST_SWEEP_BATCH_SIZE.
+    vacuum_pages : int | None
+        Pages to release afterwards in incremental mode; defaults to GUEST_SWEEP_VACUUM_PAGES.
+
+    Returns
+    -------
+    SweepReport
+        Rows deleted and storage figures.
+    """
+    cfg = _sweep_settings()
+    retention = cfg["retention"] if retention is None else retention
+    batch_size = batch_size or cfg["batch_size"]
+    vacuum_pages = cfg["vacuum_pages"] if vacuum_pages is None else vacuum_pages
+    cutoff = (now or datetime.utcnow()) - retention
+    started = time.perf_counter()
+    report = SweepReport()
+    report.bytes_before, _ = _db_size(engine)
+
+    while True:
+        with engine.begin() as conn:
+            ids = [
+                r[0]
+                for r in conn.execute(
+                    text(
+                        "SELECT id FROM guest_sessions "
+                        "WHERE expires_at IS NOT NULL AND expires_at < :cutoff LIMIT :n"
+                    ),
+                    {"cutoff": cutoff.isoformat(sep=" "), "n": batch_size},
+                )
+            ]
+            if not ids:
+                break
+            params = {f"i{k}": v for k, v in enumerate(ids)}
+            in_clause = ", ".join(f":{k}" for k in params)
+            report.messages += conn.execute(
+                text(f"DELETE FROM guest_messages WHERE session_id IN ({in_clause})"), params
+            ).rowcount
+            report.sessions += conn.execute(
+                text(f"DELETE FROM guest_sessions WHERE id IN ({in_clause})"), params
+            ).rowcount
+            report.batches += 1
+        if len(ids) < batch_size:
+            break
+        # Let queued request writers take the lock between batches.
+        time.sleep(0.01)
+
+    if vacuum_pages and report.sessions:
+        with engine.connect() as conn:
+            if _pragma(conn, "auto_vacuum") == _AUTO_VACUUM_INCREMENTAL:
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+                conn.commit()
+
+    report.bytes_after, report.free_bytes = _db_size(engine)
+    report.duration_ms = (time.perf_counter() - started) * 1000
+    if report.sessions:
+        logger.info(
+            "Guest sweep removed %d sessions / %d messages in %d batches; reclaimed %d bytes (%d free)",
+            report.sessions, report.messages, report.batches, report.bytes_reclaimed, report.free_bytes,
+        )
+    return report
+
+
+class GuestSweeper:
+    """
+    Background thread that runs :func:`sweep_expired` periodically.
+
+    Every worker process runs one. Deletes are idempotent, and a random
+    start offset keeps workers from sweeping at the same moment.
+    """
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_report: Optional[SweepReport] = None
+        self.totals: Dict[str, int] = {"sweeps": 0, "sessions": 0, "messages": 0, "bytes_reclaimed": 0}
+
+    def start(self, engine: Engine) -> None:
+        """Start the sweeper thread unless disabled or already running."""
+        cfg = _sweep_settings()
+        if self._thread is not None or cfg["interval"] <= 0:
+            return
+        if cfg["enable_auto_vacuum"]:
+            try:
+                ensure_incremental_auto_vacuum(engine)
+            except Exception:
+                logger.exception("Could not enable incremental auto_vacuum on the chat database")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(engine, cfg["interval"]), name="guest-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Signal the thread to exit and wait briefly for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def run_once(self, engine: Engine) -> SweepReport:
+        """Sweep now and fold the result into the running totals."""
+        report = sweep_expired(engine)
+        self.last_report = report
+        self.totals["sweeps"] += 1
+        self.totals["sessions"] += report.sessions
+        self.totals["messages"] += report.messages
+        self.totals["bytes_reclaimed"] += report.bytes_reclaimed
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the last report and cumulative counts for this process."""
+        return {
+            "running": self._thread is not None,
+            "last": self.last_report.as_dict() if self.last_report else None,
+            "totals": dict(self.totals),
+        }
+
+    def _run(self, engine: Engine, interval: float) -> None:
+        if self._stop.wait(random.uniform(0, min(interval, 60.0))):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_once(engine)
+            except Exception:
+                logger.exception("Guest sweep failed; will retry next interval")
+            self._stop.wait(interval)
+
+
+sweeper = GuestSweeper()
@@ -1,21 +1,70 @@
 
 import os
+import time
 import httpx
-from app.config.llm_config import llm_config
+from app.config.llm_config import llm_config_snapshot
+from app.services import rate_limit, single_flight
+from app.utils import metrics
+from app.utils.timing import span
+
+# Provider request timeout in seconds
+HTTP_TIMEOUT = 30.0
 
 
 class LlmClient:
-    def generate(self, messages, temperature=None, top_p=None, max_tokens=None, model=None):
-        provider = (llm_config.provider or "openai").lower()
-        if provider == "openrouter":
-            return self._gen_openrouter(messages, temperature, top_p, max_tokens, model)
-        else:
-            return self._gen_openai(messages, temperature, top_p, max_tokens, model)
+    def generate(self, messages, temperature=None, top_p=None, max_tokens=None, model=None, config=None):
+        # One consistent view of the runtime config for the whole call; callers
+        # that already read fields from it (e.g. the model) pass their snapshot.
+        cfg = config if config is not None else llm_config_snapshot()
+        provider = (cfg.provider or "openai").lower()
+        # Label by the requested model; provider-returned names carry dated suffixes.
+        model_label = model if model is not None else cfg.model
+        mode = single_flight.llm_mode()
+        effective_temperature = temperature if temperature is not None else cfg.temperature
+        if mode == "off" or (mode == "auto" and effective_temperature != 0):
+            with rate_limit.llm_slot():
+                return self._call(cfg, provider, model_label, messages, temperature, top_p, max_tokens, model)
+        # Identical deterministic requests in flight share one upstream call. Only
+        # the caller that makes it takes an LLM gate slot; followers just wait.
+        key = single_flight.request_key(
+            provider=provider,
+            api_base=cfg.api_base,
+            model=model_label,
+            messages=messages,
+            temperature=effective_temperature,
+            top_p=top_p if top_p is not None else cfg.top_p,
+            max_tokens=max_tokens if max_tokens is not None else cfg.max_tokens,
+        )
+
+        def upstream():
+            with rate_limit.llm_slot():
+                return self._call(cfg, provider, model_label, messages, temperature, top_p, max_tokens, model)
+
+        started = time.perf_counter()
+        wait = single_flight.llm_wait_timeout(rate_limit.llm_queue_timeout() + HTTP_TIMEOUT)
+        resp, role = single_flight.llm_flights.do(key, upstream, wait)
+        metrics.observe_llm_coalesce(provider, role, time.perf_counter() - started)
+        return resp
+
+    def _call(self, cfg, provider, model_label, messages, temperature, top_p, max_tokens, model):
+        started = time.perf_counter()
+        resp = None
+        try:
+            with span("llm_http"):
+                if provider == "openrouter":
+                    resp = self._gen_openrouter(cfg, messages, temperature, top_p, max_tokens, model)
+                else:
+                    resp = self._gen_openai(cfg, messages, temperature, top_p, max_tokens, model)
+            return resp
+        finally:
+            metrics.observe_llm_call(
+                provider, str(model_label), time.perf_counter() - started, (resp or {}).get("usage"), ok=resp is not None
+            )
 
-    def _gen_openrouter(self, messages, temperature, top_p, max_tokens, model):
-        base = (llm_config.api_base or "https://openrouter.ai/api/v1").rstrip("/")
+    def _gen_openrouter(self, cfg, messages, temperature, top_p, max_tokens, model):
+        base = (cfg.api_base or "https://openrouter.ai/api/v1").rstrip("/")
         url = f"{base}/chat/completions"
-        api_key = os.getenv("OPENROUTER_API_KEY", llm_config.api_key)
+        api_key = os.getenv("OPENROUTER_API_KEY", cfg.api_key)
         if not api_key:
             raise RuntimeError("OPENROUTER_API_KEY not set")
         headers = {
@@ -26,13 +75,13 @@ class LlmClient:
             "X-Title": os.getenv("OPENROUTER_X_TITLE", "Places-in-Time History Chat"),
         }
         payload = {
-            "model": model if model is not None else llm_config.model,
+            "model": model if model is not None else cfg.model,
             "messages": messages,
-            "temperature": temperature if temperature is not None else llm_config.temperature,
-            "top_p": top_p if top_p is not None else llm_config.top_p,
-            "max_tokens": max_tokens if max_tokens is not None else llm_config.max_tokens,
+            "temperature": temperature if temperature is not None else cfg.temperature,
+            "top_p": top_p if top_p is not None else cfg.top_p,
+            "max_tokens": max_tokens if max_tokens is not None else cfg.max_tokens,
         }
-        with httpx.Client(timeout=30) as client:
+        with httpx.Client(timeout=HTTP_TIMEOUT) as client:
             r = client.post(url, headers=headers, json=payload)
             r.raise_for_status()
             data = r.json()
@@ -42,10 +91,10 @@ class LlmClient:
             "choices": data.get("choices", []),
         }
 
-    def _gen_openai(self, messages, temperature, top_p, max_tokens, model):
-        base = (llm_config.api_base or "https://api.openai.com/v1").rstrip("/")
+    def _gen_openai(self, cfg, messages, temperature, top_p, max_tokens, model):
+        base = (cfg.api_base or "https://api.openai.com/v1").rstrip("/")
         url = f"{base}/chat/completions"
-        api_key = os.getenv("OPENAI_API_KEY", llm_config.api_key)
+        api_key = os.getenv("OPENAI_API_KEY", cfg.api_key)
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY not set")
         headers = {
@@ -53,13 +102,13 @@ class LlmClient:
             "Content-Type": "application/json",
         }
         payload = {
-            "model": model if model is not None else llm_config.model,
+            "model": model if model is not None else cfg.model,
             "messages": messages,
-            "temperature": temperature if temperature is not None else llm_config.temperature,
-            "top_p": top_p if top_p is not None else llm_config.top_p,
-            "max_tokens": max_tokens if max_tokens is not None else llm_config.max_tokens,
+            "temperature": temperature if temperature is not None else cfg.temperature,
+            "top_p": top_p if top_p is not None else cfg.top_p,
+            "max_tokens": max_tokens if max_tokens is not None else cfg.max_tokens,
         }
-        with httpx.Client(timeout=30) as client:
+        with httpx.Client(timeout=HTTP_TIMEOUT) as client:
             r = client.post(url, headers=headers, json=payload)
             r.raise_for_status()
             data = r.json()
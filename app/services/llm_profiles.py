@@ -1,27 +1,231 @@
+"""
+Shared LLM runtime profiles stored in chat.db (``llm_profiles``).
+
+The active profile (provider, model, sampling defaults, API base) is the
+source of truth for every worker process. Each worker keeps its own copy
+in the module-level ``llm_config`` object, which ``LlmClient`` copies once
+per call, so serving a request never queries the table. A reload swaps all
+fields in one locked update, so a call never pairs a new provider with an
+old model.
+
+Writes from the admin API, scripts or a SQL shell all fire triggers that
+bump ``llm_profile_revision`` (see ``app.utils.migrations``). A poller
+thread per worker reads that one-row counter and reloads the profile only
+when it changed. The worker that handled the admin call applies it at once.
+API keys never go into the table; they stay in the environment. The API
+base is not writable over HTTP (see ``HTTP_FIELDS``). Profiles are checked
+against ``schemas.LlmProfileFields`` when written through ``upsert_profile``
+and again when loaded, so a bad row written by SQL is logged and ignored
+instead of being applied to every worker.
+
+Environment
+-----------
+LLM_PROFILE_POLL_SECONDS : float
+    Seconds between revision checks per process (default 1, 0 disables the poller).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
+
+from app import schemas
+from app.config.llm_config import llm_config, update_llm_config
 from app.models_llm_profile import LlmProfile
 
-def list_profiles(db: Session):
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS: Tuple[str, ...] = ("provider", "model", "temperature", "top_p", "max_tokens", "api_base")
+# api_base decides where the server's API key is sent, so it is set through
+# the database or scripts only, never over HTTP.
+HTTP_FIELDS: Tuple[str, ...] = tuple(k for k in PROFILE_FIELDS if k != "api_base")
+REVISION_TABLE = "llm_profile_revision"
+
+
+def list_profiles(db: Session) -> Tuple[Optional[str], List[LlmProfile]]:
+    """
+    Return the active profile name and all profiles ordered by name.
+    """
     rows = db.query(LlmProfile).order_by(LlmProfile.name).all()
     active = next((r.name for r in rows if getattr(r, "is_active", False)), None)
     return active, rows
 
-def upsert_profile(db: Session, name: str, config: dict) -> LlmProfile:
+
+def get_active_profile(db: Session) -> Optional[LlmProfile]:
+    """Return the active profile row, if any."""
+    return db.query(LlmProfile).filter(LlmProfile.is_active.is_(True)).first()
+
+
+def validate_profile(values: Dict[str, Any]) -> None:
+    """
+    Check a complete set of profile values.
+
+    Raises
+    ------
+    ValueError
+        When provider or model is missing or a setting is out of range.
+    """
+    for key in ("provider", "model"):
+        if values.get(key) is None:
+            raise ValueError(f"LLM profile needs a {key}")
+    schemas.LlmProfileFields.model_validate({k: values.get(k) for k in HTTP_FIELDS})
+
+
+def upsert_profile(db: Session, name: str, config: Dict[str, Any], fields: Tuple[str, ...] = PROFILE_FIELDS) -> LlmProfile:
+    """
+    Create or update profile ``name`` from the known keys of ``config``.
+
+    A new profile starts from this worker's current settings, so a partial
+    payload is enough. Only ``fields`` are read from ``config``. The caller commits.
+
+    Raises
+    ------
+    ValueError
+        When the resulting profile is invalid (see :func:`validate_profile`).
+    """
     row = db.get(LlmProfile, name)
     if not row:
-        row = LlmProfile(name=name)
+        row = LlmProfile(name=name, **{k: getattr(llm_config, k) for k in PROFILE_FIELDS})
         db.add(row)
-    for k in ("provider","model","temperature","top_p","max_tokens","api_base"):
+    for k in fields:
         if k in config:
             setattr(row, k, config[k])
+    validate_profile({k: getattr(row, k) for k in PROFILE_FIELDS})
     db.flush()
     return row
 
+
 def activate_profile(db: Session, name: str) -> LlmProfile | None:
-    db.query(LlmProfile).update({LlmProfile.is_active: False})
+    """Make ``name`` the only active profile; None when it does not exist. The caller commits."""
     row = db.get(LlmProfile, name)
     if not row:
         return None
-    setattr(row, "is_active", True)
+    db.query(LlmProfile).filter(LlmProfile.name != name, LlmProfile.is_active.is_(True)).update(
+        {LlmProfile.is_active: False}, synchronize_session=False
+    )
+    row.is_active = True
     db.flush()
     return row
+
+
+def profile_dict(row: LlmProfile) -> Dict[str, Any]:
+    """Serialise a profile row for API responses."""
+    return {
+        "name": row.name,
+        **{k: getattr(row, k) for k in PROFILE_FIELDS},
+        "is_active": bool(row.is_active),
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+
+
+def read_revision(engine: Engine) -> Optional[int]:
+    """Return the profile revision counter, or None before the migration ran."""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text(f"SELECT revision FROM {REVISION_TABLE} WHERE id = 1")).fetchone()
+    except Exception:
+        return None
+    return int(row[0]) if row else None
+
+
+class ProfileCache:
+    """
+    Per-process copy of the active profile, applied onto ``llm_config``.
+
+    The environment-derived settings captured at import are the fallback
+    when no profile is active.
+    """
+
+    def __init__(self) -> None:
+        self._defaults = {k: getattr(llm_config, k) for k in PROFILE_FIELDS}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.revision: Optional[int] = None
+        self.active: Optional[str] = None
+        self.refreshed_at: Optional[float] = None
+        self.reloads = 0
+
+    def refresh(self, engine: Engine, force: bool = False) -> bool:
+        """
+        Reload the active profile when the revision moved (or ``force``).
+
+        Returns
+        -------
+        bool
+            True when the profile was reloaded.
+        """
+        revision = read_revision(engine)
+        if not force and revision is not None and revision == self.revision:
+            return False
+        with self._lock:
+            with Session(bind=engine) as db:
+                row = get_active_profile(db)
+                values = {k: getattr(row, k) for k in PROFILE_FIELDS} if row is not None else {}
+                name = row.name if row is not None else None
+            if row is not None:
+                try:
+                    validate_profile(values)
+                except ValueError as exc:
+                    # Keep serving with the current settings; the revision is recorded so this logs once
+                    logger.error("Ignoring invalid LLM profile %s (revision %s): %s", name, revision, exc)
+                    self.revision = revision
+                    return False
+            update_llm_config(
+                {k: values.get(k) if values.get(k) is not None else self._defaults[k] for k in PROFILE_FIELDS}
+            )
+            if name != self.active:
+                logger.info("LLM profile now %s (revision %s)", name or "<environment defaults>", revision)
+            self.active = name
+            self.revision = revision
+            self.refreshed_at = time.time()
+            self.reloads += 1
+        return True
+
+    def start(self, engine: Engine) -> None:
+        """Load the profile now, then poll for changes unless disabled or already running."""
+        try:
+            self.refresh(engine, force=True)
+        except Exception:
+            logger.exception("Could not load the active LLM profile; using environment settings")
+        interval = float(os.getenv("LLM_PROFILE_POLL_SECONDS", "1") or 0)
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(engine, interval), name="llm-profile-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Signal the poller to exit and wait briefly for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "active_profile": self.active,
+            "revision": self.revision,
+            "refreshed_at": self.refreshed_at,
+            "reloads": self.reloads,
+            "polling": self._thread is not None,
+            "config": {k: getattr(llm_config, k) for k in PROFILE_FIELDS},
+        }
+
+    def _run(self, engine: Engine, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh(engine)
+            except Exception:
+                logger.exception("LLM profile refresh failed; will retry next interval")
+
+
+cache = ProfileCache()
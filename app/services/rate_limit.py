@@ -0,0 +1,444 @@
+"""
+Admission control for chat endpoints: token-bucket rate limits and an LLM concurrency gate.
+
+Token buckets are kept per authenticated user, per guest session token and
+per client IP. Each bucket holds ``capacity`` tokens and refills
+continuously at ``capacity / period`` tokens per second. Every admitted
+request costs one token. When a bucket is empty the request is rejected
+with 429 and a ``Retry-After`` equal to the time until one token is back.
+
+Buckets live in process memory by default. With
+``RATE_LIMIT_BACKEND=sqlite`` they are kept in a small SQLite file instead,
+so every gunicorn worker on the host shares them. Updates run inside
+``BEGIN IMMEDIATE`` transactions.
+
+Independently, :func:`llm_slot` caps in-flight upstream LLM calls per
+process. ``LlmClient.generate`` takes the slot only around a real upstream
+call, so requests coalesced onto another caller's call hold none. Callers beyond the cap wait in a bounded queue for up to
+``LLM_QUEUE_TIMEOUT`` seconds. When the queue is full or the wait times
+out, the request is rejected with 429, so one noisy client cannot tie up
+every worker thread waiting on the provider.
+
+Gate callers, running and queued alike, each hold a threadpool thread
+because the chat endpoints are sync. At startup :func:`fit_to_threadpool`
+therefore caps ``LLM_MAX_INFLIGHT + LLM_MAX_QUEUE`` at half the AnyIO
+threadpool (40 threads by default), shrinking the queue first and logging
+a warning, so an LLM backlog cannot stall ``/figures``, ``/auth`` and the
+other sync routes.
+
+Environment
+-----------
+RATE_LIMIT_ENABLED : bool
+    Master switch for the token buckets (default true).
+RATE_LIMIT_BACKEND : str
+    ``memory`` (default) or ``sqlite``.
+RATE_LIMIT_DB_PATH : str
+    SQLite file for the shared backend (default ``rate_limits.db`` beside the chat DB).
+RATE_LIMIT_USER / RATE_LIMIT_GUEST / RATE_LIMIT_IP : str
+    ``"<requests>/<seconds>"`` per scope (defaults 30/60, 10/60, 120/60).
+RATE_LIMIT_TRUST_PROXY : bool
+    Take the client IP from ``X-Forwarded-For`` (default true on Render,
+    where ``RENDER`` is set and every request arrives from its proxy,
+    false elsewhere).
+RATE_LIMIT_PROXY_HOPS : int
+    Trusted proxies in front of the app (default 1). The client IP is the
+    address the outermost trusted proxy appended, counted from the right,
+    so a client cannot pick its bucket by sending its own header.
+LLM_MAX_INFLIGHT : int
+    Concurrent LLM calls per process (default 8, 0 disables the gate).
+LLM_MAX_QUEUE : int
+    Callers allowed to wait for a slot (default 12, capped as above).
+LLM_QUEUE_TIMEOUT : float
+    Seconds a caller may wait for a slot (default 15).
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from fastapi import Cookie, Depends, HTTPException, Request, status
+
+from app import schemas
+from app.utils.security import get_current_user
+from app.utils.timing import span
+
+logger = logging.getLogger(__name__)
+
+
+def _flag(name: str, default: str) -> bool:
+    return (os.getenv(name, default) or default).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _rate(name: str, default: str) -> Tuple[float, float]:
+    """Parse ``"<requests>/<seconds>"`` into (capacity, refill per second)."""
+    raw = os.getenv(name, default) or default
+    try:
+        count, period = raw.split("/", 1)
+        capacity, seconds = float(count), float(period)
+    except ValueError:
+        count, period = default.split("/", 1)
+        capacity, seconds = float(count), float(period)
+    return capacity, capacity / max(seconds, 1e-6)
+
+
+class RateLimited(Exception):
+    """Raised when a bucket or the LLM gate rejects a request."""
+
+    def __init__(self, scope: str, retry_after: float) -> None:
+        super().__init__(f"rate limited ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """
+    Per-process token buckets with LRU eviction.
+
+    Parameters
+    ----------
+    max_keys : int
+        Buckets retained; the least recently used are dropped (i.e. refilled).
+    """
+
+    def __init__(self, max_keys: int = 50_000) -> None:
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._max_keys = max_keys
+
+    def take(self, key: str, capacity: float, refill: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Try to remove ``cost`` tokens from a bucket.
+
+        Returns
+        -------
+        tuple[bool, float]
+            Whether the request is admitted, and seconds until it would be.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / refill
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SqliteBucketStore:
+    """
+    Token buckets shared by all processes on a host via a SQLite file.
+
+    Parameters
+    ----------
+    path : str
+        Database file; created on first use.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: float, refill: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """See :meth:`MemoryBucketStore.take`."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * refill)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            if random.random() < 0.001:
+                # Buckets idle for an hour are full again; drop them to keep the table small.
+                conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (cost - tokens) / refill
+
+    def reset(self) -> None:
+        self._conn().execute("DELETE FROM rate_buckets")
+
+
+class LlmGate:
+    """
+    Counting semaphore with a bounded wait queue for upstream LLM calls.
+
+    Parameters
+    ----------
+    max_inflight : int
+        Concurrent calls allowed; 0 disables the gate.
+    max_queue : int
+        Callers allowed to wait for a slot.
+    timeout : float
+        Seconds a caller waits before being rejected.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, timeout: float) -> None:
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self.inflight = 0
+        self.waiting = 0
+
+    def acquire(self) -> None:
+        """
+        Take one in-flight slot, waiting in the bounded queue if necessary.
+
+        Raises
+        ------
+        RateLimited
+            If the queue is full or the wait exceeds ``timeout``.
+        """
+        if self.max_inflight <= 0:
+            return
+        with self._cond:
+            if self.inflight >= self.max_inflight:
+                if self.waiting >= self.max_queue:
+                    _count("llm_queue_full")
+                    raise RateLimited("llm", 1.0)
+                self.waiting += 1
+                _count("llm_queued")
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.inflight >= self.max_inflight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            _count("llm_queue_timeout")
+                            raise RateLimited("llm", 1.0)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.inflight += 1
+
+    def release(self) -> None:
+        """Return a slot taken by :meth:`acquire`."""
+        if self.max_inflight <= 0:
+            return
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+
+_counters: Dict[str, int] = {}
+_counters_lock = threading.Lock()
+_store: Any = None
+_gate: Optional[LlmGate] = None
+_gate_thread_budget: Optional[int] = None
+_init_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] = _counters.get(name, 0) + 1
+
+
+def _get_store() -> Any:
+    global _store
+    with _init_lock:
+        if _store is None:
+            if (os.getenv("RATE_LIMIT_BACKEND", "memory") or "memory").strip().lower() == "sqlite":
+                default = os.path.join(os.path.dirname(os.getenv("CHAT_DB_PATH") or "./chat_history.db") or ".", "rate_limits.db")
+                _store = SqliteBucketStore(os.getenv("RATE_LIMIT_DB_PATH") or default)
+            else:
+                _store = MemoryBucketStore()
+        return _store
+
+
+def llm_queue_timeout() -> float:
+    """Return LLM_QUEUE_TIMEOUT, the longest a caller waits for a gate slot."""
+    try:
+        return max(0.0, float(os.getenv("LLM_QUEUE_TIMEOUT", "15") or 0))
+    except ValueError:
+        return 15.0
+
+
+def _get_gate() -> LlmGate:
+    global _gate
+    with _init_lock:
+        if _gate is None:
+            max_inflight = int(os.getenv("LLM_MAX_INFLIGHT", "8") or 0)
+            max_queue = int(os.getenv("LLM_MAX_QUEUE", "12") or 0)
+            budget = _gate_thread_budget
+            if budget is not None and max_inflight > 0 and max_inflight + max_queue > budget:
+                capped = (min(max_inflight, budget), max(0, budget - max_inflight))
+                logger.warning(
+                    "LLM_MAX_INFLIGHT=%d + LLM_MAX_QUEUE=%d exceeds %d threads (half the threadpool); using %d + %d",
+                    max_inflight, max_queue, budget, *capped,
+                )
+                max_inflight, max_queue = capped
+            _gate = LlmGate(max_inflight=max_inflight, max_queue=max_queue, timeout=llm_queue_timeout())
+        return _gate
+
+
+def fit_to_threadpool(size: int) -> None:
+    """
+    Cap the LLM gate so its callers hold at most half of ``size`` threads.
+
+    Parameters
+    ----------
+    size : int
+        Threads in the pool that runs sync endpoints (AnyIO's default limiter).
+    """
+    global _gate, _gate_thread_budget
+    with _init_lock:
+        _gate_thread_budget = max(1, size // 2)
+        _gate = None
+
+
+def check(scope: str, key: str) -> None:
+    """
+    Consume one token from the ``scope`` bucket for ``key``.
+
+    Raises
+    ------
+    RateLimited
+        If the bucket is empty.
+    """
+    if not _flag("RATE_LIMIT_ENABLED", "true"):
+        return
+    defaults = {"user": "30/60", "guest": "10/60", "ip": "120/60"}
+    capacity, refill = _rate(f"RATE_LIMIT_{scope.upper()}", defaults[scope])
+    allowed, retry_after = _get_store().take(f"{scope}:{key}", capacity, refill)
+    _count(f"{scope}_{'allowed' if allowed else 'limited'}")
+    if not allowed:
+        raise RateLimited(scope, retry_after)
+
+
+def _too_many(exc: RateLimited) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Too many requests ({exc.scope}); retry later",
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+def _trust_proxy() -> bool:
+    default = "true" if os.getenv("RENDER") else "false"
+    return _flag("RATE_LIMIT_TRUST_PROXY", default)
+
+
+def client_ip(request: Request) -> str:
+    """Return the client address, honouring X-Forwarded-For only when trusted."""
+    if _trust_proxy():
+        hops = [h.strip() for h in (request.headers.get("x-forwarded-for") or "").split(",") if h.strip()]
+        if hops:
+            depth = max(1, int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1") or 1))
+            return hops[-min(depth, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+def limit_user(request: Request, current_user: schemas.UserRead = Depends(get_current_user)) -> None:
+    """
+    FastAPI dependency applying the per-user and per-IP buckets.
+
+    The IP bucket is charged only once the user's own bucket admitted the
+    request, so one noisy user cannot drain it for everyone sharing the IP.
+    """
+    try:
+        check("user", str(current_user.id))
+        check("ip", client_ip(request))
+    except RateLimited as exc:
+        raise _too_many(exc)
+
+
+def limit_guest(
+    request: Request,
+    guest_token: Optional[str] = Cookie(default=None, alias="guest_session"),
+) -> None:
+    """FastAPI dependency applying the per-guest-session and per-IP buckets (session first, as above)."""
+    try:
+        if guest_token:
+            check("guest", guest_token)
+        check("ip", client_ip(request))
+    except RateLimited as exc:
+        raise _too_many(exc)
+
+
+@contextmanager
+def llm_slot() -> Iterator[None]:
+    """
+    Run an upstream LLM call under the per-process concurrency gate.
+
+    Raises
+    ------
+    fastapi.HTTPException
+        429 when the wait queue is full or the wait times out.
+    """
+    gate = _get_gate()
+    try:
+        with span("llm_queue"):
+            gate.acquire()
+    except RateLimited as exc:
+        raise _too_many(exc)
+    try:
+        yield
+    finally:
+        gate.release()
+
+
+def stats() -> Dict[str, Any]:
+    """Return admission counters and current LLM gate occupancy for this process."""
+    gate = _get_gate()
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        "enabled": _flag("RATE_LIMIT_ENABLED", "true"),
+        "backend": type(_get_store()).__name__,
+        "counters": counters,
+        "llm": {
+            "inflight": gate.inflight,
+            "waiting": gate.waiting,
+            "max_inflight": gate.max_inflight,
+            "max_queue": gate.max_queue,
+        },
+    }
+
+
+def reset() -> None:
+    """Clear buckets, counters and gate configuration (tests and admin use)."""
+    global _gate
+    _get_store().reset()
+    with _counters_lock:
+        _counters.clear()
+    with _init_lock:
+        _gate = None
@@ -0,0 +1,152 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When several threads ask for the same ``key`` at once, the first (the
+leader) runs the call and the others (followers) wait for its result
+instead of repeating it. Nothing is cached: once the leader finishes, the
+next caller for that key starts a fresh call.
+
+Followers wait at most ``wait_timeout`` seconds. After that they stop
+waiting and run the call themselves, so a hung leader cannot hold them
+for longer than that. A leader's exception is re-raised in its followers,
+so a failing upstream is not retried once per waiter.
+
+``LlmClient.generate`` uses this for deterministic requests (see
+:func:`llm_mode`).
+
+Environment
+-----------
+LLM_COALESCE : str
+    ``auto`` (default) coalesces calls whose effective temperature is 0,
+    ``always`` coalesces every call, ``off`` disables coalescing.
+LLM_COALESCE_WAIT_SECONDS : float
+    Longest a follower waits for the leader. The default covers the
+    leader's worst case, a full LLM_QUEUE_TIMEOUT wait for a gate slot
+    followed by the whole provider HTTP timeout, plus a small margin, so
+    followers do not start duplicate calls while the leader is still going.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def llm_mode() -> str:
+    """Return LLM_COALESCE normalised to ``auto``, ``always`` or ``off``."""
+    mode = (os.getenv("LLM_COALESCE", "auto") or "auto").strip().lower()
+    if mode in {"0", "false", "no", "off"}:
+        return "off"
+    if mode in {"1", "true", "yes", "on", "always"}:
+        return "always"
+    return "auto"
+
+
+_WAIT_MARGIN_SECONDS = 5.0
+
+
+def llm_wait_timeout(leader_budget: float) -> float:
+    """
+    Return how long followers wait for the leader.
+
+    Parameters
+    ----------
+    leader_budget : float
+        Longest the leader's call can take (gate wait plus HTTP timeout);
+        the default is this plus a margin.
+    """
+    default = leader_budget + _WAIT_MARGIN_SECONDS
+    raw = os.getenv("LLM_COALESCE_WAIT_SECONDS")
+    if not raw:
+        return default
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return default
+
+
+def request_key(**parts: Any) -> str:
+    """Stable hash of a request's identifying parts (JSON-serialisable values)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._counters: Dict[str, int] = {"leader": 0, "follower": 0, "timeout": 0}
+
+    def do(self, key: str, fn: Callable[[], Any], wait_timeout: float) -> Tuple[Any, str]:
+        """
+        Run ``fn`` once per concurrent ``key``.
+
+        Returns
+        -------
+        tuple
+            ``(result, role)`` where role is ``leader``, ``follower`` (shared
+            result, deep-copied) or ``timeout`` (gave up waiting and ran ``fn``).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+        if leader:
+            result = None
+            try:
+                result = fn()
+                return result, "leader"
+            except BaseException as exc:
+                flight.error = exc
+                raise
+            finally:
+                with self._lock:
+                    self._flights.pop(key, None)
+                    self._counters["leader"] += 1
+                    shared = flight.followers > 0
+                # Followers get their own copy; the leader's caller may mutate its result
+                if shared and flight.error is None:
+                    flight.result = copy.deepcopy(result)
+                flight.done.set()
+
+        if not flight.done.wait(wait_timeout):
+            with self._lock:
+                flight.followers -= 1
+                self._counters["timeout"] += 1
+            return fn(), "timeout"
+        with self._lock:
+            self._counters["follower"] += 1
+        if flight.error is not None:
+            raise flight.error
+        return copy.deepcopy(flight.result), "follower"
+
+    def stats(self) -> Dict[str, Any]:
+        """Return role counters and current in-flight keys for this process."""
+        with self._lock:
+            return {
+                **self._counters,
+                "inflight_keys": len(self._flights),
+                "waiting": sum(f.followers for f in self._flights.values()),
+            }
+
+
+llm_flights = SingleFlight()
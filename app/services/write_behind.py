@@ -0,0 +1,286 @@
+"""
+Write-behind queue for non-critical inserts.
+
+Assistant replies and audit entries do not need to be durable before the
+HTTP response goes out. In ``async`` mode they are queued in memory. A
+background thread writes them as multi-row INSERTs, one transaction per
+flush, so a busy worker commits a few times per second instead of once per
+request. ``sync`` mode (the default) writes every row before returning.
+
+Guarantees
+----------
+- Rows for the same thread are flushed before that thread is read again
+  (:meth:`WriteBehindQueue.barrier`, called by ``crud.get_messages_by_thread``).
+- Memory is bounded. When the queue is full, the caller writes inline instead.
+- Pending rows are flushed on shutdown (:meth:`WriteBehindQueue.stop`). A hard
+  crash in async mode loses at most one flush interval of queued rows.
+
+The queue and its barrier are per process, so read-your-writes only holds
+when the same worker serves the next read. Async mode is therefore refused
+when WEB_CONCURRENCY > 1: the queue logs a warning and writes synchronously.
+
+Environment
+-----------
+WRITE_BEHIND_MODE : str
+    ``sync`` (default) or ``async`` (single-worker deployments only).
+WRITE_BEHIND_FLUSH_MS : int
+    Maximum time a row waits in the queue (default 250).
+WRITE_BEHIND_BATCH_SIZE : int
+    Queued rows that trigger an early flush (default 100).
+WRITE_BEHIND_MAX_PENDING : int
+    Queue capacity in rows; beyond it writes happen inline (default 2000).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_MAX_ATTEMPTS = 3
+_warned_multi_worker = False
+
+
+def _worker_count() -> int:
+    try:
+        return int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+    except ValueError:
+        return 1
+
+
+def _queue_settings() -> Dict[str, Any]:
+    global _warned_multi_worker
+    mode = (os.getenv("WRITE_BEHIND_MODE", "sync") or "sync").strip().lower()
+    if mode == "async" and _worker_count() > 1:
+        if not _warned_multi_worker:
+            _warned_multi_worker = True
+            logger.warning(
+                "WRITE_BEHIND_MODE=async needs a single worker (WEB_CONCURRENCY=%s); writing synchronously",
+                os.getenv("WEB_CONCURRENCY"),
+            )
+        mode = "sync"
+    return {
+        "mode": mode if mode in {"sync", "async"} else "sync",
+        "flush_interval": max(0.01, int(os.getenv("WRITE_BEHIND_FLUSH_MS", "250") or 250) / 1000),
+        "batch_size": max(1, int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100") or 100)),
+        "max_pending": max(1, int(os.getenv("WRITE_BEHIND_MAX_PENDING", "2000") or 2000)),
+    }
+
+
+@dataclass
+class _Item:
+    bind: Engine
+    model: Any
+    rows: List[Dict[str, Any]]
+    thread_id: Optional[int] = None
+    attempts: int = 0
+
+
+def _insert_rows(bind: Engine, model: Any, rows: List[Dict[str, Any]]) -> None:
+    with bind.begin() as conn:
+        conn.execute(insert(model), rows)
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue flushed by a background thread.
+
+    The worker thread starts on the first queued write, so code paths that
+    never run the app lifespan (scripts, tests) still get flushed.
+    """
+
+    def __init__(self) -> None:
+        self._items: Deque[_Item] = deque()
+        self._pending_rows = 0
+        self._by_thread: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats: Dict[str, int] = {
+            "queued_rows": 0,
+            "inline_rows": 0,
+            "overflow": 0,
+            "flushes": 0,
+            "flushed_rows": 0,
+            "failed_flushes": 0,
+            "dropped_rows": 0,
+            "barrier_flushes": 0,
+        }
+
+    @property
+    def is_async(self) -> bool:
+        """True when WRITE_BEHIND_MODE=async."""
+        return _queue_settings()["mode"] == "async"
+
+    def write(self, bind: Engine, model: Any, rows: List[Dict[str, Any]], *, thread_id: Optional[int] = None) -> bool:
+        """
+        Insert ``rows`` into ``model``'s table now or on the next flush.
+
+        Parameters
+        ----------
+        bind : sqlalchemy.engine.Engine
+            Engine of the session the rows belong to (``db.get_bind()``).
+        model : type
+            Mapped class, e.g. ``models.Chat``.
+        rows : list[dict]
+            Column values, one dict per row. Rows are inserted in order.
+        thread_id : int | None
+            Chat thread the rows belong to, for read-your-writes.
+
+        Returns
+        -------
+        bool
+            True if the rows were queued, False if they were written inline.
+        """
+        if not rows:
+            return False
+        cfg = _queue_settings()
+        if cfg["mode"] == "async":
+            with self._lock:
+                if self._pending_rows + len(rows) <= cfg["max_pending"]:
+                    self._items.append(_Item(bind, model, list(rows), thread_id))
+                    self._pending_rows += len(rows)
+                    if thread_id is not None:
+                        self._by_thread[thread_id] = self._by_thread.get(thread_id, 0) + 1
+                    self._stats["queued_rows"] += len(rows)
+                    full = self._pending_rows >= cfg["batch_size"]
+                    queued = True
+                else:
+                    self._stats["overflow"] += 1
+                    queued = False
+            if queued:
+                self._ensure_worker(cfg["flush_interval"])
+                if full:
+                    self._wake.set()
+                return True
+        # Preserve per-thread ordering: earlier queued rows go first.
+        if thread_id is not None:
+            self.barrier(thread_id)
+        _insert_rows(bind, model, rows)
+        with self._lock:
+            self._stats["inline_rows"] += len(rows)
+        return False
+
+    def barrier(self, thread_id: Optional[int] = None) -> None:
+        """
+        Flush now if rows for ``thread_id`` (or any rows, when None) are queued.
+        """
+        with self._lock:
+            waiting = self._by_thread.get(thread_id, 0) if thread_id is not None else len(self._items)
+            if waiting:
+                self._stats["barrier_flushes"] += 1
+        if waiting:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write everything queued so far, one transaction per engine.
+
+        Returns
+        -------
+        int
+            Rows written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._items)
+                self._items.clear()
+            if not items:
+                return 0
+            written = 0
+            retry: List[_Item] = []
+            for bind in {id(i.bind): i.bind for i in items}.values():
+                group = [i for i in items if i.bind is bind]
+                try:
+                    with bind.begin() as conn:
+                        # Consecutive writes to the same table become one executemany.
+                        start = 0
+                        for end in range(1, len(group) + 1):
+                            if end == len(group) or group[end].model is not group[start].model:
+                                conn.execute(insert(group[start].model), [r for i in group[start:end] for r in i.rows])
+                                start = end
+                    written += sum(len(i.rows) for i in group)
+                except Exception:
+                    logger.exception("Write-behind flush failed for %d queued writes", len(group))
+                    with self._lock:
+                        self._stats["failed_flushes"] += 1
+                    for item in group:
+                        item.attempts += 1
+                    retry.extend(group)
+            with self._lock:
+                requeue = [i for i in retry if i.attempts < _MAX_ATTEMPTS]
+                kept = {id(i) for i in requeue}
+                for item in retry:
+                    if id(item) not in kept:
+                        logger.error("Dropping %d %s rows after %d failed flushes", len(item.rows), item.model.__name__, item.attempts)
+                        self._stats["dropped_rows"] += len(item.rows)
+                self._items.extendleft(reversed(requeue))
+                for item in items:
+                    if id(item) in kept:
+                        continue
+                    self._pending_rows -= len(item.rows)
+                    if item.thread_id is not None:
+                        left = self._by_thread.get(item.thread_id, 1) - 1
+                        if left > 0:
+                            self._by_thread[item.thread_id] = left
+                        else:
+                            self._by_thread.pop(item.thread_id, None)
+                self._stats["flushes"] += 1
+                self._stats["flushed_rows"] += written
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters, queue depth and mode for this process."""
+        with self._lock:
+            snap: Dict[str, Any] = dict(self._stats)
+            snap["pending_rows"] = self._pending_rows
+        snap["mode"] = _queue_settings()["mode"]
+        snap["running"] = self._thread is not None
+        return snap
+
+    def start(self) -> None:
+        """Start the flush thread (no-op in sync mode or if already running)."""
+        cfg = _queue_settings()
+        if cfg["mode"] == "async":
+            self._ensure_worker(cfg["flush_interval"])
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the flush thread and write whatever is still queued."""
+        self._stop.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=timeout)
+        self.flush()
+
+    def _ensure_worker(self, interval: float) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush loop error")
+                time.sleep(interval)
+
+
+queue = WriteBehindQueue()
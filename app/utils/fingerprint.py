@@ -0,0 +1,99 @@
+"""
+Content fingerprints shared by the ORM models and the ingest pipeline.
+
+This module only uses the standard library, so ``app.models`` can
+fingerprint content on assignment without importing ingest code.
+``content_sha256`` is the exact-dedupe key. ``simhash64`` is a 64-bit
+locality-sensitive signature for near-duplicate detection (see
+:mod:`app.ingest.dedupe`).
+
+Environment
+-----------
+RAG_NEAR_DUP_MAX_DISTANCE : int
+    Hamming distance under which chunks count as near-duplicates
+    (default 0 = exact dedupe only). SimHash is computed on write only
+    when this is above 0 at process start.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import re
+from typing import Optional
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def near_dup_max_distance() -> int:
+    """Return RAG_NEAR_DUP_MAX_DISTANCE (0 when unset or invalid)."""
+    try:
+        return max(0, int(os.getenv("RAG_NEAR_DUP_MAX_DISTANCE", "0") or "0"))
+    except ValueError:
+        return 0
+
+
+@functools.lru_cache(maxsize=1)
+def simhash_on_write() -> bool:
+    """Whether assigned content also gets a SimHash; read once per process."""
+    return near_dup_max_distance() > 0
+
+
+def content_sha256(text: Optional[str]) -> Optional[str]:
+    """
+    Return the hex SHA-256 of text, or None for empty content.
+
+    Blank content yields None so empty placeholder rows never collide in
+    the unique index (SQLite treats NULLs as distinct).
+
+    Parameters
+    ----------
+    text : str | None
+        Context content.
+
+    Returns
+    -------
+    str | None
+        Hex digest.
+    """
+    if text is None or not text.strip():
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def simhash64(text: Optional[str], shingle: int = 3) -> Optional[int]:
+    """
+    Return a 64-bit SimHash over lower-cased word shingles.
+
+    The value is returned as a signed 64-bit integer so it fits a SQLite
+    INTEGER column.
+
+    Parameters
+    ----------
+    text : str | None
+        Context content.
+    shingle : int
+        Words per shingle.
+
+    Returns
+    -------
+    int | None
+        Signed 64-bit signature, or None when the text has no words.
+    """
+    if not text:
+        return None
+    words = _TOKEN_RE.findall(text.lower())
+    if not words:
+        return None
+    grams = [" ".join(words[i : i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    weights = [0] * 64
+    for g in grams:
+        h = int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            value |= 1 << bit
+    return value - (1 << 64) if value >= (1 << 63) else value
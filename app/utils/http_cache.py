@@ -0,0 +1,164 @@
+"""
+Conditional GET and pre-serialized response caching for catalogue endpoints.
+
+The figures catalogue only changes when an admin edits it or an ingest runs.
+Triggers on ``historical_figures`` and ``figure_contexts`` bump a single
+revision counter in figures.db (see ``app.utils.migrations``). Responses are
+cached per process as JSON bytes keyed by endpoint and query, and tagged
+with the revision they were built at. One primary-key read of the revision
+is enough to tell whether a cached body is still current, in every worker.
+
+Each response carries a strong ETag (a hash of the body) and Cache-Control.
+A matching ``If-None-Match`` gets ``304 Not Modified`` with no body.
+
+Environment
+-----------
+CATALOG_CACHE_SIZE : int
+    Cached responses per process (default 512, 0 disables the byte cache).
+CATALOG_CACHE_MAX_AGE : int
+    ``max-age`` seconds browsers may reuse a response without revalidating (default 60).
+CATALOG_CACHE_STALE_WHILE_REVALIDATE : int
+    ``stale-while-revalidate`` seconds (default 600).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+CATALOG_REVISION_TABLE = "catalog_revision"
+
+
+def _cache_settings() -> Dict[str, int]:
+    return {
+        "size": max(0, int(os.getenv("CATALOG_CACHE_SIZE", "512") or 0)),
+        "max_age": max(0, int(os.getenv("CATALOG_CACHE_MAX_AGE", "60") or 0)),
+        "swr": max(0, int(os.getenv("CATALOG_CACHE_STALE_WHILE_REVALIDATE", "600") or 0)),
+    }
+
+
+def catalog_revision(db: Session) -> Optional[int]:
+    """
+    Return the figures-DB catalogue revision, or None if the counter is missing.
+    """
+    try:
+        return db.execute(text(f"SELECT revision FROM {CATALOG_REVISION_TABLE} WHERE id = 1")).scalar()
+    except OperationalError:
+        db.rollback()
+        return None
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison for If-None-Match (RFC 9110 13.1.2): ignore W/ prefixes.
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag in tags
+
+
+class ResponseCache:
+    """
+    Bounded LRU of ``key -> (revision, etag, body)``.
+
+    Entries built at an older revision are treated as misses and replaced.
+    """
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[Hashable, Tuple[int, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: Hashable, revision: int) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != revision:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, revision: int, etag: str, body: bytes, max_size: int) -> None:
+        if max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (revision, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+response_cache = ResponseCache()
+
+
+def cached_json_response(request: Request, db: Session, key: Hashable, build: Callable[[], Any]) -> Response:
+    """
+    Serve ``build()`` as JSON with revision-scoped caching, ETag and 304 handling.
+
+    Parameters
+    ----------
+    request : fastapi.Request
+        Incoming request (for ``If-None-Match``).
+    db : sqlalchemy.orm.Session
+        Figures database session used to read the revision.
+    key : Hashable
+        Cache key identifying endpoint and query, e.g. ``("figure", slug)``.
+    build : Callable[[], Any]
+        Produces the JSON-able payload on a miss. Exceptions (such as a 404
+        ``HTTPException``) propagate and nothing is cached.
+
+    Returns
+    -------
+    fastapi.Response
+        200 with the JSON body, or 304 without one.
+    """
+    cfg = _cache_settings()
+    revision = catalog_revision(db)
+    cached = response_cache.get(key, revision) if revision is not None else None
+    if cached is not None:
+        etag, body = cached
+    else:
+        body = json.dumps(jsonable_encoder(build()), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = _etag(body)
+        if revision is not None:
+            response_cache.put(key, revision, etag, body, cfg["size"])
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={cfg['max_age']}, stale-while-revalidate={cfg['swr']}",
+    }
+    if _if_none_match(request, etag):
+        response_cache.record_not_modified()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
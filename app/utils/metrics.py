@@ -0,0 +1,595 @@
+"""
+Prometheus-compatible metrics with multi-process aggregation.
+
+Metrics are declared once at import time with :func:`counter`,
+:func:`gauge` and :func:`histogram`. They are updated in-process and
+rendered in the Prometheus text exposition format (0.0.4) by ``GET /metrics``.
+The format is written by hand, so there is no client-library dependency.
+
+Under gunicorn every worker has its own registry. When METRICS_MULTIPROC_DIR
+is set, each process writes a JSON snapshot of its metrics to
+``<dir>/metrics_<pid>.json``. It does this every METRICS_FLUSH_SECONDS, on
+every scrape and at shutdown. The scraping worker merges all snapshots:
+
+- counters and histograms are summed over every file, including those of
+  exited workers, so totals never go backwards;
+- gauges are summed over live workers only. ``mark_process_dead`` (called
+  from gunicorn's ``child_exit`` hook) drops a dead worker's gauges.
+
+Some values are read from other state rather than updated in place. They come
+from callbacks:
+
+- ``register_callback(fn)`` runs in each process whenever a snapshot is
+  taken, e.g. for pool occupancy and queue depth;
+- ``register_callback(fn, scope="global")`` runs only in the scraping
+  process, e.g. for database-wide counts that every worker would otherwise
+  report again.
+
+Environment
+-----------
+METRICS_ENABLED : bool
+    Serve /metrics and record HTTP metrics (default true).
+METRICS_MULTIPROC_DIR : str
+    Directory for per-process snapshots (falls back to
+    PROMETHEUS_MULTIPROC_DIR; unset means single-process mode).
+METRICS_FLUSH_SECONDS : float
+    Snapshot interval in multi-process mode (default 5).
+METRICS_TOKEN : str
+    When set, /metrics requires ``Authorization: Bearer <token>``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Families: {name: {"type", "help", "buckets"?, "samples": [[labels, value], ...]}}
+# A histogram sample value is {"counts": [...per bucket + overflow], "sum": float}.
+Families = Dict[str, Dict[str, Any]]
+Callback = Callable[[], Families]
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _flag(name: str, default: str) -> bool:
+    return (os.getenv(name, default) or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def enabled() -> bool:
+    """True when METRICS_ENABLED is on."""
+    return _flag("METRICS_ENABLED", "true")
+
+
+def multiproc_dir() -> Optional[str]:
+    """Return the snapshot directory, or None in single-process mode."""
+    return os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def _flush_seconds() -> float:
+    return max(0.5, float(os.getenv("METRICS_FLUSH_SECONDS", "5") or 5))
+
+
+class Metric:
+    """
+    One metric family with a fixed set of label names.
+
+    Use ``labels(*values)`` for labelled metrics, or the update methods
+    directly when the metric has no labels.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: Any) -> "_Child":
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values!r}")
+        return _Child(self, tuple(str(v) for v in values))
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._add((), amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._add((), -amount)
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def _add(self, key: Tuple[str, ...], amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _set(self, key: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[key] = float(value)
+
+    def _observe(self, key: Tuple[str, ...], value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            state["counts"][idx] += 1
+            state["sum"] += value
+
+    def family(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = [
+                [dict(zip(self.labelnames, key)), {"counts": list(v["counts"]), "sum": v["sum"]} if isinstance(v, dict) else v]
+                for key, v in self._values.items()
+            ]
+        out: Dict[str, Any] = {"type": self.kind, "help": self.help, "samples": samples}
+        if self.kind == "histogram":
+            out["buckets"] = list(self.buckets)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class _Child:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: Metric, key: Tuple[str, ...]) -> None:
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._metric._add(self._key, amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._metric._add(self._key, -amount)
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._key, value)
+
+
+class Registry:
+    """Process-local metric families, callbacks and the multi-process flusher."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._callbacks: List[Callback] = []
+        self._global_callbacks: List[Callback] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def register_callback(self, fn: Callback, scope: str = "process") -> None:
+        with self._lock:
+            (self._global_callbacks if scope == "global" else self._callbacks).append(fn)
+
+    @staticmethod
+    def _run_callbacks(callbacks: Iterable[Callback]) -> Families:
+        out: Families = {}
+        for fn in callbacks:
+            try:
+                out.update(fn() or {})
+            except Exception:
+                logger.exception("Metrics callback %r failed", fn)
+        return out
+
+    def snapshot(self) -> Families:
+        """Return this process's metrics, including process-scope callbacks."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            callbacks = list(self._callbacks)
+        families = {m.name: m.family() for m in metrics}
+        families.update(self._run_callbacks(callbacks))
+        return families
+
+    def write_snapshot(self, families: Optional[Families] = None) -> Optional[str]:
+        """Write this process's snapshot file (multi-process mode only)."""
+        directory = multiproc_dir()
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        path = os.path.join(directory, f"metrics_{pid}.json")
+        tmp = f"{path}.tmp"
+        payload = {"pid": pid, "written_at": time.time(), "families": families if families is not None else self.snapshot()}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        return path
+
+    def collect(self) -> Families:
+        """
+        Return the merged view served by /metrics.
+
+        Writes this process's snapshot first so the file stays in step with what was served.
+        """
+        own = self.snapshot()
+        merged: Families = {}
+        _merge(merged, own, include_gauges=True)
+        directory = multiproc_dir()
+        if directory:
+            try:
+                self.write_snapshot(own)
+            except OSError:
+                logger.exception("Could not write metrics snapshot to %s", directory)
+            own_name = f"metrics_{os.getpid()}.json"
+            for path in sorted(glob.glob(os.path.join(directory, "metrics_*.json"))):
+                if os.path.basename(path) == own_name:
+                    continue
+                data = _read_snapshot(path)
+                if data is not None:
+                    _merge(merged, data.get("families") or {}, include_gauges=not data.get("dead"))
+        with self._lock:
+            global_callbacks = list(self._global_callbacks)
+        merged.update(self._run_callbacks(global_callbacks))
+        for fam in merged.values():
+            fam.pop("_index", None)
+        return merged
+
+    def render(self) -> str:
+        return render(self.collect())
+
+    def start(self) -> None:
+        """Start the periodic snapshot writer (no-op without METRICS_MULTIPROC_DIR)."""
+        if not multiproc_dir() or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the writer and write a final snapshot."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        if multiproc_dir():
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.exception("Could not write final metrics snapshot")
+
+    def _run(self) -> None:
+        interval = _flush_seconds()
+        while not self._stop.wait(interval):
+            try:
+                self.write_snapshot()
+            except Exception:
+                logger.exception("Metrics snapshot failed; will retry")
+
+    def reset(self) -> None:
+        """Zero every declared metric (tests)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+def _read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Missing or half-written by a dying process: skip it this scrape.
+        return None
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+
+def _merge(into: Families, families: Families, include_gauges: bool) -> None:
+    for name, fam in families.items():
+        if fam.get("type") == "gauge" and not include_gauges:
+            continue
+        target = into.get(name)
+        if target is None:
+            target = into[name] = {k: v for k, v in fam.items() if k != "samples"}
+            target["_index"] = {}
+            target["samples"] = []
+        elif target.get("type") != fam.get("type"):
+            continue
+        index: Dict[Any, int] = target["_index"]
+        for labels, value in fam.get("samples", []):
+            key = _label_key(labels)
+            pos = index.get(key)
+            if pos is None:
+                index[key] = len(target["samples"])
+                if isinstance(value, dict):
+                    value = {"counts": list(value["counts"]), "sum": value["sum"]}
+                target["samples"].append([labels, value])
+                continue
+            current = target["samples"][pos][1]
+            if isinstance(current, dict):
+                if len(current["counts"]) == len(value["counts"]):
+                    current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                    current["sum"] += value["sum"]
+            else:
+                target["samples"][pos][1] = current + value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels.items())
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in items) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(families: Families) -> str:
+    """Render families in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for name in sorted(families):
+        fam = families[name]
+        kind = fam.get("type", "untyped")
+        lines.append(f"# HELP {name} {fam.get('help', '')}".rstrip())
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in fam.get("samples", []):
+            if kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(list(fam.get("buckets", [])) + [math.inf], value["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', _fmt_value(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(value['sum'])}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None) -> None:
+    """
+    Flag a worker's snapshot as dead so its gauges stop counting.
+
+    Counters and histograms from the file keep contributing to totals.
+    Call from gunicorn's ``child_exit`` hook.
+    """
+    directory = directory or multiproc_dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f"metrics_{pid}.json")
+    data = _read_snapshot(path)
+    if data is None:
+        return
+    data["dead"] = True
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Metric:
+    return registry.register(Metric(name, help, "counter", labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Metric:
+    return registry.register(Metric(name, help, "gauge", labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Metric:
+    return registry.register(Metric(name, help, "histogram", labelnames, buckets))
+
+
+def register_callback(fn: Callback, scope: str = "process") -> None:
+    """Register a callback returning families; ``scope="global"`` runs it only when scraping."""
+    registry.register_callback(fn, scope)
+
+
+def gauge_family(help: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> Dict[str, Any]:
+    """Build a gauge family for a callback."""
+    return {"type": "gauge", "help": help, "samples": [[dict(labels), float(v)] for labels, v in samples]}
+
+
+def counter_family(help: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> Dict[str, Any]:
+    """Build a counter family for a callback."""
+    return {"type": "counter", "help": help, "samples": [[dict(labels), float(v)] for labels, v in samples]}
+
+
+# --- Shared metric definitions -------------------------------------------------
+
+HTTP_REQUEST_DURATION = histogram(
+    "pit_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = gauge("pit_http_requests_in_flight", "HTTP requests currently being served.")
+
+LLM_REQUEST_DURATION = histogram(
+    "pit_llm_request_duration_seconds",
+    "LLM provider call latency.",
+    ("provider", "model", "outcome"),
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+LLM_TOKENS = counter("pit_llm_tokens_total", "LLM tokens reported in provider usage.", ("provider", "model", "kind"))
+LLM_COALESCED = counter(
+    "pit_llm_coalesced_calls_total",
+    "Coalescible LLM calls by single-flight role (leader = upstream call, follower = shared result, timeout = stopped waiting).",
+    ("provider", "role"),
+)
+LLM_COALESCE_WAIT = histogram(
+    "pit_llm_coalesce_wait_seconds",
+    "Time followers waited for a leader's result.",
+    ("provider",),
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+
+EMBEDDING_DURATION = histogram(
+    "pit_embedding_duration_seconds",
+    "Embedding call latency (op=single for queries, batch for ingest).",
+    ("provider", "op", "outcome"),
+)
+EMBEDDING_TEXTS = counter("pit_embedding_texts_total", "Texts sent to the embedding backend.", ("provider", "op"))
+
+DB_POOL_CHECKOUT = histogram(
+    "pit_db_pool_checkout_seconds",
+    "Time to obtain a pooled database connection (waits on an exhausted pool included).",
+    ("db",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+
+def observe_llm_call(provider: str, model: str, seconds: float, usage: Optional[Dict[str, Any]], ok: bool = True) -> None:
+    """Record one LLM call and the token counts from its ``usage`` block."""
+    LLM_REQUEST_DURATION.labels(provider, model, "ok" if ok else "error").observe(seconds)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = (usage or {}).get(kind)
+        if isinstance(value, (int, float)) and value > 0:
+            LLM_TOKENS.labels(provider, model, kind.split("_")[0]).inc(value)
+
+
+def observe_llm_coalesce(provider: str, role: str, seconds: float) -> None:
+    """Record one coalescible LLM call; followers also record how long they waited."""
+    LLM_COALESCED.labels(provider, role).inc()
+    if role == "follower":
+        LLM_COALESCE_WAIT.labels(provider).observe(seconds)
+
+
+# --- Engines, threadpool and HTTP ---------------------------------------------
+
+_engines: Dict[str, Any] = {}
+
+
+def instrument_engine(engine: Any, name: str) -> None:
+    """
+    Time connection checkout on ``engine`` and export its pool occupancy.
+
+    ``Connection`` obtains its DBAPI connection through
+    ``engine.raw_connection()``, so wrapping that one method covers ORM
+    sessions and Core alike, and survives ``engine.dispose()``.
+    """
+    if name in _engines:
+        return
+    original = engine.raw_connection
+    observer = DB_POOL_CHECKOUT.labels(name)
+
+    def raw_connection(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            observer.observe(time.perf_counter() - started)
+
+    engine.raw_connection = raw_connection
+    _engines[name] = engine
+
+
+def _pool_families() -> Families:
+    in_use, size, overflow = [], [], []
+    for name, engine in _engines.items():
+        pool = engine.pool
+        labels = {"db": name}
+        if hasattr(pool, "checkedout"):
+            in_use.append((labels, pool.checkedout()))
+        if hasattr(pool, "size"):
+            size.append((labels, pool.size()))
+        if hasattr(pool, "overflow"):
+            overflow.append((labels, max(0, pool.overflow())))
+    return {
+        "pit_db_pool_connections_in_use": gauge_family("Pooled connections checked out.", in_use),
+        "pit_db_pool_size": gauge_family("Configured pool size.", size),
+        "pit_db_pool_overflow": gauge_family("Connections open beyond the pool size.", overflow),
+    }
+
+
+_threadpool_limiter: Any = None
+
+
+def _threadpool_families() -> Families:
+    limiter = _threadpool_limiter
+    if limiter is None:
+        return {}
+    stats = limiter.statistics()
+    return {
+        "pit_threadpool_busy": gauge_family("Threadpool tokens in use (sync endpoints and run_in_threadpool).", [({}, stats.borrowed_tokens)]),
+        "pit_threadpool_size": gauge_family("Threadpool capacity.", [({}, stats.total_tokens)]),
+        "pit_threadpool_waiting": gauge_family("Tasks waiting for a threadpool token.", [({}, stats.tasks_waiting)]),
+    }
+
+
+register_callback(_pool_families)
+register_callback(_threadpool_families)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and in-flight count per route template.
+
+    The route label is the matched path template (``/figures/{slug}``), so
+    cardinality stays bounded; unmatched paths share ``<unmatched>``.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+        global _threadpool_limiter
+        if _threadpool_limiter is None:
+            # The limiter is per event loop; capture it here so snapshot threads can read it.
+            import anyio.to_thread
+
+            _threadpool_limiter = anyio.to_thread.current_default_thread_limiter()
+        status_code: List[int] = [500]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message.get("status", 500)
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope.get("method", ""),
+                getattr(route, "path", None) or "<unmatched>",
+                status_code[0],
+            ).observe(time.perf_counter() - started)
@@ -1,19 +1,31 @@
-"""Lightweight migrations for guest tables with safe fallback recreate.
+"""Lightweight migrations for guest and figure tables with safe fallback recreate.
 
-This module ensures the guest tables match the ORM models. It performs
+This module ensures existing tables match the ORM models. It performs
 non-destructive column/index additions when possible. If the primary key
 definition on guest tables is incorrect, it safely drops only the guest
 tables so they are recreated with the correct schema by create_all().
 
-Guest tables only:
+Chat database:
 - guest_sessions
 - guest_messages
+- llm_profile_revision (counter bumped by triggers on every llm_profiles write)
+
+Figures database:
+- figure_contexts
+- historical_figures_fts (FTS5 search index kept in sync by triggers)
+- catalog_revision (counter bumped by triggers on every catalogue write)
 """
 
+import logging
 from typing import Dict, List, Set, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.utils.fingerprint import content_sha256, simhash64, simhash_on_write
+
+logger = logging.getLogger(__name__)
 
 
 def _table_exists(engine: Engine, table_name: str) -> bool:
@@ -53,6 +65,12 @@ def _ensure_unique_index(engine: Engine, index_name: str, table_name: str, colum
         )
 
 
+def _ensure_index(engine: Engine, index_name: str, table_name: str, column: str) -> None:
+    """Create a non-unique index if it does not already exist."""
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({column})"))
+
+
 def _backfill_session_tokens(engine: Engine) -> None:
     """Populate empty session_token values with random bytes."""
     with engine.begin() as conn:
@@ -119,6 +137,7 @@ def migrate_guest_tables(engine: Engine) -> None:
     )
     _backfill_session_tokens(engine)
     _ensure_unique_index(engine, "uq_guest_sessions_session_token", "guest_sessions", "session_token")
+    _ensure_index(engine, "ix_guest_sessions_expires_at", "guest_sessions", "expires_at")
 
     if _table_exists(engine, "guest_messages"):
         _ensure_columns(
@@ -132,3 +151,171 @@ def migrate_guest_tables(engine: Engine) -> None:
                 "timestamp": "timestamp DATETIME",
             },
         )
+        _ensure_index(engine, "ix_guest_messages_session_id", "guest_messages", "session_id")
+
+
+FIGURE_FTS_TABLE = "historical_figures_fts"
+FIGURE_FTS_COLUMNS = ("name", "slug", "era", "roles", "main_site", "short_summary")
+
+
+def _ensure_figure_search_index(engine: Engine) -> bool:
+    """
+    Create the FTS5 index over historical_figures and its sync triggers.
+
+    The index is an external-content table, so it stores only the inverted
+    index. INSERT/UPDATE/DELETE triggers on historical_figures keep it
+    current for every writer: ingest scripts, reseeding and admin edits.
+    When the table is first created it is rebuilt from existing rows.
+
+    Returns
+    -------
+    bool
+        False if this SQLite build lacks FTS5 (search falls back to LIKE).
+    """
+    cols = ", ".join(FIGURE_FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FIGURE_FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FIGURE_FTS_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {FIGURE_FTS_TABLE}({FIGURE_FTS_TABLE}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols});"
+    )
+    insert_new = f"INSERT INTO {FIGURE_FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});"
+    created = not _table_exists(engine, FIGURE_FTS_TABLE)
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FIGURE_FTS_TABLE} USING fts5("
+                    f"{cols}, content='historical_figures', content_rowid='id', "
+                    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+            )
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS historical_figures_fts_ai AFTER INSERT ON historical_figures "
+                f"BEGIN {insert_new} END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS historical_figures_fts_ad AFTER DELETE ON historical_figures "
+                f"BEGIN {delete_old} END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS historical_figures_fts_au AFTER UPDATE OF {cols} ON historical_figures "
+                f"BEGIN {delete_old} {insert_new} END"
+            ))
+            if created:
+                conn.execute(text(f"INSERT INTO {FIGURE_FTS_TABLE}({FIGURE_FTS_TABLE}) VALUES ('rebuild')"))
+    except OperationalError:
+        logger.warning("SQLite FTS5 unavailable; figure search will use LIKE scans", exc_info=True)
+        return False
+    return True
+
+
+def _ensure_catalog_revision(engine: Engine) -> None:
+    """
+    Create the single-row catalog_revision counter and the triggers that bump it.
+
+    Any insert, update or delete on historical_figures or figure_contexts
+    increments the revision, whether it comes from the API, an ingest job or
+    a script. HTTP caches key on it (see ``app.utils.http_cache``).
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS catalog_revision ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), revision INTEGER NOT NULL)"
+        ))
+        conn.execute(text("INSERT OR IGNORE INTO catalog_revision (id, revision) VALUES (1, 1)"))
+        for table in ("historical_figures", "figure_contexts"):
+            if not _table_exists(engine, table):
+                continue
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_rev_{op.lower()} AFTER {op} ON {table} "
+                    "BEGIN UPDATE catalog_revision SET revision = revision + 1 WHERE id = 1; END"
+                ))
+
+
+def migrate_llm_profile_tables(engine: Engine) -> None:
+    """
+    Create the single-row llm_profile_revision counter and its triggers.
+
+    Workers poll the counter to pick up profile changes made by any process
+    (see ``app.services.llm_profiles``).
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS llm_profile_revision ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), revision INTEGER NOT NULL)"
+        ))
+        conn.execute(text("INSERT OR IGNORE INTO llm_profile_revision (id, revision) VALUES (1, 1)"))
+        if not _table_exists(engine, "llm_profiles"):
+            return
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS llm_profiles_rev_{op.lower()} AFTER {op} ON llm_profiles "
+                "BEGIN UPDATE llm_profile_revision SET revision = revision + 1 WHERE id = 1; END"
+            ))
+
+
+def migrate_figure_tables(engine: Engine) -> None:
+    """Bring figures-database tables up to date with additive column changes."""
+    if _table_exists(engine, "historical_figures"):
+        _ensure_figure_search_index(engine)
+    _ensure_catalog_revision(engine)
+    if _table_exists(engine, "figure_contexts"):
+        _ensure_columns(
+            engine,
+            "figure_contexts",
+            {
+                "chunk_index": "chunk_index INTEGER",
+                "char_start": "char_start INTEGER",
+                "char_end": "char_end INTEGER",
+                "content_sha256": "content_sha256 TEXT",
+                "content_simhash": "content_simhash INTEGER",
+            },
+        )
+        _backfill_context_fingerprints(engine)
+        try:
+            _ensure_unique_index(engine, "uq_figure_contexts_slug_sha256", "figure_contexts", "figure_slug, content_sha256")
+        except IntegrityError:
+            # Pre-existing exact duplicates: keep the data, index non-uniquely for lookups.
+            logger.warning("figure_contexts has duplicate (figure_slug, content) rows; creating non-unique hash index")
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "CREATE INDEX IF NOT EXISTS ix_figure_contexts_slug_sha256 "
+                        "ON figure_contexts (figure_slug, content_sha256)"
+                    )
+                )
+
+
+def _backfill_context_fingerprints(engine: Engine, batch_size: int = 1000) -> None:
+    """
+    Compute content_sha256 for rows that predate the columns.
+
+    content_simhash is filled too only while near-duplicate filtering is on;
+    otherwise the admin ingest path computes it lazily when first needed.
+    """
+    with_simhash = simhash_on_write()
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, content FROM figure_contexts "
+                    "WHERE id > :last AND content_sha256 IS NULL ORDER BY id LIMIT :n"
+                ),
+                {"last": last_id, "n": batch_size},
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            params = [
+                {"id": r[0], "sha": content_sha256(r[1]), "sim": simhash64(r[1]) if with_simhash else None}
+                for r in rows
+                if content_sha256(r[1])
+            ]
+            if params:
+                conn.execute(
+                    text("UPDATE figure_contexts SET content_sha256 = :sha, content_simhash = :sim WHERE id = :id"),
+                    params,
+                )
@@ -0,0 +1,396 @@
+"""
+On-demand sampling profiler for a live worker process.
+
+An admin starts one of two kinds of session (see ``app.routers.admin_profile``):
+
+- ``requests``: profile the next N requests whose path starts with a route
+  prefix (for example ``/ask``);
+- ``process``: profile the whole process for T seconds.
+
+While a session is collecting, a background thread samples every thread's
+Python stack each PROFILER_INTERVAL_MS with ``sys._current_frames()``.
+Sync endpoints run in the threadpool and ``cProfile`` only sees the thread
+that enabled it, so sampling is what captures the endpoint, ORM and
+serialisation work. Each stack is weighted two ways:
+
+- wall: one sample per tick for every thread not parked in a wait
+  (``Event.wait``, ``queue.get``, the event loop's ``select``);
+- cpu: that thread's CPU time since the previous tick, read from its POSIX
+  thread CPU clock (wall only where unavailable).
+
+Results download as collapsed stacks (``flamegraph.pl``/speedscope), as a
+``pstats`` file (``snakeviz``, ``python -m pstats``), or as a JSON top list.
+In ``requests`` mode, stacks are only collected while a captured request is
+in flight. Other requests running at the same time also show up, and
+``overlapping_requests`` reports how many did.
+
+With no session, the middleware costs one global read per request and no
+sampler thread runs.
+
+Environment
+-----------
+PROFILER_ENABLED : bool
+    Allow profiling sessions (default true; endpoints are admin-only).
+PROFILER_INTERVAL_MS : float
+    Default sampling interval (default 5).
+PROFILER_MAX_SECONDS : float
+    Upper bound on any session's lifetime (default 300).
+PROFILER_MAX_STACKS : int
+    Distinct stacks kept per session; further new stacks are dropped (default 50000).
+"""
+
+from __future__ import annotations
+
+import io
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Frame = Tuple[str, int, str]  # (filename, first line, function) - the pstats function key
+Stack = Tuple[Frame, ...]  # root first
+
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("_base.py", "wait"),
+}
+
+
+def _flag(name: str, default: str) -> bool:
+    return (os.getenv(name, default) or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def enabled() -> bool:
+    """True when PROFILER_ENABLED is on."""
+    return _flag("PROFILER_ENABLED", "true")
+
+
+def _profiler_settings() -> Dict[str, float]:
+    return {
+        "interval_ms": max(0.5, float(os.getenv("PROFILER_INTERVAL_MS", "5") or 5)),
+        "max_seconds": max(1.0, float(os.getenv("PROFILER_MAX_SECONDS", "300") or 300)),
+        "max_stacks": max(100, int(os.getenv("PROFILER_MAX_STACKS", "50000") or 50000)),
+    }
+
+
+def _thread_cpu_clock(ident: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+class ProfileSession:
+    """State and collected samples of one profiling session."""
+
+    def __init__(self, kind: str, route: Optional[str], count: int, seconds: float, interval_ms: float) -> None:
+        cfg = _profiler_settings()
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.route = route
+        self.target = count
+        self.remaining = count
+        self.interval = interval_ms / 1000.0
+        self.max_stacks = int(cfg["max_stacks"])
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + min(seconds, cfg["max_seconds"])
+        self.finished_at: Optional[float] = None
+        self.state = "collecting" if kind == "process" else "armed"
+        self.active = 0
+        self.overlapping = 0
+        self.ticks = 0
+        self.dropped_stacks = 0
+        self.requests: List[Dict[str, Any]] = []
+        self.wall: Counter = Counter()
+        self.cpu_ns: Counter = Counter()
+        self.cpu_clocks = True
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    # --- request capture -------------------------------------------------
+
+    def claim(self, path: str) -> bool:
+        """Take one capture slot for ``path``; False when it does not match or the quota is used."""
+        with self._lock:
+            if self.state not in ("armed", "collecting") or self.remaining <= 0:
+                return False
+            if self.route and not path.startswith(self.route):
+                if self.active:
+                    self.overlapping += 1
+                return False
+            self.remaining -= 1
+            self.active += 1
+            self.state = "collecting"
+            return True
+
+    def release(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.active -= 1
+            self.requests.append(record)
+            if self.remaining <= 0 and self.active == 0:
+                self._finish("done")
+
+    # --- lifecycle -------------------------------------------------------
+
+    def _finish(self, state: str) -> None:
+        if self.finished_at is None:
+            self.state = state
+            self.finished_at = time.time()
+            self._done.set()
+
+    def stop(self, state: str = "cancelled") -> None:
+        with self._lock:
+            self._finish(state)
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def sampling(self) -> bool:
+        if time.monotonic() >= self.deadline:
+            self.stop("done" if self.kind == "process" else "timeout")
+            return False
+        return self.kind == "process" or self.active > 0
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "pid": os.getpid(),
+                "kind": self.kind,
+                "route": self.route,
+                "state": self.state,
+                "requests_target": self.target if self.kind == "requests" else None,
+                "requests_captured": len(self.requests),
+                "overlapping_requests": self.overlapping,
+                "interval_ms": round(self.interval * 1000, 3),
+                "ticks": self.ticks,
+                "distinct_stacks": len(self.wall),
+                "dropped_stacks": self.dropped_stacks,
+                "cpu_weights": self.cpu_clocks,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "requests": list(self.requests[-50:]),
+            }
+
+    # --- sampling --------------------------------------------------------
+
+    def add(self, stack: Stack, idle: bool, cpu_ns: int) -> None:
+        if stack not in self.wall and len(self.wall) >= self.max_stacks:
+            self.dropped_stacks += 1
+            return
+        if not idle:
+            self.wall[stack] += 1
+        if cpu_ns > 0:
+            self.cpu_ns[stack] += cpu_ns
+
+    # --- output ----------------------------------------------------------
+
+    def weights(self, weight: str) -> Dict[Stack, float]:
+        """Seconds per stack, by wall-clock samples or thread CPU time."""
+        with self._lock:
+            if weight == "cpu" and self.cpu_clocks:
+                return {s: ns / 1e9 for s, ns in self.cpu_ns.items()}
+            return {s: n * self.interval for s, n in self.wall.items()}
+
+
+def _frame_label(frame: Frame) -> str:
+    filename, line, name = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed(weights: Dict[Stack, float]) -> str:
+    """Render ``frame;frame;... value`` lines (value in microseconds)."""
+    lines = [
+        ";".join(_frame_label(f).replace(";", ":") for f in stack) + f" {max(1, int(round(sec * 1e6)))}"
+        for stack, sec in sorted(weights.items(), key=lambda kv: -kv[1])
+        if sec > 0
+    ]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _function_stats(weights: Dict[Stack, float]) -> Dict[Frame, List[Any]]:
+    # [cc, nc, tt, ct, callers{caller: [cc, nc, tt, ct]}] per function, in seconds.
+    stats: Dict[Frame, List[Any]] = {}
+    for stack, sec in weights.items():
+        if not stack or sec <= 0:
+            continue
+        seen = set()
+        for depth, frame in enumerate(stack):
+            entry = stats.setdefault(frame, [0, 0, 0.0, 0.0, {}])
+            if frame not in seen:  # recursion: count cumulative time once per stack
+                seen.add(frame)
+                entry[0] += 1
+                entry[1] += 1
+                entry[3] += sec
+            if depth:
+                caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                caller[0] += 1
+                caller[1] += 1
+                caller[3] += sec
+                if depth == len(stack) - 1:
+                    caller[2] += sec
+        stats[stack[-1]][2] += sec
+    return stats
+
+
+def pstats_bytes(weights: Dict[Stack, float]) -> bytes:
+    """Serialise sampled weights in the marshal format read by ``pstats.Stats``."""
+    stats = {
+        frame: (cc, nc, tt, ct, {c: tuple(v) for c, v in callers.items()})
+        for frame, (cc, nc, tt, ct, callers) in _function_stats(weights).items()
+    }
+    buf = io.BytesIO()
+    marshal.dump(stats, buf)
+    return buf.getvalue()
+
+
+def top(weights: Dict[Stack, float], limit: int = 30) -> Dict[str, Any]:
+    """Functions ranked by self and cumulative seconds."""
+    stats = _function_stats(weights)
+    total = sum(weights.values())
+
+    def rows(idx: int) -> List[Dict[str, Any]]:
+        ranked = sorted(stats.items(), key=lambda kv: -kv[1][idx])[:limit]
+        return [
+            {"function": _frame_label(f), "self_s": round(s[2], 4), "cumulative_s": round(s[3], 4), "samples": s[1]}
+            for f, s in ranked
+        ]
+
+    return {"total_s": round(total, 4), "by_self": rows(2), "by_cumulative": rows(3)}
+
+
+class SamplingProfiler:
+    """Owns the single active session and its sampler thread."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.session: Optional[ProfileSession] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> Optional[ProfileSession]:
+        session = self.session
+        return session if session is not None and not session.finished else None
+
+    def start(self, kind: str, route: Optional[str] = None, count: int = 1, seconds: float = 60.0,
+              interval_ms: Optional[float] = None) -> ProfileSession:
+        """
+        Begin a session, replacing the finished one.
+
+        Raises
+        ------
+        RuntimeError
+            If a session is already running in this process.
+        """
+        interval = interval_ms or _profiler_settings()["interval_ms"]
+        with self._lock:
+            if self.active is not None:
+                raise RuntimeError("A profiling session is already running in this process")
+            session = ProfileSession(kind, route, count, seconds, interval)
+            self.session = session
+            self._thread = threading.Thread(target=self._run, args=(session,), name="profiler-sampler", daemon=True)
+            self._thread.start()
+            return session
+
+    def stop(self) -> Optional[ProfileSession]:
+        session = self.session
+        if session is not None:
+            session.stop()
+        return session
+
+    def _run(self, session: ProfileSession) -> None:
+        own = threading.get_ident()
+        clocks: Dict[int, Optional[int]] = {}
+        last_cpu: Dict[int, int] = {}
+        while not session.finished:
+            if not session.sampling():
+                if session.finished:
+                    break
+                time.sleep(session.interval)
+                # Reset CPU baselines so time spent between captured requests is not attributed.
+                last_cpu.clear()
+                continue
+            frames = sys._current_frames()
+            with session._lock:
+                session.ticks += 1
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack: List[Frame] = []
+                    f = frame
+                    while f is not None and len(stack) < 256:
+                        code = f.f_code
+                        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                        f = f.f_back
+                    if not stack:
+                        continue
+                    leaf = stack[0]
+                    idle = (os.path.basename(leaf[0]), leaf[2]) in _IDLE_LEAVES
+                    cpu_delta = 0
+                    if ident not in clocks:
+                        clocks[ident] = _thread_cpu_clock(ident)
+                    clock = clocks[ident]
+                    if clock is None:
+                        session.cpu_clocks = False
+                    else:
+                        try:
+                            now = time.clock_gettime_ns(clock)
+                        except OSError:  # thread exited between snapshot and read
+                            continue
+                        prev = last_cpu.get(ident)
+                        last_cpu[ident] = now
+                        cpu_delta = now - prev if prev is not None else 0
+                    session.add(tuple(reversed(stack)), idle, cpu_delta)
+            time.sleep(session.interval)
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware that marks captured requests for an armed ``requests`` session.
+
+    Costs a single attribute read per request while no session is active.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        session = profiler.session
+        if session is None or session.kind != "requests" or session.finished or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not session.claim(scope.get("path", "")):
+            await self.app(scope, receive, send)
+            return
+        status_code: List[int] = [500]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message.get("status", 500)
+            await send(message)
+
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.release(
+                {
+                    "method": scope.get("method"),
+                    "path": scope.get("path"),
+                    "status": status_code[0],
+                    "wall_ms": round((time.perf_counter() - wall0) * 1000, 2),
+                    "process_cpu_ms": round((time.process_time() - cpu0) * 1000, 2),
+                }
+            )
@@ -9,6 +9,7 @@ to form the full prompt passed to the AI.
 from typing import Any, Dict, List, Optional, Tuple
 
 from app import models
+from app.utils.timing import span, timed
 
 
 def _extract_instruction_text(figure: Optional[models.HistoricalFigure]) -> str:
@@ -175,6 +176,7 @@ def _safe_search_figure_context(query: str, figure_slug: str, top_k: int = 5) ->
         return []
 
 
+@timed("prompt_build")
 def build_prompt(
     figure: Optional[models.HistoricalFigure],
     user_message: str,
@@ -211,7 +213,8 @@ def build_prompt(
 
     contexts: List[Dict[str, Any]] = []
     if use_rag and figure and getattr(figure, "slug", None):
-        contexts = _safe_search_figure_context(user_message, figure.slug, top_k=5)
+        with span("rag"):
+            contexts = _safe_search_figure_context(user_message, figure.slug, top_k=5)
     if not contexts:
         contexts = _figure_context_payload(figure) if figure else []
 
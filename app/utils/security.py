@@ -7,15 +7,21 @@ Security utilities for password hashing and JWT-based authentication, including
 
 from __future__ import annotations
 
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status, Header, Cookie
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from app import crud, models, database
+from app import crud, database, models, schemas
 from app.settings import get_settings
 
 # Accept legacy "bcrypt" hashes, generate "bcrypt_sha256" going forward.
@@ -66,6 +72,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return _pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and return a fresh hash when the stored one is deprecated.
+
+    Legacy bcrypt hashes (or hashes with outdated rounds) yield a new
+    bcrypt_sha256 hash the caller should persist. A missing hash runs a dummy
+    verification so unknown users take as long as wrong passwords.
+    """
+    if not hashed_password:
+        _pwd_context.dummy_verify()
+        return False, None
+    return _pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def create_access_token(data: dict, *, minutes: Optional[int] = None, scope: str = "user") -> str:
     """
     Create and sign a JWT access token with an expiration claim and scope.
@@ -87,28 +107,135 @@ def _decode_token(token: str) -> dict:
     return jwt.decode(token, _settings.secret_key, algorithms=[_ALGORITHM])
 
 
+class _UserCache:
+    """
+    Bounded, short-TTL LRU cache of token -> user projection.
+
+    Keys are SHA-256 digests of the raw token so bearer tokens are never held
+    in memory as dict keys. Entries expire after AUTH_USER_CACHE_TTL seconds
+    (default 30, 0 disables) or at the token's own ``exp``, whichever is
+    first. ORM update/delete events on ``User`` evict that user's entries in
+    this process; the TTL bounds staleness for changes made by other workers.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, schemas.UserRead]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _settings() -> Tuple[float, int]:
+        ttl = float(os.getenv("AUTH_USER_CACHE_TTL", "30") or 0)
+        size = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024") or 0)
+        return ttl, size
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[schemas.UserRead]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, user: schemas.UserRead, token_exp: Optional[float]) -> None:
+        ttl, size = self._settings()
+        if ttl <= 0 or size <= 0:
+            return
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: Optional[int]) -> None:
+        with self._lock:
+            for k in [k for k, (_, u) in self._entries.items() if u.id == user_id]:
+                del self._entries[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = _UserCache()
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _evict_cached_user(_mapper, _connection, target: models.User) -> None:
+    user_cache.invalidate_user(target.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _evict_on_bulk_user_change(state) -> None:
+    # Query.update()/delete() bypass per-instance events; drop everything for users.
+    if (state.is_update or state.is_delete) and any(
+        getattr(m, "class_", None) is models.User for m in state.all_mappers
+    ):
+        user_cache.clear()
+
+
+def _resolve_user(db: Session, token: str) -> Optional[schemas.UserRead]:
+    """
+    Return the user projection for a token, consulting the cache first.
+
+    Raises
+    ------
+    jose.JWTError
+        If the token is invalid or expired.
+    """
+    key = user_cache.key(token)
+    cached = user_cache.get(key)
+    if cached is not None:
+        return cached
+    payload = _decode_token(token)
+    username = payload.get("sub")
+    if not username:
+        return None
+    user = crud.get_user_by_username(db, username=username)
+    if user is None:
+        return None
+    projection = schemas.UserRead.model_validate(user)
+    exp = payload.get("exp")
+    user_cache.put(key, projection, float(exp) if exp is not None else None)
+    return projection
+
+
 def get_current_user(
     token: Optional[str] = Depends(_oauth2_scheme),
     db: Session = Depends(database.get_db_chat),
-) -> models.User:
+) -> schemas.UserRead:
     """
     Return the authenticated user derived from a normal bearer token.
+
+    The result is a read-only projection (id, username, role) served from a
+    short-TTL cache, so most requests skip both JWT decoding and the user query.
     """
     # Avoid adding a WWW-Authenticate header to prevent native browser auth popups
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
+    if not token:
+        raise credentials_exception
     try:
-        if not token:
-            raise credentials_exception
-        payload = _decode_token(token)
-        username = payload.get("sub")
-        if not username:
-            raise credentials_exception
+        user = _resolve_user(db, token)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
     return user
@@ -132,7 +259,7 @@ def admin_required(authorization: Optional[str] = Header(None)) -> str:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
 
 
-def get_admin_user(current_user: models.User = Depends(get_current_user)) -> models.User:
+def get_admin_user(current_user: schemas.UserRead = Depends(get_current_user)) -> schemas.UserRead:
     """Require that the authenticated user has role=admin.
 
     This enforces role-based access using normal user tokens.
@@ -148,7 +275,7 @@ def get_current_user_loose(
     pit_admin_cookie: str | None = Cookie(None, alias="pit_admin_token"),
     alt_cookie: str | None = Cookie(None, alias="access_token"),
     db: Session = Depends(database.get_db_chat),
-) -> models.User:
+) -> schemas.UserRead:
     """Authenticate using either a Bearer header or a host-scoped cookie.
 
     This is intended for static page GET routes where the browser performs a
@@ -165,19 +292,15 @@ def get_current_user_loose(
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     try:
-        payload = _decode_token(token)
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        user = _resolve_user(db, token)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = crud.get_user_by_username(db, username=username)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
 
 
-def get_admin_user_loose(current_user: models.User = Depends(get_current_user_loose)) -> models.User:
+def get_admin_user_loose(current_user: schemas.UserRead = Depends(get_current_user_loose)) -> schemas.UserRead:
     """Like get_admin_user, but accepts either Bearer header or dev cookie token.
 
     Useful for static HTML GET routes where the browser doesn't attach the
@@ -0,0 +1,228 @@
+"""
+Per-request SQL statement accounting and a slow-query log.
+
+``instrument(engine, name)`` hooks ``before/after_cursor_execute`` on an
+engine. Each statement is then:
+
+- added to the current request's timing scope (see :mod:`app.utils.timing`)
+  as statement count, total DB time and the slowest few statements, which
+  show up in ``Server-Timing`` (``db;dur=..;desc="N queries"``) and in the
+  TIMING_LOG line;
+- logged on ``app.sql`` when it takes longer than SQL_SLOW_MS, together
+  with its ``EXPLAIN QUERY PLAN`` for SQLite SELECTs;
+- counted by any open :func:`capture` block, which tests use to pin query
+  budgets for endpoints.
+
+Environment
+-----------
+SQL_STATS_ENABLED : bool
+    Record statements at all (default true).
+SQL_SLOW_MS : float
+    Slow-query threshold in milliseconds (default 250; 0 disables the log).
+SQL_EXPLAIN_SLOW : bool
+    Attach the query plan to slow-query log lines (default true).
+SQL_SLOWEST_KEPT : int
+    Slowest statements kept per request (default 3).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils import timing
+
+logger = logging.getLogger("app.sql")
+
+_WS = re.compile(r"\s+")
+_EXPLAINABLE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_START_KEY = "_sql_stats_started"
+_instrumented: Dict[int, str] = {}
+_instrumented_lock = threading.Lock()
+
+
+def _flag(name: str, default: str) -> bool:
+    return (os.getenv(name, default) or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def enabled() -> bool:
+    """True when SQL_STATS_ENABLED is on."""
+    return _flag("SQL_STATS_ENABLED", "true")
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _short(statement: str, limit: int = 300) -> str:
+    text = _WS.sub(" ", statement).strip()
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+class QueryStats:
+    """Statements seen by one request (or one :func:`capture` block)."""
+
+    __slots__ = ("count", "total_ms", "slowest", "statements", "keep", "_lock")
+
+    def __init__(self, keep: int = 3, record_statements: bool = False) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest: List[Tuple[float, str, str]] = []
+        self.statements: Optional[List[str]] = [] if record_statements else None
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def add(self, db: str, statement: str, ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            if self.statements is not None:
+                self.statements.append(_short(statement))
+            if self.keep > 0 and (len(self.slowest) < self.keep or ms > self.slowest[-1][0]):
+                self.slowest.append((ms, db, _short(statement)))
+                self.slowest.sort(key=lambda item: -item[0])
+                del self.slowest[self.keep :]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": self.count,
+                "ms": round(self.total_ms, 1),
+                "slowest": [{"ms": round(ms, 1), "db": db, "sql": sql} for ms, db, sql in self.slowest],
+            }
+
+
+# Open capture() blocks; statements from any thread are counted by all of them.
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+
+
+@contextmanager
+def capture() -> Iterator[QueryStats]:
+    """
+    Count every statement executed on instrumented engines inside the block.
+
+    Examples
+    --------
+    >>> with capture() as q:
+    ...     pass
+    >>> q.count
+    0
+    """
+    stats = QueryStats(keep=0, record_statements=True)
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryStats]:
+    """
+    Fail when the block runs more than ``limit`` statements.
+
+    Raises
+    ------
+    AssertionError
+        With the executed statements listed, when over budget.
+    """
+    with capture() as stats:
+        yield stats
+    if stats.count > limit:
+        listing = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(stats.statements or [], 1))
+        raise AssertionError(f"Expected at most {limit} SQL statements, got {stats.count}:\n{listing}")
+
+
+def _explain(cursor: Any, statement: str, parameters: Any) -> Optional[str]:
+    try:
+        plan_cursor = cursor.connection.cursor()
+        try:
+            plan_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+            rows = plan_cursor.fetchall()
+        finally:
+            plan_cursor.close()
+    except Exception as exc:  # the plan is diagnostics only
+        return f"<explain failed: {exc}>"
+    return " | ".join(str(row[-1]) for row in rows)
+
+
+def _before(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _on_error(exception_context: Any) -> None:
+    conn = exception_context.connection
+    starts = conn.info.get(_START_KEY) if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def _after_for(name: str, dialect: str):
+    def _after(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        starts = conn.info.get(_START_KEY)
+        if not starts:
+            return
+        ms = (time.perf_counter() - starts.pop()) * 1000
+        current = timing.current()
+        if current is not None:
+            if current.queries is None:
+                current.queries = QueryStats(keep=_int_env("SQL_SLOWEST_KEPT", 3))
+            current.add("db", ms)
+            current.queries.add(name, statement, ms)
+        if _captures:
+            with _captures_lock:
+                open_captures = list(_captures)
+            for stats in open_captures:
+                stats.add(name, statement, ms)
+        threshold = _float_env("SQL_SLOW_MS", 250.0)
+        if threshold > 0 and ms >= threshold:
+            plan = None
+            if dialect == "sqlite" and not executemany and _EXPLAINABLE.match(statement) and _flag("SQL_EXPLAIN_SLOW", "true"):
+                plan = _explain(cursor, statement, parameters)
+            logger.warning(
+                "slow query db=%s ms=%.1f sql=%s%s",
+                name,
+                ms,
+                _short(statement, 1000),
+                f" plan=[{plan}]" if plan else "",
+            )
+
+    return _after
+
+
+def instrument(engine: Engine, name: str) -> None:
+    """
+    Attach statement hooks to ``engine`` once; ``name`` labels its log lines.
+
+    With SQL_STATS_ENABLED=false at startup nothing is attached.
+    """
+    if not enabled():
+        return
+    with _instrumented_lock:
+        if id(engine) in _instrumented:
+            return
+        _instrumented[id(engine)] = name
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after_for(name, engine.dialect.name))
+    event.listen(engine, "handle_error", _on_error)
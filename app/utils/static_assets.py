@@ -0,0 +1,257 @@
+"""
+In-memory static asset serving with precompressed variants and HTTP caching.
+
+Each file under ``static_frontend/`` is read, hashed and compressed once.
+That happens at startup (``StaticAssetStore.preload``) or on first request.
+After that it is served from memory:
+
+- A strong ETag per encoding, plus ``Last-Modified``. ``If-None-Match`` and
+  ``If-Modified-Since`` get 304.
+- ``Accept-Encoding`` negotiation between brotli (when the optional
+  ``brotli`` package is installed), gzip and identity. Prebuilt ``.br`` /
+  ``.gz`` siblings produced at build time are used as-is.
+- Fingerprinted build output (``assets/index-<hash>.js``) is cached for a
+  year as ``immutable``. Everything else, including the HTML shells, is
+  ``no-cache``, so browsers revalidate with a cheap 304.
+
+Environment
+-----------
+STATIC_ASSETS_WATCH : bool
+    Re-stat files on each request and reload changed ones (default true
+    when ENVIRONMENT=dev, otherwise false).
+STATIC_MIN_COMPRESS_BYTES : int
+    Files smaller than this are not compressed (default 1024).
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+
+try:  # optional dependency
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/manifest+json", "image/svg+xml", "application/xml")
+# Vite build output: assets/<name>-<8+ url-safe hash chars>.<ext>
+_HASHED_NAME_RE = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8,}\.(?:js|mjs|css|woff2?|png|jpe?g|svg|webp|avif|ico)$")
+_IMMUTABLE = "public, max-age=31536000, immutable"
+_REVALIDATE = "no-cache"
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+def _settings() -> Dict[str, object]:
+    watch_default = "true" if os.getenv("ENVIRONMENT", "dev").lower() == "dev" else "false"
+    return {
+        "watch": (os.getenv("STATIC_ASSETS_WATCH", watch_default) or "").lower() in {"1", "true", "yes"},
+        "min_compress": max(0, int(os.getenv("STATIC_MIN_COMPRESS_BYTES", "1024") or 0)),
+    }
+
+
+@dataclass
+class StaticAsset:
+    """One file held in memory with its encoded variants."""
+
+    body: bytes
+    media_type: str
+    etag: str
+    last_modified: str
+    mtime_ns: int
+    size: int
+    cache_control: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    def variant_etag(self, encoding: Optional[str]) -> str:
+        # Strong validators must differ between representations.
+        return self.etag if not encoding else f'{self.etag[:-1]}-{encoding}"'
+
+
+def is_compressible(media_type: str, size: int, min_size: int) -> bool:
+    """Return True for text-like types at least ``min_size`` bytes long."""
+    return size >= min_size and media_type.startswith(_COMPRESSIBLE)
+
+
+def _compress(path: Path, body: bytes, media_type: str, min_size: int) -> Dict[str, bytes]:
+    variants: Dict[str, bytes] = {}
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        prebuilt = path.with_name(path.name + suffix)
+        if prebuilt.is_file() and prebuilt.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            variants[encoding] = prebuilt.read_bytes()
+    if not is_compressible(media_type, len(body), min_size):
+        return variants
+    if "gzip" not in variants:
+        variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    if "br" not in variants and brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    # Drop variants that do not actually save bytes.
+    return {k: v for k, v in variants.items() if len(v) < len(body)}
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[token] = q
+    return out
+
+
+class StaticAssetStore:
+    """
+    Serve files under ``root`` from memory.
+
+    Parameters
+    ----------
+    root : pathlib.Path
+        Directory holding the built frontend.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root.resolve()
+        self._assets: Dict[str, StaticAsset] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, rel: str) -> Optional[Path]:
+        path = (self.root / rel).resolve()
+        if self.root not in path.parents or not path.is_file():
+            return None
+        if path.suffix in {".gz", ".br"} or path.name.startswith("."):
+            return None
+        return path
+
+    def _load(self, rel: str, path: Path) -> StaticAsset:
+        stat = path.stat()
+        body = path.read_bytes()
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        asset = StaticAsset(
+            body=body,
+            media_type=media_type,
+            etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            cache_control=_IMMUTABLE if _HASHED_NAME_RE.match(rel) else _REVALIDATE,
+            variants=_compress(path, body, media_type, int(_settings()["min_compress"])),
+        )
+        with self._lock:
+            self._assets[rel] = asset
+        return asset
+
+    def get(self, rel: str) -> Optional[StaticAsset]:
+        """Return the cached asset for ``rel``, loading (or reloading when watched) as needed."""
+        rel = rel.lstrip("/")
+        watch = _settings()["watch"]
+        asset = self._assets.get(rel)
+        if asset is not None and not watch:
+            return asset
+        path = self._resolve(rel)
+        if path is None:
+            return None
+        # Key on the canonical path so "a/../b" cannot grow the cache.
+        key = path.relative_to(self.root).as_posix()
+        asset = self._assets.get(key)
+        if asset is not None:
+            stat = path.stat()
+            if not watch or (stat.st_mtime_ns == asset.mtime_ns and stat.st_size == asset.size):
+                return asset
+        return self._load(key, path)
+
+    def preload(self) -> Tuple[int, int]:
+        """
+        Load and compress every file up front.
+
+        Returns
+        -------
+        tuple[int, int]
+            Files loaded and total in-memory bytes including variants.
+        """
+        if not self.root.is_dir():
+            return 0, 0
+        count = total = 0
+        for path in self.root.rglob("*"):
+            rel = path.relative_to(self.root).as_posix()
+            if self._resolve(rel) is None:
+                continue
+            asset = self._load(rel, path)
+            count += 1
+            total += len(asset.body) + sum(len(v) for v in asset.variants.values())
+        logger.info("Static assets preloaded: %d files, %d bytes in memory", count, total)
+        return count, total
+
+    def response(self, request: Request, rel: str) -> Response:
+        """
+        Build the response for ``rel``: 200 with the best encoding, or 304.
+
+        Raises
+        ------
+        fastapi.HTTPException
+            404 when the file does not exist under the root.
+        """
+        asset = self.get(rel)
+        if asset is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = None
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and accepted.get(candidate, 0) > 0:
+                encoding = candidate
+                break
+        etag = asset.variant_etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": asset.cache_control,
+        }
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        inm = request.headers.get("if-none-match")
+        if inm is not None:
+            tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+            valid = {asset.variant_etag(e) for e in (None, *asset.variants)}
+            if "*" in tags or tags & valid:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        else:
+            ims = request.headers.get("if-modified-since")
+            if ims:
+                try:
+                    if parsedate_to_datetime(asset.last_modified) <= parsedate_to_datetime(ims):
+                        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+                except (TypeError, ValueError):
+                    pass
+
+        body = asset.variants[encoding] if encoding else asset.body
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=status.HTTP_200_OK, headers=headers, media_type=asset.media_type)
+        return Response(content=body, headers=headers, media_type=asset.media_type)
@@ -0,0 +1,273 @@
+"""
+Lightweight per-request stage timing.
+
+Wrap a stage with ``span("name")`` (context manager) or ``@timed("name")``
+(decorator). While a request is active, ``TimingMiddleware`` collects the
+spans in a context variable, then emits them three ways:
+
+- a ``Server-Timing`` response header, e.g. ``llm;dur=812.4, prompt_build;dur=31.0``;
+- one structured log line per request on the ``app.timing`` logger;
+- process-wide histograms per stage, readable via :func:`stats`.
+
+The context variable is copied into the threadpool, so spans recorded
+inside sync endpoints reach the request. Spans outside a request still
+feed the histograms. With TIMING_ENABLED=false, ``span`` returns a shared
+no-op object and the middleware passes requests straight through.
+
+Environment
+-----------
+TIMING_ENABLED : bool
+    Collect spans at all (default true).
+TIMING_SERVER_HEADER : bool
+    Add the Server-Timing header (default true).
+TIMING_LOG : bool
+    Log one JSON line per request with its spans (default false).
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("app.timing")
+
+# Histogram bucket upper bounds in milliseconds.
+BUCKETS_MS: Tuple[float, ...] = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+def _flag(name: str, default: str) -> bool:
+    return (os.getenv(name, default) or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def enabled() -> bool:
+    """True when TIMING_ENABLED is on."""
+    return _flag("TIMING_ENABLED", "true")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative counts are derived on read)."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms", "_lock")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float) -> None:
+        idx = bisect.bisect_left(BUCKETS_MS, ms)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing quantile ``q`` (None when empty)."""
+        with self._lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            seen = 0
+            for idx, n in enumerate(self.counts):
+                seen += n
+                if seen >= target:
+                    return BUCKETS_MS[idx] if idx < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total, peak = self.count, self.total_ms, self.max_ms
+        return {
+            "count": count,
+            "avg_ms": round(total / count, 2) if count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(peak, 2),
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(name: str, ms: float) -> None:
+    """Record ``ms`` for stage ``name`` in the process-wide histograms."""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _histograms_lock:
+            hist = _histograms.setdefault(name, Histogram())
+    hist.observe(ms)
+
+
+class RequestTimings:
+    """
+    Spans recorded for one request, in first-seen order; repeats are summed.
+
+    SQL statements (see :mod:`app.utils.sql_stats`) add to the ``db`` span
+    and to ``queries``, which keeps the count and the slowest statements.
+    """
+
+    __slots__ = ("spans", "started", "queries")
+
+    def __init__(self) -> None:
+        self.spans: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.queries: Optional[Any] = None  # sql_stats.QueryStats, created on first statement
+
+    def add(self, name: str, ms: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def header_value(self, total_ms: float) -> str:
+        parts = [
+            f'{name};dur={ms:.1f};desc="{self.queries.count} queries"'
+            if name == "db" and self.queries is not None
+            else f"{name};dur={ms:.1f}"
+            for name, ms in self.spans.items()
+        ]
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current() -> Optional[RequestTimings]:
+    """The timing scope of the request being served, if any."""
+    return _current.get()
+
+
+class _NoopSpan:
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def _span(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        observe(name, ms)
+        current = _current.get()
+        if current is not None:
+            current.add(name, ms)
+
+
+def span(name: str):
+    """
+    Time the enclosed block as stage ``name``.
+
+    Examples
+    --------
+    >>> with span("prompt_build"):
+    ...     pass
+    """
+    if not enabled():
+        return _NOOP
+    return _span(name)
+
+
+def timed(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator form of :func:`span` for sync functions."""
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Return histogram summaries for every stage seen by this process."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {name: hist.snapshot() for name, hist in sorted(items)}
+
+
+def histograms() -> Dict[str, Histogram]:
+    """Return the live histogram objects (for exporters)."""
+    with _histograms_lock:
+        return dict(_histograms)
+
+
+def reset() -> None:
+    """Drop all histograms (tests)."""
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that opens a timing scope per HTTP request.
+
+    Implemented as raw ASGI rather than ``BaseHTTPMiddleware`` so that it
+    adds no task hop and does not buffer streaming responses.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        header = _flag("TIMING_SERVER_HEADER", "true")
+        status_code: List[int] = [0]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message.get("status", 0)
+                if header and timings.spans:
+                    total_ms = (time.perf_counter() - timings.started) * 1000
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"server-timing", timings.header_value(total_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            total_ms = (time.perf_counter() - timings.started) * 1000
+            if timings.spans and _flag("TIMING_LOG", "false"):
+                route = scope.get("route")
+                logger.info(
+                    "request timing %s",
+                    json.dumps(
+                        {
+                            "method": scope.get("method"),
+                            "path": getattr(route, "path", scope.get("path")),
+                            "status": status_code[0],
+                            "total_ms": round(total_ms, 1),
+                            "spans": {k: round(v, 1) for k, v in timings.spans.items()},
+                            **({"sql": timings.queries.summary()} if timings.queries is not None else {}),
+                        },
+                        separators=(",", ":"),
+                    ),
+                )
@@ -0,0 +1,280 @@
+"""Streaming helpers for admin file uploads.
+
+Uploaded files are spooled to a named temporary file in fixed-size chunks
+while a SHA-256 digest is computed on the fly. Extractors (PyMuPDF, pdfminer,
+python-docx, PyPDF2) then open the spooled path directly, so a document is
+never held in memory as a single ``bytes`` object and never copied twice.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    """
+    An upload persisted to a temporary file.
+
+    Attributes
+    ----------
+    filename : str
+        Client-supplied file name.
+    path : str
+        Filesystem path of the spooled copy.
+    size : int
+        Number of bytes written.
+    sha256 : str
+        Hex digest of the file content.
+    head : bytes
+        First bytes of the file, used for type sniffing.
+    """
+
+    filename: str
+    path: str
+    size: int
+    sha256: str
+    head: bytes
+
+    def looks_like_pdf(self) -> bool:
+        """Return True if the content starts with the PDF magic bytes."""
+        return self.head[:4] == b"%PDF"
+
+    def read_text(self, errors: str = "replace") -> str:
+        """
+        Decode the spooled file as UTF-8 text.
+
+        Parameters
+        ----------
+        errors : str
+            Codec error handling passed to ``open``.
+
+        Returns
+        -------
+        str
+            Decoded file content.
+        """
+        with open(self.path, "r", encoding="utf-8", errors=errors) as fh:
+            return fh.read()
+
+    def cleanup(self) -> None:
+        """Remove the temporary file, ignoring errors."""
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
+
+
+class _SpoolWriter:
+    """Write blocks to a temp file while tracking size, digest and header bytes."""
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        suffix = os.path.splitext(filename)[1][:16]
+        self._out: BinaryIO = tempfile.NamedTemporaryFile(prefix="pit-upload-", suffix=suffix, delete=False)
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._head = b""
+
+    def write(self, block: bytes) -> None:
+        if len(self._head) < 8:
+            self._head += block[: 8 - len(self._head)]
+        self._digest.update(block)
+        self._out.write(block)
+        self._size += len(block)
+
+    def finish(self) -> SpooledUpload:
+        self._out.close()
+        return SpooledUpload(
+            filename=self.filename,
+            path=self._out.name,
+            size=self._size,
+            sha256=self._digest.hexdigest(),
+            head=self._head,
+        )
+
+    def abort(self) -> None:
+        self._out.close()
+        try:
+            os.unlink(self._out.name)
+        except OSError:
+            pass
+
+
+def spool_file(src: BinaryIO, filename: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> SpooledUpload:
+    """
+    Copy a readable binary stream to a temporary file in fixed-size chunks.
+
+    Parameters
+    ----------
+    src : BinaryIO
+        Source stream, e.g. ``UploadFile.file``.
+    filename : str
+        Client-supplied file name.
+    chunk_size : int
+        Bytes read per iteration.
+
+    Returns
+    -------
+    SpooledUpload
+        Spooled file metadata; the caller is responsible for cleanup.
+    """
+    writer = _SpoolWriter(filename)
+    try:
+        while True:
+            block = src.read(chunk_size)
+            if not block:
+                break
+            writer.write(block)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.finish()
+
+
+async def spool_upload(up: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> SpooledUpload:
+    """
+    Async variant of :func:`spool_file` for ``UploadFile`` in async endpoints.
+
+    Parameters
+    ----------
+    up : fastapi.UploadFile
+        Incoming upload.
+    chunk_size : int
+        Bytes read per iteration.
+
+    Returns
+    -------
+    SpooledUpload
+        Spooled file metadata; the caller is responsible for cleanup.
+    """
+    writer = _SpoolWriter(up.filename or "uploaded")
+    try:
+        while True:
+            block = await up.read(chunk_size)
+            if not block:
+                break
+            writer.write(block)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.finish()
+
+
+def pdf_to_text(path: str) -> str:
+    """
+    Extract text from a PDF on disk via PyMuPDF, falling back to pdfminer.
+
+    Parameters
+    ----------
+    path : str
+        PDF file path.
+
+    Returns
+    -------
+    str
+        Extracted text, or an empty string if no extractor succeeds.
+    """
+    try:
+        import fitz
+
+        with fitz.open(path) as doc:
+            return "\n".join(p.get_text() for p in doc)
+    except Exception:
+        pass
+    try:
+        from pdfminer.high_level import extract_text
+
+        return extract_text(path)
+    except Exception:
+        return ""
+
+
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """
+    Yield PDF text one page at a time so long documents can be chunked incrementally.
+
+    Uses PyMuPDF when available; otherwise yields the whole pdfminer output once.
+
+    Parameters
+    ----------
+    path : str
+        PDF file path.
+
+    Yields
+    ------
+    str
+        Page text followed by a newline.
+    """
+    try:
+        import fitz
+
+        doc = fitz.open(path)
+    except Exception:
+        text = pdf_to_text(path)
+        if text:
+            yield text
+        return
+    with doc:
+        for page in doc:
+            yield page.get_text() + "\n"
+
+
+def docx_to_text(path: str) -> str:
+    """
+    Extract paragraph text from a .docx file on disk.
+
+    Parameters
+    ----------
+    path : str
+        Document file path.
+
+    Returns
+    -------
+    str
+        Newline-joined paragraphs, or an empty string on failure.
+    """
+    try:
+        from docx import Document
+
+        doc = Document(path)
+        return "\n".join(p.text for p in doc.paragraphs)
+    except Exception:
+        return ""
+
+
+def pypdf_to_text(path: str) -> Optional[str]:
+    """
+    Extract text with PyPDF2, returning None if the library or file fails.
+
+    Parameters
+    ----------
+    path : str
+        PDF file path.
+
+    Returns
+    -------
+    str | None
+        Pages joined by blank lines, or None on failure.
+    """
+    try:
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(path)
+        return "\n\n".join((p.extract_text() or "") for p in reader.pages)
+    except Exception:
+        return None
@@ -0,0 +1,221 @@
+"""
+Bulk embedding of FigureContext rows into the Chroma figure-context collection.
+
+Rows are loaded in one query, embedded in batches and upserted with the same
+ids (``{figure_slug}-{id}``) and metadata used by ``vector_ingest`` and read by
+``context_retriever``, so re-embedding a context replaces its vector instead
+of duplicating it. Every requested id gets a status in the returned report.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+EmbedTextsFn = Callable[[List[str]], List[List[float]]]
+
+
+@dataclass
+class EmbedResult:
+    """
+    Outcome for one context id.
+
+    Attributes
+    ----------
+    id : int
+        FigureContext id.
+    status : str
+        ``embedded``, ``skipped`` (empty content), ``missing`` or ``failed``.
+    error : str | None
+        Failure detail.
+    """
+
+    id: int
+    status: str
+    error: Optional[str] = None
+
+
+@dataclass
+class EmbedReport:
+    """
+    Summary of a bulk embedding run.
+
+    Attributes
+    ----------
+    results : list[EmbedResult]
+        Per-id outcomes in request order.
+    embed_ms : float
+        Time spent computing embeddings.
+    upsert_ms : float
+        Time spent writing to the vector store.
+    total_ms : float
+        Wall time of the whole run.
+    """
+
+    results: List[EmbedResult] = field(default_factory=list)
+    embed_ms: float = 0.0
+    upsert_ms: float = 0.0
+    total_ms: float = 0.0
+
+    def count(self, status: str) -> int:
+        """Return the number of results with the given status."""
+        return sum(1 for r in self.results if r.status == status)
+
+    @property
+    def failed(self) -> List[EmbedResult]:
+        """Results whose batch could not be embedded or stored."""
+        return [r for r in self.results if r.status == "failed"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return a JSON-serialisable summary for API responses."""
+        return {
+            "embedded": self.count("embedded"),
+            "skipped": self.count("skipped"),
+            "missing": self.count("missing"),
+            "failed": self.count("failed"),
+            "timing_ms": {
+                "embed": round(self.embed_ms, 1),
+                "upsert": round(self.upsert_ms, 1),
+                "total": round(self.total_ms, 1),
+            },
+            "results": [r.__dict__ for r in self.results],
+        }
+
+
+def _batch_size() -> int:
+    return max(1, int(os.getenv("RAG_EMBED_BATCH_SIZE", "64") or "64"))
+
+
+def vector_id(ctx: models.FigureContext) -> str:
+    """Return the Chroma document id for a context."""
+    return f"{ctx.figure_slug}-{ctx.id}"
+
+
+def context_metadata(ctx: models.FigureContext) -> Dict[str, Any]:
+    """
+    Build Chroma metadata for a context.
+
+    Chroma rejects ``None`` values, so unset fields are omitted.
+
+    Parameters
+    ----------
+    ctx : models.FigureContext
+        Context row.
+
+    Returns
+    -------
+    dict
+        Metadata with figure_slug, source and content-hash fields.
+    """
+    meta = {
+        "figure_slug": ctx.figure_slug,
+        "context_id": ctx.id,
+        "source_name": ctx.source_name,
+        "source_url": ctx.source_url,
+        "content_type": ctx.content_type,
+        "is_manual": bool(ctx.is_manual or 0),
+        "content_sha256": ctx.content_sha256,
+        "chunk_index": ctx.chunk_index,
+    }
+    return {k: v for k, v in meta.items() if v is not None}
+
+
+def embed_contexts(
+    db: Session,
+    ctx_ids: Sequence[int],
+    *,
+    embed_texts: Optional[EmbedTextsFn] = None,
+    collection: Any = None,
+    batch_size: Optional[int] = None,
+) -> EmbedReport:
+    """
+    Embed contexts by id and upsert them into the vector store.
+
+    A failing batch marks only its own ids as failed; later batches still run.
+
+    Parameters
+    ----------
+    db : sqlalchemy.orm.Session
+        Figures database session.
+    ctx_ids : Sequence[int]
+        Context ids to embed.
+    embed_texts : callable | None
+        ``(texts) -> vectors``; defaults to the configured embedding provider.
+    collection : Any
+        Chroma collection; defaults to the figure-context collection.
+    batch_size : int | None
+        Contexts per embedding call (default RAG_EMBED_BATCH_SIZE or 64).
+
+    Returns
+    -------
+    EmbedReport
+        Per-id status and timing.
+    """
+    started = time.perf_counter()
+    report = EmbedReport()
+    ids = list(dict.fromkeys(int(i) for i in ctx_ids))
+    if not ids:
+        return report
+    if embed_texts is None:
+        from app.vector.embedding_provider import get_embeddings
+
+        embed_texts = get_embeddings
+    if collection is None:
+        from app.vector.chroma_client import get_figure_context_collection
+
+        collection = get_figure_context_collection()
+
+    rows = {r.id: r for r in db.query(models.FigureContext).filter(models.FigureContext.id.in_(ids)).all()}
+    by_id: Dict[int, EmbedResult] = {}
+    pending: List[models.FigureContext] = []
+    for i in ids:
+        row = rows.get(i)
+        if row is None:
+            by_id[i] = EmbedResult(i, "missing")
+        elif not (row.content or "").strip():
+            by_id[i] = EmbedResult(i, "skipped")
+        else:
+            pending.append(row)
+
+    size = batch_size or _batch_size()
+    for start in range(0, len(pending), size):
+        batch = pending[start:start + size]
+        try:
+            t0 = time.perf_counter()
+            vectors = embed_texts([r.content for r in batch])
+            t1 = time.perf_counter()
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Embedding backend returned {len(vectors)} vectors for {len(batch)} texts")
+            collection.upsert(
+                ids=[vector_id(r) for r in batch],
+                documents=[r.content for r in batch],
+                embeddings=vectors,
+                metadatas=[context_metadata(r) for r in batch],
+            )
+            t2 = time.perf_counter()
+        except Exception as exc:
+            logger.warning("Embedding batch of %d contexts failed: %s", len(batch), exc)
+            for r in batch:
+                by_id[r.id] = EmbedResult(r.id, "failed", str(exc)[:500])
+            continue
+        report.embed_ms += (t1 - t0) * 1000
+        report.upsert_ms += (t2 - t1) * 1000
+        for r in batch:
+            by_id[r.id] = EmbedResult(r.id, "embedded")
+
+    report.results = [by_id[i] for i in ids]
+    report.total_ms = (time.perf_counter() - started) * 1000
+    logger.info(
+        "Embedded %d/%d contexts (failed=%d) in %.0f ms",
+        report.count("embedded"), len(ids), report.count("failed"), report.total_ms,
+    )
+    return report
@@ -10,6 +10,7 @@ from __future__ import annotations
 from typing import Dict, List
 
 from app.vector.chroma_client import get_figure_context_collection
+from app.utils.timing import span
 from app.vector.embedding_provider import get_embedding
 
 
@@ -32,12 +33,14 @@ def search_figure_context(query: str, figure_slug: str, top_k: int = 5) -> List[
         Relevant documents with their content and metadata.
     """
     collection = get_figure_context_collection()
-    query_embedding = get_embedding(query)
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        where={"figure_slug": figure_slug},
-        n_results=top_k,
-    )
+    with span("embed_query"):
+        query_embedding = get_embedding(query)
+    with span("chroma_query"):
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            where={"figure_slug": figure_slug},
+            n_results=top_k,
+        )
     documents = results.get("documents", [[]])[0]
     metadatas = results.get("metadatas", [[]])[0]
     # Flatten metadata so downstream compaction sees source_name/source_url/etc.
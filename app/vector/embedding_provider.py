@@ -39,3 +39,13 @@ def get_embedding(text: str) -> List[float]:
         # Defensive fallback: return zero-vector
         return [0.0] * 1536
     return _embedding_client.get_embedding(text)
+
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of texts; raises if the embedding backend is unavailable."""
+    global _embedding_client
+    if _embedding_client is None:
+        _init()
+    if _embedding_client is None:
+        raise RuntimeError("Embedding client could not be initialised")
+    return _embedding_client.get_embeddings(texts)
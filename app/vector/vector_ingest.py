@@ -10,40 +10,26 @@ sys.path.insert(0, project_root)
 
 from app.models import FigureContext
 from app.figures_database import FigureSessionLocal
-from app.vector.chroma_client import get_figure_context_collection
-from app.vector.embedding_provider import get_embedding
+from app.vector.context_embedder import embed_contexts
 
 
 def ingest_all_context_chunks():
     """
     Embeds all FigureContext entries from the database and stores them in Chroma,
     associating each embedding with the correct figure_slug.
+
+    Vectors are upserted in batches, so re-running the script refreshes
+    existing entries instead of failing on duplicate ids.
     """
     session = FigureSessionLocal()
-    collection = get_figure_context_collection()
-    count = 0
 
     try:
-        contexts = session.query(FigureContext).all()
-        for ctx in contexts:
-            if ctx.content:
-                embedding = get_embedding(ctx.content)
-                # enrich metadata so admin UI and prompts can show source details
-                meta = {
-                    "figure_slug": ctx.figure_slug,
-                    "source_name": getattr(ctx, "source_name", None),
-                    "source_url": getattr(ctx, "source_url", None),
-                    "content_type": getattr(ctx, "content_type", None),
-                    "is_manual": bool(getattr(ctx, "is_manual", 0)),
-                }
-                collection.add(
-                    documents=[ctx.content],
-                    embeddings=[embedding],
-                    metadatas=[meta],
-                    ids=[f"{ctx.figure_slug}-{ctx.id}"]
-                )
-                count += 1
-        print(f"✅ Ingested {count} context chunks into Chroma.")
+        ids = [row.id for row in session.query(FigureContext.id).all()]
+        report = embed_contexts(session, ids)
+        print(
+            f"✅ Ingested {report.count('embedded')} context chunks into Chroma "
+            f"({report.count('failed')} failed, {report.total_ms / 1000:.1f}s)."
+        )
     finally:
         session.close()
 
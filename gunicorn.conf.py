@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for production (``gunicorn -c gunicorn.conf.py app.main:app``).
+
+Command-line flags still override anything set here. The hooks keep
+``/metrics`` correct across workers:
+
+- ``on_starting`` gives each deployment an empty METRICS_MULTIPROC_DIR,
+  which forked workers inherit;
+- ``child_exit`` marks an exited worker's snapshot dead, so its gauges stop
+  counting while its counters are kept.
+"""
+
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def on_starting(server):
+    directory = os.getenv("METRICS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "pit_metrics")
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    os.environ["METRICS_MULTIPROC_DIR"] = directory
+    server.log.info("Metrics snapshots in %s", directory)
+
+
+def child_exit(server, worker):
+    from app.utils.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -0,0 +1,102 @@
+"""Count SQL statements and commits per POST /ask.
+
+Usage:
+  python scripts/bench_ask_statements.py [--requests 20] [--use-env-db]
+
+Runs the app in-process with a TestClient and a canned LLM answer, so no
+provider key or running server is needed. Each chat.db commit is one
+journal sync (fsync) in SQLite's default journal modes, so the commit count
+is a stand-in for fsyncs per request.
+
+By default CHAT_DB_PATH / FIGURES_DB_PATH point at a temporary directory
+(with a copy of data_seed/figures.db) that is removed afterwards, since the
+script registers a throwaway user and writes threads. Pass --use-env-db to
+run against the databases the environment points at instead.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+
+def _use_scratch_dbs(tmp: str) -> None:
+    # Must run before anything imports app.database / app.figures_database
+    os.environ["CHAT_DB_PATH"] = os.path.join(tmp, "chat.db")
+    os.environ["FIGURES_DB_PATH"] = os.path.join(tmp, "figures.db")
+    seed = os.path.join(REPO_ROOT, "data_seed", "figures.db")
+    if os.path.exists(seed):
+        shutil.copyfile(seed, os.environ["FIGURES_DB_PATH"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--figure", default="alexander-the-great")
+    parser.add_argument("--use-env-db", action="store_true", help="use CHAT_DB_PATH / FIGURES_DB_PATH as set (writes to them)")
+    args = parser.parse_args()
+
+    if args.use_env_db:
+        return _bench(args)
+    with tempfile.TemporaryDirectory(prefix="bench_ask_") as tmp:
+        _use_scratch_dbs(tmp)
+        return _bench(args)
+
+
+def _bench(args: argparse.Namespace) -> int:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import app.routers.ask as ask_module
+    from app.database import engine
+    from app.main import app
+
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    ask_module.generate_answer = lambda context, prompt, **_: ("Benchmark answer", {"total_tokens": 0})
+
+    counts: Counter = Counter()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        counts[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    @event.listens_for(engine, "commit")
+    def _count_commit(conn):
+        counts["COMMIT"] += 1
+
+    client = TestClient(app)
+    reg = client.post("/register", json={"username": f"bench_{uuid.uuid4().hex[:8]}@example.com", "password": "Bench!Pass1"})
+    if reg.status_code != 200:
+        print("register failed:", reg.status_code, reg.text)
+        return 2
+    user_id = reg.json()["user_id"]
+    headers = {"Authorization": f"Bearer {reg.json()['access_token']}"}
+
+    thread_id = None
+    counts.clear()
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        payload = {"user_id": user_id, "thread_id": thread_id, "figure_slug": args.figure, "message": "Who are you?"}
+        r = client.post("/ask", json=payload, headers=headers)
+        if r.status_code != 200:
+            print("ask failed:", r.status_code, r.text)
+            return 2
+        thread_id = r.json()["thread_id"]
+    elapsed = time.perf_counter() - started
+
+    n = args.requests
+    print(f"{n} requests in {elapsed * 1000:.1f} ms ({elapsed * 1000 / n:.2f} ms/request)")
+    for kind, total in sorted(counts.items()):
+        print(f"  {kind:<8} {total:>6}  ({total / n:.2f}/request)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,290 @@
+"""Local stand-in for the OpenAI / OpenRouter HTTP API, for load tests.
+
+Usage:
+  python scripts/fake_llm_server.py [--port 8900] [--latency lognormal:600,0.4]
+      [--token-ms 15] [--completion-tokens 80-200] [--error-rate 0.02]
+      [--error-codes 429,500,503] [--hang-rate 0] [--seed 1]
+
+Serves, under any prefix (``/v1``, ``/api/v1``, ...):
+  POST .../chat/completions   canned completion with a ``usage`` block;
+                              ``"stream": true`` returns SSE chunks, one per token
+  POST .../embeddings         deterministic embeddings (see ``fake_embedding``)
+  GET  .../models, /health    liveness
+
+Point the app at it with OPENAI_API_BASE=http://127.0.0.1:8900/v1 for chat
+and OPENAI_BASE_URL=http://127.0.0.1:8900/v1 for the OpenAI SDK embedder.
+Any non-empty API key is accepted.
+
+Latency specs (milliseconds, time to first token):
+  fixed:MS  uniform:LO,HI  normal:MEAN,SD  lognormal:MEDIAN,SIGMA
+Each completion token then adds --token-ms. Answers, token counts and
+embeddings depend only on the request and --seed. Latency and error draws
+come from a seeded RNG, so a run's sequence is reproducible.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_WORDS = (
+    "the empire river marched across long winter council senate letters battle city walls harvest "
+    "temple law reform army siege treaty voyage coast old friends history remembers my father taught "
+    "me courage patience and the sea was calm that morning when we reached the northern gate"
+).split()
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fake_embedding(text: str, dim: int = 1536) -> List[float]:
+    """
+    Deterministic unit vector for ``text`` (feature hashing of lowercase words).
+
+    Texts sharing words get similar vectors, so nearest-neighbour queries
+    behave plausibly without a model. Empty text returns zeros.
+    """
+    vec = [0.0] * dim
+    for word in _TOKEN_RE.findall((text or "").lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        idx = int.from_bytes(digest[:4], "little") % dim
+        vec[idx] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec] if norm else vec
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Return a sampler of milliseconds for a ``kind:args`` spec."""
+    kind, _, raw = spec.partition(":")
+    args = [float(a) for a in raw.split(",") if a.strip()] if raw else []
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal" and len(args) == 2:
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal" and len(args) == 2:
+        return lambda rng: rng.lognormvariate(math.log(max(args[0], 1e-3)), args[1])
+    raise ValueError(f"Bad latency spec {spec!r}")
+
+
+def _token_range(spec: str) -> Tuple[int, int]:
+    lo, _, hi = spec.partition("-")
+    return int(lo), int(hi or lo)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeProvider:
+    """Request-independent knobs plus the seeded RNG shared by handler threads."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.latency = parse_latency(args.latency)
+        self.token_s = args.token_ms / 1000.0
+        self.tokens = _token_range(args.completion_tokens)
+        self.error_rate = args.error_rate
+        self.error_codes = [int(c) for c in args.error_codes.split(",") if c.strip()]
+        self.hang_rate = args.hang_rate
+        self.hang_s = args.hang_seconds
+        self.embedding_ms = args.embedding_ms
+        self.embedding_dim = args.embedding_dim
+        self.seed = args.seed
+        self._rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"chat": 0, "embeddings": 0, "errors": 0, "hangs": 0}
+
+    def draw(self) -> Tuple[float, Optional[int], bool]:
+        """Return (ttft seconds, injected status or None, hang)."""
+        with self._lock:
+            ttft = self.latency(self._rng) / 1000.0
+            roll = self._rng.random()
+            code = self._rng.choice(self.error_codes) if self.error_codes else 500
+        if roll < self.hang_rate:
+            return ttft, None, True
+        if roll < self.hang_rate + self.error_rate:
+            return ttft, code, False
+        return ttft, None, False
+
+    def answer(self, messages: List[Dict[str, Any]]) -> List[str]:
+        last = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        digest = hashlib.sha256(f"{self.seed}|{last}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+        lo, hi = self.tokens
+        return [rng.choice(_WORDS) for _ in range(rng.randint(lo, hi))]
+
+    def bump(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    provider: FakeProvider
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt: str, *args: Any) -> None:  # quiet by default
+        pass
+
+    def _json(self, code: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return {}
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith(("/models", "/health")):
+            self._json(200, {"status": "ok", "object": "list", "data": [{"id": "fake-model", "object": "model"}], "counts": self.provider.counts})
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if not (self.headers.get("Authorization") or "").strip():
+            self._json(401, {"error": {"message": "missing api key", "type": "invalid_request_error"}})
+            return
+        payload = self._read_json()
+        if path.endswith("/chat/completions"):
+            self._chat(payload)
+        elif path.endswith("/embeddings"):
+            self._embeddings(payload)
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def _chat(self, payload: Dict[str, Any]) -> None:
+        p = self.provider
+        p.bump("chat")
+        ttft, error, hang = p.draw()
+        time.sleep(ttft)
+        if hang:
+            p.bump("hangs")
+            time.sleep(p.hang_s)
+        if error is not None:
+            p.bump("errors")
+            headers = {"Retry-After": "1"} if error == 429 else None
+            self._json(error, {"error": {"message": f"injected {error}", "type": "fake_error"}}, headers)
+            return
+        messages = payload.get("messages") or []
+        words = p.answer(messages)
+        max_tokens = payload.get("max_tokens")
+        if isinstance(max_tokens, int) and max_tokens > 0:
+            words = words[:max_tokens]
+        model = payload.get("model") or "fake-model"
+        usage = {
+            "prompt_tokens": sum(_approx_tokens(str(m.get("content") or "")) for m in messages),
+            "completion_tokens": len(words),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = "chatcmpl-fake-" + hashlib.sha1(" ".join(words).encode()).hexdigest()[:12]
+        if payload.get("stream"):
+            self._stream(completion_id, model, words, usage)
+            return
+        time.sleep(p.token_s * len(words))
+        self._json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, completion_id: str, model: str, words: List[str], usage: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> None:
+            event = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            event.update(extra or {})
+            self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                time.sleep(self.provider.token_s)
+                chunk({"content": word if i == 0 else " " + word})
+            chunk({}, finish="stop", extra={"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _embeddings(self, payload: Dict[str, Any]) -> None:
+        p = self.provider
+        p.bump("embeddings")
+        inputs = payload.get("input")
+        texts = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        dim = int(payload.get("dimensions") or p.embedding_dim)
+        time.sleep(p.embedding_ms / 1000.0)
+        data = [{"object": "embedding", "index": i, "embedding": fake_embedding(str(t), dim)} for i, t in enumerate(texts)]
+        tokens = sum(_approx_tokens(str(t)) for t in texts)
+        self._json(200, {"object": "list", "data": data, "model": payload.get("model") or "fake-embedding",
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:600,0.4", help="time-to-first-token distribution (ms)")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="delay per completion token")
+    parser.add_argument("--completion-tokens", default="80-200", help="N or LO-HI completion tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of chat calls failing with --error-codes")
+    parser.add_argument("--error-codes", default="429,500,503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of chat calls that stall for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=35.0)
+    parser.add_argument("--embedding-ms", type=float, default=20.0)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser
+
+
+def make_server(args: argparse.Namespace) -> ThreadingHTTPServer:
+    handler = type("FakeHandler", (Handler,), {"provider": FakeProvider(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    server = make_server(args)
+    print(f"fake LLM listening on http://{args.host}:{server.server_address[1]}/v1 (latency={args.latency}, "
+          f"token_ms={args.token_ms}, error_rate={args.error_rate}, hang_rate={args.hang_rate})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
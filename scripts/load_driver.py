@@ -0,0 +1,363 @@
+"""Open-loop load driver with a JSON latency/throughput report.
+
+Usage:
+  python scripts/load_driver.py --base-url http://127.0.0.1:8000 --rps 20 --duration 60
+      [--mix figures=20,figure=25,guest_start=10,guest_ask=20,ask=15,threads=10]
+      [--warmup 10] [--users 20] [--out results.json] [--baseline old.json --fail-on-regression 10]
+
+Replays a weighted mix of the main traffic types:
+  figures      GET  /figures/
+  figure       GET  /figures/{slug}
+  guest_start  POST /guest/start/{slug}
+  guest_ask    POST /guest/ask (with a started session; new ones are started as quota runs out)
+  ask          POST /ask (registered users, one thread per user and figure)
+  threads      GET  /threads/user/{id}
+
+Arrivals are scheduled at a fixed rate (or Poisson with --poisson) no matter
+how fast the server answers. Each latency is measured from the scheduled
+send time, so queueing in the client or server is not hidden (no
+coordinated omission). Arrivals beyond --max-in-flight are counted as
+dropped instead of queued.
+
+Run the server against scripts/fake_llm_server.py for offline, repeatable
+numbers, with RATE_LIMIT_ENABLED=false unless the limiter is under test.
+--in-process drives app.main:app through httpx's ASGI transport, so no
+server is needed. Client and app then share one event loop, so use it
+to compare runs with each other, not to measure absolute capacity.
+The report is printed (or written to --out) as JSON. With --baseline, it
+adds per-operation deltas. With --fail-on-regression PCT, the exit status
+is 1 when any operation's p95 grows by more than PCT percent.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+DEFAULT_MIX = "figures=20,figure=25,guest_start=10,guest_ask=20,ask=15,threads=10"
+QUESTIONS = [
+    "Where were you born?",
+    "What was your greatest achievement?",
+    "Who were your closest allies?",
+    "What did you think of your rivals?",
+    "How did people remember you after your death?",
+    "What was daily life like in your time?",
+    "Which decision do you regret most?",
+    "What advice would you give a young leader today?",
+]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return round(sorted_values[min(rank, len(sorted_values)) - 1], 2)
+
+
+def _guest_cookie(resp: httpx.Response) -> Optional[str]:
+    # The cookie is Secure, so an http:// cookie jar would drop it; read the header directly.
+    for header in resp.headers.get_list("set-cookie"):
+        name, _, rest = header.partition("=")
+        if name.strip() == "guest_session":
+            return rest.split(";", 1)[0]
+    return None
+
+
+class LoadState:
+    """Users, figure slugs and guest sessions shared by all requests of a run."""
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.slugs: List[str] = []
+        self.users: List[Dict[str, Any]] = []
+        self.guests: List[Dict[str, Any]] = []
+
+    def slug(self) -> str:
+        return self.rng.choice(self.slugs)
+
+
+async def op_figures(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await client.get("/figures/", params={"limit": 100})
+
+
+async def op_figure(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await client.get(f"/figures/{state.slug()}")
+
+
+async def _start_guest(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    slug = state.slug()
+    resp = await client.post(f"/guest/start/{slug}")
+    token = _guest_cookie(resp)
+    if resp.status_code == 200 and token:
+        state.guests.append({"token": token, "remaining": resp.json().get("max_questions", 3)})
+        del state.guests[:-200]
+    return resp
+
+
+async def op_guest_start(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await _start_guest(client, state)
+
+
+async def op_guest_ask(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    guest = next((g for g in state.guests if g["remaining"] > 0), None)
+    if guest is None:
+        resp = await _start_guest(client, state)
+        if resp.status_code != 200 or not state.guests:
+            return resp
+        guest = state.guests[-1]
+    guest["remaining"] -= 1
+    return await client.post(
+        "/guest/ask",
+        json={"message": state.rng.choice(QUESTIONS)},
+        headers={"Cookie": f"guest_session={guest['token']}"},
+    )
+
+
+async def op_ask(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    user = state.rng.choice(state.users)
+    slug = state.slug()
+    payload = {"user_id": user["id"], "thread_id": user["threads"].get(slug), "figure_slug": slug,
+               "message": state.rng.choice(QUESTIONS)}
+    resp = await client.post("/ask", json=payload, headers=user["headers"])
+    if resp.status_code == 200:
+        user["threads"][slug] = resp.json().get("thread_id")
+    return resp
+
+
+async def op_threads(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    user = state.rng.choice(state.users)
+    return await client.get(f"/threads/user/{user['id']}", headers=user["headers"])
+
+
+OPERATIONS = {
+    "figures": op_figures,
+    "figure": op_figure,
+    "guest_start": op_guest_start,
+    "guest_ask": op_guest_ask,
+    "ask": op_ask,
+    "threads": op_threads,
+}
+
+
+async def setup(client: httpx.AsyncClient, state: LoadState, users: int, slugs: Optional[str]) -> None:
+    if slugs:
+        state.slugs = [s.strip() for s in slugs.split(",") if s.strip()]
+    else:
+        resp = await client.get("/figures/", params={"limit": 500})
+        resp.raise_for_status()
+        state.slugs = [f["slug"] for f in resp.json()]
+    if not state.slugs:
+        raise SystemExit("no figures available to target")
+    run = uuid.uuid4().hex[:8]
+    for i in range(users):
+        resp = await client.post("/register", json={"username": f"load_{run}_{i}@example.com", "password": "Load!Pass1"})
+        resp.raise_for_status()
+        body = resp.json()
+        state.users.append({"id": body["user_id"], "headers": {"Authorization": f"Bearer {body['access_token']}"}, "threads": {}})
+
+
+async def run_phase(client: httpx.AsyncClient, state: LoadState, args: argparse.Namespace, duration: float,
+                    record: bool) -> Dict[str, Any]:
+    names = list(args.mix_weights)
+    weights = [args.mix_weights[n] for n in names]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    dropped: Counter = Counter()
+    in_flight = 0
+    tasks: List[asyncio.Task] = []
+    loop = asyncio.get_running_loop()
+
+    async def fire(op: str, scheduled: float) -> None:
+        nonlocal in_flight
+        try:
+            resp = await OPERATIONS[op](client, state)
+            status = str(resp.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as exc:
+            status = type(exc).__name__
+        finally:
+            in_flight -= 1
+        if record:
+            latencies[op].append((loop.time() - scheduled) * 1000)
+            statuses[op][status] += 1
+
+    started = loop.time()
+    next_at, sent = started, 0
+    while True:
+        next_at = next_at + state.rng.expovariate(args.rps) if args.poisson else started + sent / args.rps
+        if next_at - started >= duration:
+            break
+        delay = next_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent += 1
+        op = state.rng.choices(names, weights)[0]
+        if in_flight >= args.max_in_flight:
+            dropped[op] += 1
+            continue
+        in_flight += 1
+        tasks.append(asyncio.create_task(fire(op, next_at)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+    return {"latencies": latencies, "statuses": statuses, "dropped": dropped, "sent": sent, "elapsed": elapsed}
+
+
+def summarise(phase: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    ops: Dict[str, Any] = {}
+    all_latencies: List[float] = []
+    total_ok = total_err = 0
+    for op in sorted(set(phase["statuses"]) | set(phase["dropped"])):
+        values = sorted(phase["latencies"].get(op, []))
+        all_latencies.extend(values)
+        codes = phase["statuses"].get(op, Counter())
+        ok = sum(n for code, n in codes.items() if code.isdigit() and int(code) < 400)
+        done = sum(codes.values())
+        total_ok += ok
+        total_err += done - ok
+        ops[op] = {
+            "count": done,
+            "ok": ok,
+            "errors": done - ok,
+            "error_rate": round((done - ok) / done, 4) if done else 0.0,
+            "dropped": phase["dropped"].get(op, 0),
+            "status": dict(sorted(codes.items())),
+            "latency_ms": {
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+                "max": round(values[-1], 2) if values else None,
+                "mean": round(sum(values) / len(values), 2) if values else None,
+            },
+        }
+    all_latencies.sort()
+    elapsed = phase["elapsed"] or 1.0
+    done = total_ok + total_err
+    return {
+        "config": {
+            "base_url": "in-process" if args.in_process else args.base_url, "rps": args.rps, "duration_s": args.duration, "warmup_s": args.warmup,
+            "mix": args.mix_weights, "poisson": args.poisson, "users": args.users, "max_in_flight": args.max_in_flight,
+            "seed": args.seed,
+        },
+        "overall": {
+            "sent": phase["sent"],
+            "completed": done,
+            "dropped": sum(phase["dropped"].values()),
+            "offered_rps": round(phase["sent"] / elapsed, 2),
+            "throughput_rps": round(total_ok / elapsed, 2),
+            "error_rate": round(total_err / done, 4) if done else 0.0,
+            "latency_ms": {
+                "p50": percentile(all_latencies, 0.50),
+                "p95": percentile(all_latencies, 0.95),
+                "p99": percentile(all_latencies, 0.99),
+            },
+        },
+        "operations": ops,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Percent change of p50/p95/p99 and absolute change of error rate per operation."""
+    out: Dict[str, Any] = {}
+    sections = dict(report["operations"], overall=report["overall"])
+    base_sections = dict(baseline.get("operations", {}), overall=baseline.get("overall", {}))
+    for name, cur in sections.items():
+        base = base_sections.get(name)
+        if not base:
+            continue
+        delta: Dict[str, Any] = {}
+        for q in ("p50", "p95", "p99"):
+            new, old = cur["latency_ms"].get(q), (base.get("latency_ms") or {}).get(q)
+            delta[f"{q}_pct"] = round((new - old) / old * 100, 1) if new is not None and old else None
+        delta["error_rate_delta"] = round(cur.get("error_rate", 0.0) - base.get("error_rate", 0.0), 4)
+        out[name] = delta
+    return out
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    state = LoadState(random.Random(args.seed))
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    transport = None
+    if args.in_process:
+        from app.main import app
+
+        # Unhandled app errors become 500s, as they would behind a real server.
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits, transport=transport) as client:
+        await setup(client, state, args.users, args.slugs)
+        if args.warmup > 0:
+            await run_phase(client, state, args, args.warmup, record=False)
+        phase = await run_phase(client, state, args, args.duration, record=True)
+    return summarise(phase, args)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=10.0, help="target arrivals per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated op=weight")
+    parser.add_argument("--users", type=int, default=10, help="registered users for /ask and /threads")
+    parser.add_argument("--slugs", default=None, help="comma-separated figure slugs (default: all from /figures/)")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--in-process", action="store_true", help="drive app.main:app via ASGI instead of --base-url")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of fixed")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    parser.add_argument("--fail-on-regression", type=float, default=None, metavar="PCT",
+                        help="exit 1 if any p95 grows by more than PCT percent vs --baseline")
+    args = parser.parse_args(argv)
+    args.mix_weights = parse_mix(args.mix)
+
+    report = asyncio.run(main_async(args))
+    report["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+        if args.fail_on_regression is not None:
+            worst = [n for n, d in report["comparison"].items() if (d.get("p95_pct") or 0) > args.fail_on_regression]
+            if worst:
+                print(f"p95 regression over {args.fail_on_regression}%: {', '.join(sorted(worst))}", file=sys.stderr)
+                status = 1
+    text = json.dumps(report, indent=2, sort_keys=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        o = report["overall"]
+        print(f"wrote {args.out}: {o['completed']} requests, {o['throughput_rps']} ok/s, "
+              f"p95 {o['latency_ms']['p95']} ms, errors {o['error_rate']:.2%}", file=sys.stderr)
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -89,18 +89,53 @@ drop.addEventListener('drop', (e)=>{
   filesToUpload = Array.from(e.dataTransfer.files || []);
 });
 
+const JOB_TERMINAL = ['done', 'partial', 'failed', 'cancelled'];
+
+function renderJob(j){
+  const prog = document.getElementById('progress');
+  const txt = document.getElementById('progressText');
+  const total = j.total || 0; const done = j.done || 0;
+  if (total) prog.max = total; prog.value = done;
+  txt.textContent = `${done}/${total} ${j.status||''}${j.failed ? ` (${j.failed} failed)` : ''}`;
+}
+
+// Reads the SSE stream through authFetch (EventSource cannot send the admin token)
+async function streamJob(job_id){
+  const res = await authFetch(`/admin/rag/upload-jobs/${job_id}/events`);
+  if (!res.ok || !res.body) return false;
+  const reader = res.body.getReader();
+  const dec = new TextDecoder();
+  let buf = '';
+  while(true){
+    const {value, done} = await reader.read();
+    if (done) return false;
+    buf += dec.decode(value, {stream: true});
+    let i;
+    while((i = buf.indexOf('\n\n')) >= 0){
+      const block = buf.slice(0, i); buf = buf.slice(i + 2);
+      let evt = 'message', data = '';
+      block.split('\n').forEach(l=>{
+        if (l.startsWith('event:')) evt = l.slice(6).trim();
+        else if (l.startsWith('data:')) data += l.slice(5).trim();
+      });
+      if (data && (evt === 'progress' || evt === 'end')) { try{ renderJob(JSON.parse(data)); }catch(_){} }
+      if (evt === 'end'){ reader.cancel(); return true; }
+    }
+  }
+}
+
 async function pollJob(job_id){
   const wrap = document.getElementById('progressWrap');
   wrap.classList.remove('hidden');
-  const prog = document.getElementById('progress');
-  const txt = document.getElementById('progressText');
+  try{
+    if (await streamJob(job_id)) return loadAndRender();
+  }catch(_){}
   while(true){
-    const r = await fetch(`/admin/rag/upload-jobs/${job_id}`);
+    const r = await authFetch(`/admin/rag/upload-jobs/${job_id}`);
     if (!r.ok) break;
     const j = await r.json();
-    const total = j.total || 0; const done = j.done || 0;
-    if (total) prog.max = total; prog.value = done; txt.textContent = `${done}/${total} ${j.status||''}`;
-    if (j.status === 'done') break;
+    renderJob(j);
+    if (JOB_TERMINAL.includes(j.status)) break;
     await new Promise(res=>setTimeout(res, 1000));
   }
   await loadAndRender();
@@ -130,6 +165,8 @@ document.getElementById('embedAll').addEventListener('click', async ()=>{
   try{ 
     const r = await authFetch(`/admin/rag/figure/${slug}/embed-all`, {method:'POST'}); 
     if(!r.ok) throw new Error(await r.text());
+    const data = await r.json();
+    if(data.failed) alert(`Embedded ${data.embedded}, failed ${data.failed}`);
     loadAndRender(); 
   }catch(e){ alert(e.message||e); }
 });
@@ -0,0 +1,108 @@
+"""
+Opt-in micro-benchmarks for hot paths (pytest-benchmark).
+
+Skipped unless RUN_BENCHMARKS=1, so the regular suite stays fast. Data
+sizes default to production-like volumes. BENCH_SCALE multiplies all of
+them, e.g. 0.05 for a quick CI smoke run.
+
+Results are stored under ``.benchmarks/<machine>/``:
+
+- ``make bench-baseline`` saves a run named ``baseline`` (on the target branch);
+- ``make bench`` autosaves a numbered run;
+- ``make bench-ci`` compares against the baseline. It fails when any median
+  is more than BENCH_FAIL (default 15%) slower.
+
+Baselines only compare fairly on the same machine type. In CI, build one on
+the main branch and restore ``.benchmarks`` from cache before ``bench-ci``.
+"""
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+_ENABLED = (os.getenv("RUN_BENCHMARKS") or "").lower() in {"1", "true", "yes"}
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    _ENABLED = False
+
+if not _ENABLED:
+    collect_ignore_glob = ["test_*.py"]
+
+
+def pytest_report_header(config):
+    if not _ENABLED:
+        return "benchmarks: skipped (set RUN_BENCHMARKS=1 and install pytest-benchmark)"
+    return f"benchmarks: enabled, BENCH_SCALE={scale()}"
+
+
+def scale() -> float:
+    return float(os.getenv("BENCH_SCALE", "1") or 1)
+
+
+def scaled(n: int, minimum: int = 1) -> int:
+    """Scale a default data size by BENCH_SCALE."""
+    return max(minimum, int(n * scale()))
+
+
+WORDS = (
+    "empire river legion senate harbour temple treaty siege frontier harvest council letters "
+    "voyage fortress emperor queen reform coinage aqueduct chronicle pilgrimage monastery"
+).split()
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+@pytest.fixture(scope="session")
+def chat_db(tmp_path_factory) -> Dict[str, object]:
+    """
+    A chat database seeded with many messages.
+
+    One "heavy" user owns 200 threads. One "long" thread holds 5% of all
+    messages. The rest are spread over background users and threads.
+    """
+    from app.database import Base
+    from app.utils.migrations import migrate_guest_tables
+
+    path = Path(tmp_path_factory.mktemp("bench")) / "chat.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    migrate_guest_tables(engine)
+
+    rows = scaled(2_000_000, 10_000)
+    threads = max(300, rows // 50)
+    rng = random.Random(7)
+    base = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO users (id, username, hashed_password, role) VALUES (?, ?, 'x', 'user')",
+        [(i, f"bench{i}@example.com") for i in range(1, 101)],
+    )
+    # Thread 1 is the long thread; threads 1..200 belong to user 1 (the heavy user).
+    conn.executemany(
+        "INSERT INTO threads (id, user_id, title, figure_slug, created_at) VALUES (?, ?, ?, 'bench-figure', ?)",
+        [(t, 1 if t <= 200 else 2 + t % 99, f"Thread {t}", (base + timedelta(minutes=t)).isoformat(" ")) for t in range(1, threads + 1)],
+    )
+    long_share = rows // 20
+
+    def chats():
+        for i in range(rows):
+            thread = 1 if i < long_share else rng.randint(2, threads)
+            user = 1 if thread <= 200 else 2 + thread % 99
+            yield (user, "user" if i % 2 == 0 else "assistant", sentence(rng), thread, (base + timedelta(seconds=i)).isoformat(" "))
+
+    conn.executemany("INSERT INTO chats (user_id, role, message, thread_id, timestamp) VALUES (?, ?, ?, ?, ?)", chats())
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return {"engine": engine, "Session": sessionmaker(bind=engine, autoflush=False), "rows": rows, "long_thread": 1, "heavy_user": 1}
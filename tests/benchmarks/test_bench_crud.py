@@ -0,0 +1,29 @@
+"""
+Benchmarks: chat history reads on a seeded multi-million-row chat database.
+"""
+from types import SimpleNamespace
+
+from app import crud
+from app.main import list_threads
+
+
+def test_get_messages_by_thread_long_thread(benchmark, chat_db) -> None:
+    Session = chat_db["Session"]
+
+    def run():
+        with Session() as db:
+            return crud.get_messages_by_thread(db, chat_db["long_thread"], limit=50)
+
+    assert len(benchmark(run)) == 50
+
+
+def test_list_threads_heavy_user(benchmark, chat_db) -> None:
+    Session = chat_db["Session"]
+    user = SimpleNamespace(id=chat_db["heavy_user"])
+
+    def run():
+        with Session() as db:
+            return list_threads(chat_db["heavy_user"], db=db, current_user=user)
+
+    out = benchmark.pedantic(run, rounds=5, iterations=1)
+    assert len(out) == 200
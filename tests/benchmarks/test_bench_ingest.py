@@ -0,0 +1,43 @@
+"""
+Benchmarks: CSV upsert of the figure catalogue.
+"""
+import csv
+import json
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.figures_database import FigureBase
+from app.ingest.figures_csv import upsert_figures_from_csv
+
+from .conftest import scaled, sentence
+
+
+def test_upsert_figures_from_csv_insert(benchmark, tmp_path) -> None:
+    rows = scaled(50_000, 500)
+    rng = random.Random(5)
+    path = tmp_path / "figures.csv"
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "slug", "main_site", "era", "roles", "short_summary", "long_bio", "birth_year", "death_year"])
+        for i in range(rows):
+            writer.writerow([
+                f"Figure {i}", f"figure-{i}", "Bench Site", "Bench Era", json.dumps(["ruler"]),
+                sentence(rng), " ".join(sentence(rng) for _ in range(10)), 1000 + i % 900, 1050 + i % 900,
+            ])
+    counter = iter(range(1_000_000))
+
+    def setup():
+        engine = create_engine(f"sqlite:///{tmp_path / f'fig{next(counter)}.db'}")
+        FigureBase.metadata.create_all(bind=engine)
+        return (sessionmaker(bind=engine)(), path, {}), {}
+
+    def run(db, csv_path, header_map):
+        try:
+            return upsert_figures_from_csv(db, csv_path, header_map)
+        finally:
+            db.close()
+
+    report = benchmark.pedantic(run, setup=setup, rounds=3, iterations=1)
+    assert report["added"] == rows
@@ -0,0 +1,39 @@
+"""
+Benchmarks: prompt assembly and context compaction.
+"""
+import random
+from types import SimpleNamespace
+
+from app.utils import prompt as prompt_mod
+
+from .conftest import scaled, sentence
+
+
+def _contexts(n: int, rng: random.Random):
+    return [
+        {"source_name": f"source-{i}", "source_url": f"https://example.org/{i}", "content": " ".join(sentence(rng) for _ in range(8))}
+        for i in range(n)
+    ]
+
+
+def _figure(contexts):
+    rows = [SimpleNamespace(figure_slug="bench-figure", is_manual=False, content_type="text", **c) for c in contexts]
+    return SimpleNamespace(
+        slug="bench-figure", name="Bench Figure", persona_prompt="You are a bench figure.", instruction_prompt=None, contexts=rows
+    )
+
+
+def test_build_prompt_large_history_many_contexts(benchmark) -> None:
+    rng = random.Random(1)
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "message": sentence(rng, 40)} for i in range(scaled(2_000, 50))]
+    figure = _figure(_contexts(scaled(500, 20), rng))
+
+    messages, sources = benchmark(prompt_mod.build_prompt, figure, "What happened next?", history, 16_000, False)
+    assert len(messages) == len(history) + 3
+    assert sources
+
+
+def test_compact_context_many_entries(benchmark) -> None:
+    contexts = _contexts(scaled(20_000, 200), random.Random(2))
+    text, sources = benchmark(prompt_mod._compact_context, contexts, 64_000)
+    assert sources and len(text) <= 64_000 + 2_000
@@ -0,0 +1,45 @@
+"""
+Benchmarks: vector retrieval against a synthetic 100k-chunk Chroma collection.
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from app.vector import context_retriever  # noqa: E402
+
+from .conftest import scaled, sentence  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+from fake_llm_server import fake_embedding  # noqa: E402
+
+_DIM = 384
+
+
+@pytest.fixture(scope="module")
+def collection():
+    client = chromadb.EphemeralClient()
+    coll = client.get_or_create_collection("bench_figure_context", metadata={"hnsw:space": "cosine"})
+    rng = random.Random(6)
+    total = scaled(100_000, 2_000)
+    batch = 5_000
+    for start in range(0, total, batch):
+        ids = [f"ctx-{i}" for i in range(start, min(total, start + batch))]
+        docs = [" ".join(sentence(rng) for _ in range(4)) for _ in ids]
+        coll.add(
+            ids=ids,
+            documents=docs,
+            embeddings=[fake_embedding(d, _DIM) for d in docs],
+            metadatas=[{"figure_slug": f"figure-{int(i.split('-')[1]) % 200}", "source_name": "bench"} for i in ids],
+        )
+    return coll
+
+
+def test_search_figure_context_100k(benchmark, collection, monkeypatch) -> None:
+    monkeypatch.setattr(context_retriever, "get_figure_context_collection", lambda: collection)
+    monkeypatch.setattr(context_retriever, "get_embedding", lambda text: fake_embedding(text, _DIM))
+    hits = benchmark(context_retriever.search_figure_context, "treaty siege frontier", "figure-7", 5)
+    assert hits and all(h["figure_slug"] == "figure-7" for h in hits)
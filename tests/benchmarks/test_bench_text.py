@@ -0,0 +1,35 @@
+"""
+Benchmarks: HTML extraction and chunking on multi-MB inputs.
+"""
+import random
+
+from app.routers.admin_rag import _chunk_text, _html_to_text
+
+from .conftest import scaled, sentence
+
+
+def _text(target_bytes: int, rng: random.Random) -> str:
+    paras, size = [], 0
+    while size < target_bytes:
+        para = " ".join(sentence(rng) for _ in range(6))
+        paras.append(para)
+        size += len(para) + 2
+    return "\n\n".join(paras)
+
+
+def test_chunk_text_multi_mb(benchmark) -> None:
+    text = _text(scaled(4 * 1024 * 1024, 64 * 1024), random.Random(3))
+    chunks = benchmark.pedantic(_chunk_text, args=(text,), rounds=3, iterations=1)
+    assert len(chunks) > 10
+
+
+def test_html_to_text_multi_mb(benchmark) -> None:
+    rng = random.Random(4)
+    body = "".join(
+        f"<div class='p'><p>{sentence(rng)} <a href='#'>{sentence(rng, 4)}</a> &amp; {sentence(rng)}</p></div>\n"
+        + ("<script>var x = 1;</script><style>.p{color:red}</style>" if i % 50 == 0 else "")
+        for i in range(scaled(25_000, 500))
+    )
+    html = f"<html><head><title>Bench</title></head><body>{body}</body></html>"
+    text = benchmark.pedantic(_html_to_text, args=(html,), rounds=3, iterations=1)
+    assert "<" not in text and "var x" not in text
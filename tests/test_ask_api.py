@@ -47,3 +47,40 @@ def test_ask_returns_answer_and_persists() -> None:
     assert body["thread_id"] == thread_id
     assert body["usage"]["total_tokens"] == 15
     assert isinstance(body["sources"], list)
+
+
+def test_ask_commits_once_per_request() -> None:
+    """
+    A new-thread /ask writes thread, question and answer in a single commit.
+    """
+    from sqlalchemy import event
+
+    from app import crud
+    from app.database import get_db_chat
+
+    reg = client.post("/register", json={"username": "ask_user_commits", "password": "pw"})
+    assert reg.status_code == 200, reg.text
+    user_id = reg.json()["user_id"]
+    headers = {"Authorization": f"Bearer {reg.json()['access_token']}"}
+
+    import app.routers.ask as ask_module
+    original = ask_module.generate_answer
+    ask_module.generate_answer = lambda context, prompt, **_: ("Once", {"total_tokens": 1})
+    gen = app.dependency_overrides.get(get_db_chat, get_db_chat)()
+    db = next(gen)
+    engine = db.get_bind()
+    commits = []
+    listener = lambda conn: commits.append(1)  # noqa: E731
+    event.listen(engine, "commit", listener)
+    try:
+        r = client.post("/ask", json={"user_id": user_id, "message": "Count my commits"}, headers=headers)
+        event.remove(engine, "commit", listener)
+        assert r.status_code == 200, r.text
+        assert len(commits) == 1
+        roles = [m.role for m in crud.get_messages_by_thread(db, r.json()["thread_id"])]
+        assert roles == ["user", "assistant"]
+    finally:
+        if event.contains(engine, "commit", listener):
+            event.remove(engine, "commit", listener)
+        ask_module.generate_answer = original
+        gen.close()
@@ -0,0 +1,66 @@
+"""
+Auth pool tests: off-loop hashing, admission cap, and rehash of legacy hashes on login.
+"""
+import asyncio
+import threading
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+
+from app import crud, models, schemas
+from app.database import get_db_chat
+from app.main import app
+from app.services.auth_pool import AuthPool
+
+
+def test_pool_rejects_when_full_and_records_stats() -> None:
+    """
+    With one slot occupied, a second submission is rejected with 503 and counted.
+    """
+    pool = AuthPool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def scenario() -> None:
+        first = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(lambda: None)
+        assert exc.value.status_code == 503
+        release.set()
+        assert await first is True
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 1
+    assert stats["pending"] == 0
+
+
+def test_login_upgrades_legacy_bcrypt_hash() -> None:
+    """
+    Logging in with a legacy bcrypt hash succeeds and stores a bcrypt_sha256 hash.
+    """
+    username = f"legacy_{uuid.uuid4().hex[:8]}@example.com"
+    password = "Legacy!Pass1"
+    # Use whichever chat DB the app is wired to (other test modules override it).
+    gen = app.dependency_overrides.get(get_db_chat, get_db_chat)()
+    db = next(gen)
+    try:
+        user = crud.create_user(db, schemas.UserCreate(username=username, hashed_password=bcrypt.hash(password)))
+        client = TestClient(app)
+        r = client.post("/login", json={"username": username, "password": password})
+        assert r.status_code == 200, r.text
+        db.refresh(user)
+        assert user.hashed_password.startswith("$bcrypt-sha256$")
+        r = client.post("/login", json={"username": username, "password": "wrong"})
+        assert r.status_code == 401
+    finally:
+        db.query(models.User).filter_by(username=username).delete()
+        db.commit()
+        gen.close()
@@ -0,0 +1,49 @@
+"""
+Catalogue caching tests: ETag/304, byte-cache hits, and invalidation on edits.
+"""
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app import models
+from app.figures_database import FigureSessionLocal
+from app.main import app
+from app.utils.http_cache import response_cache
+
+client = TestClient(app)
+
+
+def test_figure_detail_etag_304_and_revision_invalidation() -> None:
+    """
+    A repeat GET is served from cache, If-None-Match yields 304, and an edit changes the ETag.
+    """
+    slug = f"cache-{uuid.uuid4().hex[:8]}"
+    db = FigureSessionLocal()
+    fig = models.HistoricalFigure(name="Cache Test", slug=slug, short_summary="Before.")
+    db.add(fig)
+    db.commit()
+    try:
+        first = client.get(f"/figures/{slug}")
+        assert first.status_code == 200, first.text
+        etag = first.headers["etag"]
+        assert "max-age" in first.headers["cache-control"]
+        assert first.json()["short_summary"] == "Before."
+
+        hits = response_cache.hits
+        again = client.get(f"/figures/{slug}", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert response_cache.hits == hits + 1
+
+        fig.short_summary = "After."
+        db.commit()
+        changed = client.get(f"/figures/{slug}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert changed.json()["short_summary"] == "After."
+
+        assert client.get("/figures/does-not-exist-" + slug).status_code == 404
+    finally:
+        db.delete(fig)
+        db.commit()
+        db.close()
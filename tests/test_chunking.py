@@ -0,0 +1,62 @@
+"""
+Token-aware chunker tests: budgets, offsets, heading boundaries and streaming.
+"""
+from app.ingest.chunking import ChunkerConfig, approximate_token_count, iter_chunks, stream_chunks
+
+SENTENCE = "The legion marched north along the old road toward the frontier forts. "
+
+
+def _doc() -> str:
+    paras = [SENTENCE * (3 + i % 4) for i in range(12)]
+    return "# Early life\n\n" + "\n\n".join(paras[:6]) + "\n\nLATER CAREER\n\n" + "\n\n".join(paras[6:])
+
+
+def test_chunks_respect_budget_and_offsets() -> None:
+    """
+    Every chunk fits the token budget and equals the source slice at its offsets.
+    """
+    text = _doc()
+    cfg = ChunkerConfig(strategy="paragraph", max_tokens=60, overlap_tokens=10)
+    chunks = list(iter_chunks(text, cfg, approximate_token_count))
+    assert len(chunks) > 3
+    for i, c in enumerate(chunks):
+        assert c.index == i
+        assert text[c.start:c.end] == c.text
+        assert c.token_count <= cfg.max_tokens
+
+
+def test_oversized_sentence_is_split_by_words() -> None:
+    """
+    A single sentence longer than the budget is windowed rather than truncated.
+    """
+    text = " ".join(f"word{i}" for i in range(500)) + "."
+    cfg = ChunkerConfig(strategy="sentence", max_tokens=50, overlap_tokens=0)
+    chunks = list(iter_chunks(text, cfg, approximate_token_count))
+    assert len(chunks) > 1
+    assert all(c.token_count <= 50 for c in chunks)
+    assert chunks[-1].end == len(text)
+
+
+def test_heading_strategy_does_not_cross_sections() -> None:
+    """
+    With the heading strategy no chunk spans both sections.
+    """
+    text = _doc()
+    boundary = text.index("LATER CAREER")
+    cfg = ChunkerConfig(strategy="heading", max_tokens=400, overlap_tokens=0)
+    chunks = list(iter_chunks(text, cfg, approximate_token_count))
+    assert any(c.start == boundary for c in chunks)
+    assert not any(c.start < boundary < c.end for c in chunks)
+
+
+def test_stream_chunks_offsets_refer_to_whole_document() -> None:
+    """
+    Streaming page-sized pieces yields offsets into the concatenated document.
+    """
+    pages = [_doc() + "\n\n" for _ in range(5)]
+    whole = "".join(pages)
+    cfg = ChunkerConfig(strategy="paragraph", max_tokens=80, overlap_tokens=0)
+    chunks = list(stream_chunks(pages, cfg, approximate_token_count, buffer_chars=500))
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    for c in chunks:
+        assert whole[c.start:c.end] == c.text
@@ -0,0 +1,121 @@
+"""
+Context fingerprint tests: SimHash distance, batched ingest dedupe and 409 on manual duplicates.
+"""
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.figures_database import FigureSessionLocal
+from app.ingest.chunking import Chunk
+from app.ingest.dedupe import NearDuplicateIndex, content_sha256, hamming_distance, simhash64
+from app.main import app
+from app.routers.admin_rag import _ingest_chunks
+from app.utils.security import get_admin_user
+
+TEXT = "Hadrian ordered a wall built across northern Britain to mark the edge of the empire. " * 4
+
+
+def test_simhash_is_close_for_near_duplicates() -> None:
+    """
+    Whitespace and punctuation edits keep signatures within a few bits; unrelated text does not.
+    """
+    a = simhash64(TEXT)
+    b = simhash64(TEXT.replace(". ", ".  ").replace("empire", "empire,"))
+    c = simhash64("Cleopatra ruled Egypt as the last active pharaoh of the Ptolemaic kingdom.")
+    assert hamming_distance(a, b) <= 3
+    assert hamming_distance(a, c) > 3
+    idx = NearDuplicateIndex(max_distance=3, signatures=[a])
+    assert idx.find(b) == a
+    assert idx.find(c) is None
+
+
+def test_near_duplicate_index_bands_scale_with_distance() -> None:
+    """
+    Every signature within max_distance is found, even past the old fixed four bands.
+    """
+    base = simhash64(TEXT)
+    spread = base ^ 0b1_0001_0001_0001_0001_0001_0001_0001  # 8 bits flipped, one per nibble
+    idx = NearDuplicateIndex(max_distance=8, signatures=[base])
+    assert idx.find(spread) == base
+    assert NearDuplicateIndex(max_distance=7, signatures=[base]).find(spread) is None
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(max_distance=64)
+
+
+def test_ingest_chunks_skips_existing_and_repeated_hashes() -> None:
+    """
+    Re-ingesting the same chunks inserts nothing; repeats within a batch are inserted once.
+    """
+    slug = f"dedupe-{uuid.uuid4().hex[:8]}"
+    chunks = [
+        Chunk(text=TEXT, start=0, end=len(TEXT), index=0, token_count=1),
+        Chunk(text=TEXT, start=len(TEXT), end=2 * len(TEXT), index=1, token_count=1),
+        Chunk(text="A different passage.", start=0, end=20, index=2, token_count=1),
+    ]
+    db = FigureSessionLocal()
+    try:
+        ids, results = _ingest_chunks(db, slug, chunks)
+        assert len(ids) == 2
+        assert [r.ok for r in results] == [True, False, True]
+        assert results[0].sha256 == content_sha256(TEXT)
+        row = db.get(models.FigureContext, ids[0])
+        assert row.content_sha256 == content_sha256(TEXT)
+        assert row.content_simhash is None  # near-dup filtering is off by default
+
+        ids2, results2 = _ingest_chunks(db, slug, chunks)
+        assert ids2 == []
+        assert not any(r.ok for r in results2)
+    finally:
+        db.query(models.FigureContext).filter(models.FigureContext.figure_slug == slug).delete()
+        db.commit()
+        db.close()
+
+
+def test_near_dup_ingest_fingerprints_older_rows_lazily(monkeypatch) -> None:
+    """
+    Rows stored with near-dup off get their SimHash when the filter is first used.
+    """
+    slug = f"dedupe-{uuid.uuid4().hex[:8]}"
+    first = [Chunk(text=TEXT, start=0, end=len(TEXT), index=0, token_count=1)]
+    edited = TEXT.replace(". ", ".  ").replace("empire", "empire,")
+    second = [Chunk(text=edited, start=0, end=len(edited), index=0, token_count=1)]
+    db = FigureSessionLocal()
+    try:
+        ids, _ = _ingest_chunks(db, slug, first)
+        assert db.get(models.FigureContext, ids[0]).content_simhash is None
+
+        monkeypatch.setenv("RAG_NEAR_DUP_MAX_DISTANCE", "3")
+        ids2, results = _ingest_chunks(db, slug, second)
+        assert ids2 == [] and not results[0].ok
+        db.expire_all()
+        assert db.get(models.FigureContext, ids[0]).content_simhash == simhash64(TEXT)
+    finally:
+        db.query(models.FigureContext).filter(models.FigureContext.figure_slug == slug).delete()
+        db.commit()
+        db.close()
+
+
+def test_manual_duplicate_source_returns_409() -> None:
+    """
+    Creating the same manual context twice is rejected by the unique hash index.
+    """
+    slug = f"dedupe-{uuid.uuid4().hex[:8]}"
+    db = FigureSessionLocal()
+    db.add(models.HistoricalFigure(slug=slug, name="Dedupe Test"))
+    db.commit()
+    app.dependency_overrides[get_admin_user] = lambda: None
+    try:
+        client = TestClient(app)
+        payload = {"figure_slug": slug, "source_name": "manual", "content_type": "note", "content": TEXT}
+        first = client.post("/admin/rag/sources", json=payload)
+        second = client.post("/admin/rag/sources", json=payload)
+    finally:
+        app.dependency_overrides.pop(get_admin_user, None)
+        db.query(models.FigureContext).filter(models.FigureContext.figure_slug == slug).delete()
+        db.query(models.HistoricalFigure).filter(models.HistoricalFigure.slug == slug).delete()
+        db.commit()
+        db.close()
+    assert first.status_code == 201, first.text
+    assert second.status_code == 409, second.text
@@ -0,0 +1,82 @@
+"""
+Bulk context embedder tests with an in-memory collection and embedding function.
+"""
+import uuid
+
+from app import models
+from app.figures_database import FigureSessionLocal
+from app.vector.context_embedder import embed_contexts
+
+
+class _Collection:
+    def __init__(self) -> None:
+        self.items = {}
+
+    def upsert(self, ids, documents, embeddings, metadatas) -> None:
+        for i, d, e, m in zip(ids, documents, embeddings, metadatas):
+            self.items[i] = (d, e, m)
+
+
+def test_embed_contexts_batches_and_upserts_with_metadata() -> None:
+    """
+    Contexts are embedded in batches, upserted once per id, and reported per id.
+    """
+    slug = f"embed-{uuid.uuid4().hex[:8]}"
+    db = FigureSessionLocal()
+    rows = [
+        models.FigureContext(figure_slug=slug, source_name="wiki", content_type="document", content=f"Passage {i}.", is_manual=0)
+        for i in range(5)
+    ]
+    rows.append(models.FigureContext(figure_slug=slug, source_name="wiki", content_type="document", content="", is_manual=0))
+    db.add_all(rows)
+    db.commit()
+    ids = [r.id for r in rows]
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(len(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    coll = _Collection()
+    try:
+        report = embed_contexts(db, ids + [10**9], embed_texts=fake_embed, collection=coll, batch_size=2)
+        again = embed_contexts(db, ids[:1], embed_texts=fake_embed, collection=coll)
+    finally:
+        db.query(models.FigureContext).filter(models.FigureContext.figure_slug == slug).delete()
+        db.commit()
+        db.close()
+
+    assert calls == [2, 2, 1, 1]
+    assert [r.status for r in report.results] == ["embedded"] * 5 + ["skipped", "missing"]
+    assert again.count("embedded") == 1
+    assert len(coll.items) == 5
+    doc, vec, meta = coll.items[f"{slug}-{ids[0]}"]
+    assert doc == "Passage 0."
+    assert meta["figure_slug"] == slug
+    assert meta["source_name"] == "wiki"
+    assert meta["content_type"] == "document"
+    assert len(meta["content_sha256"]) == 64
+    assert "source_url" not in meta
+
+
+def test_embed_contexts_reports_failed_batch() -> None:
+    """
+    A backend error marks the batch as failed instead of silently succeeding.
+    """
+    slug = f"embed-{uuid.uuid4().hex[:8]}"
+    db = FigureSessionLocal()
+    row = models.FigureContext(figure_slug=slug, source_name="wiki", content_type="document", content="Text.", is_manual=0)
+    db.add(row)
+    db.commit()
+
+    def broken(texts):
+        raise RuntimeError("backend down")
+
+    try:
+        report = embed_contexts(db, [row.id], embed_texts=broken, collection=_Collection())
+    finally:
+        db.delete(row)
+        db.commit()
+        db.close()
+    assert report.count("failed") == 1
+    assert "backend down" in report.failed[0].error
@@ -1,30 +1,107 @@
 """
 Download database endpoint tests with isolated test data directory.
 """
+import gzip
 import os
-import tempfile
+import sqlite3
+import threading
 from pathlib import Path
 
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.services.db_snapshot import SnapshotCache, snapshots
 
 client = TestClient(app)
 
 
-def test_download_db_serves_attachment() -> None:
+def _make_db(path: Path, rows: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [("x" * 200,)] * rows)
+    conn.commit()
+    conn.close()
+
+
+def test_download_db_serves_attachment(tmp_path, monkeypatch) -> None:
+    """
+    Uses a temporary DATA_DIR with a small figures.db and asserts the endpoint
+    returns a valid SQLite attachment.
+    """
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("SNAPSHOT_CACHE_DIR", str(tmp_path / "snapshots"))
+    _make_db(tmp_path / "figures.db", 50)
+
+    resp = client.get("/download_db", headers={"Accept-Encoding": "identity"})
+    assert resp.status_code == 200, resp.text
+    disp = resp.headers.get("content-disposition", "")
+    assert "attachment" in disp.lower()
+    assert "figures.db" in disp
+    assert resp.content.startswith(b"SQLite format 3\x00")
+
+
+def test_download_db_snapshot_is_cached_ranged_and_compressed(tmp_path, monkeypatch) -> None:
+    """
+    The snapshot is rebuilt only after a write; ranges resume, gzip round-trips and ETags give 304.
+    """
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("SNAPSHOT_CACHE_DIR", str(tmp_path / "snapshots"))
+    _make_db(tmp_path / "figures.db", 200)
+
+    full = client.get("/download_db", headers={"Accept-Encoding": "identity"})
+    etag = full.headers["etag"]
+    builds = snapshots.builds
+    assert client.get("/download_db", headers={"If-None-Match": etag, "Accept-Encoding": "identity"}).status_code == 304
+    assert snapshots.builds == builds
+
+    part = client.get("/download_db", headers={"Range": "bytes=100-", "If-Range": etag})
+    assert part.status_code == 206
+    assert part.headers["content-range"] == f"bytes 100-{len(full.content) - 1}/{len(full.content)}"
+    assert full.content[:100] + part.content == full.content
+
+    gz = client.get("/download_db", params={"compression": "gzip"})
+    assert gz.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(gz.content) == full.content
+    assert len(gz.content) < len(full.content)
+
+    _make_db(tmp_path / "figures.db", 1)
+    changed = client.get("/download_db", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert snapshots.builds == builds + 1
+
+
+def test_concurrent_builds_publish_valid_archives_and_prune_keeps_recent(tmp_path, monkeypatch) -> None:
     """
-    Creates a temporary DATA_DIR with a placeholder figures.db and asserts the
-    endpoint returns an attachment with content.
+    Builds racing in separate caches (as in separate workers) never share temp files.
+    Pruning spares the previous revision and anything inside the grace period.
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
-        os.environ["DATA_DIR"] = tmpdir
-        db_path = Path(tmpdir) / "figures.db"
-        db_path.write_bytes(b"test-bytes")
-
-        resp = client.get("/download_db")
-        assert resp.status_code == 200, resp.text
-        disp = resp.headers.get("content-disposition", "")
-        assert "attachment" in disp.lower()
-        assert "figures.db" in disp
-        assert len(resp.content) > 0
+    cache_dir = tmp_path / "snapshots"
+    monkeypatch.setenv("SNAPSHOT_CACHE_DIR", str(cache_dir))
+    db = tmp_path / "figures.db"
+    _make_db(db, 300)
+
+    workers = [SnapshotCache() for _ in range(4)]
+    threads = [threading.Thread(target=w.get, args=(str(db),)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    first = workers[0]._current
+    with gzip.open(first.files["gzip"]) as f:
+        assert f.read() == Path(first.files["identity"]).read_bytes()
+    assert not [n for n in os.listdir(cache_dir) if n.endswith(".tmp")]
+
+    # Another worker still serves revision 1 while revision 2 is built: nothing young is pruned
+    _make_db(db, 1)
+    second = workers[1].get(str(db))
+    assert os.path.exists(first.files["gzip"]) and os.path.exists(second.files["gzip"])
+
+    # With no grace, only the new and previous revisions survive a third build
+    monkeypatch.setenv("SNAPSHOT_PRUNE_GRACE_SECONDS", "0")
+    _make_db(db, 1)
+    third = workers[1].get(str(db))
+    names = set(os.listdir(cache_dir))
+    assert os.path.basename(third.files["identity"]) in names
+    assert os.path.basename(second.files["identity"]) in names
+    assert os.path.basename(first.files["identity"]) not in names
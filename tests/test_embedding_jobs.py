@@ -0,0 +1,118 @@
+"""
+Durable embedding job queue tests: claiming, progress, retry and cancellation.
+"""
+from fastapi.testclient import TestClient
+
+from app.figures_database import FigureSessionLocal
+from app.main import app
+from app.services import embedding_jobs
+from app.utils.security import get_admin_user
+
+client = TestClient(app)
+
+
+def test_job_progress_is_persisted_and_visible_over_http() -> None:
+    """
+    Enqueues a job in batches, drains it inline and reads progress from the status endpoint.
+    """
+    calls = []
+
+    def fake_embed(db, ids, slug):
+        calls.append((list(ids), slug))
+
+    with FigureSessionLocal() as db:
+        job = embedding_jobs.enqueue_embedding_job(db, "jobs-test-figure", list(range(1, 8)), batch_size=3)
+        job_id = job.id
+
+    assert client.get(f"/admin/rag/upload-jobs/{job_id}").status_code == 401
+    assert client.get(f"/admin/rag/upload-jobs/{job_id}/events").status_code == 401
+
+    app.dependency_overrides[get_admin_user] = lambda: None
+    try:
+        r = client.get(f"/admin/rag/upload-jobs/{job_id}")
+        assert r.status_code == 200, r.text
+        assert r.json()["status"] == "queued"
+        assert r.json()["total"] == 7
+
+        assert embedding_jobs.run_pending(embed_fn=fake_embed) == 3
+        assert [len(ids) for ids, _ in calls] == [3, 3, 1]
+
+        body = client.get(f"/admin/rag/upload-jobs/{job_id}").json()
+    finally:
+        app.dependency_overrides.pop(get_admin_user, None)
+    assert body["status"] == "done"
+    assert body["done"] == 7
+    assert body["failed"] == 0
+
+
+def test_claims_are_exclusive_and_failures_retry(monkeypatch) -> None:
+    """
+    A claimed task cannot be claimed again; a failing batch is requeued until max attempts.
+    """
+    monkeypatch.setenv("RAG_JOB_BACKOFF_SECONDS", "0")
+    monkeypatch.setenv("RAG_JOB_MAX_ATTEMPTS", "2")
+
+    def boom(db, ids, slug):
+        raise RuntimeError("provider down")
+
+    with FigureSessionLocal() as db:
+        job_id = embedding_jobs.enqueue_embedding_job(db, "jobs-test-figure", [1, 2], batch_size=2).id
+        first = embedding_jobs.claim_task(db, "w1")
+        assert first is not None and first["job_id"] == job_id
+        assert embedding_jobs.claim_task(db, "w2") is None
+        embedding_jobs.process_task(db, first, boom)
+        assert embedding_jobs.job_status(db, job_id)["status"] == "running"
+
+    assert embedding_jobs.run_pending(embed_fn=boom) == 1
+    with FigureSessionLocal() as db:
+        status = embedding_jobs.job_status(db, job_id)
+    assert status["status"] == "failed"
+    assert status["failed"] == 2
+    assert "provider down" in status["last_error"]
+
+
+def test_cancel_drops_unclaimed_tasks() -> None:
+    """
+    Cancelling a queued job leaves nothing for workers to claim.
+    """
+    with FigureSessionLocal() as db:
+        job_id = embedding_jobs.enqueue_embedding_job(db, "jobs-test-figure", [1, 2, 3], batch_size=1).id
+        assert embedding_jobs.cancel_job(db, job_id) is True
+        assert embedding_jobs.job_status(db, job_id)["status"] == "cancelled"
+    assert embedding_jobs.run_pending(embed_fn=lambda *a: None) == 0
+
+
+def test_reclaimed_lease_fences_the_slow_worker(monkeypatch) -> None:
+    """
+    Once a lease is reclaimed, only the new owner's result is counted.
+    """
+    monkeypatch.setenv("RAG_JOB_LEASE_SECONDS", "0")
+    monkeypatch.setenv("RAG_JOB_MAX_ATTEMPTS", "3")
+    with FigureSessionLocal() as db:
+        job_id = embedding_jobs.enqueue_embedding_job(db, "jobs-test-figure", [1, 2], batch_size=2).id
+        slow = embedding_jobs.claim_task(db, "slow")
+        fast = embedding_jobs.claim_task(db, "fast")
+        assert fast is not None and fast["id"] == slow["id"] and fast["attempts"] == 2
+        embedding_jobs.process_task(db, fast, lambda *a: None)
+        embedding_jobs.process_task(db, slow, lambda *a: None)
+        status = embedding_jobs.job_status(db, job_id)
+    assert status["status"] == "done"
+    assert status["done"] == 2
+
+
+def test_expired_lease_on_last_attempt_fails_task_and_job_is_partial(monkeypatch) -> None:
+    """
+    A task whose worker died on its last attempt is failed, not requeued; the job reports partial success.
+    """
+    monkeypatch.setenv("RAG_JOB_LEASE_SECONDS", "0")
+    monkeypatch.setenv("RAG_JOB_MAX_ATTEMPTS", "1")
+    with FigureSessionLocal() as db:
+        job_id = embedding_jobs.enqueue_embedding_job(db, "jobs-test-figure", [1, 2], batch_size=1).id
+        assert embedding_jobs.claim_task(db, "dead") is not None
+
+    assert embedding_jobs.run_pending(embed_fn=lambda *a: None) == 1
+    with FigureSessionLocal() as db:
+        status = embedding_jobs.job_status(db, job_id)
+    assert status["status"] == "partial"
+    assert (status["done"], status["failed"]) == (1, 1)
+    assert "lease expired" in status["last_error"]
@@ -0,0 +1,45 @@
+"""
+Figure search tests: FTS5 ranking, prefix mode, highlighting and trigger sync.
+"""
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app import models
+from app.figures_database import FigureSessionLocal
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_search_ranks_prefix_matches_and_tracks_edits() -> None:
+    """
+    Name matches outrank summary matches, prefix mode finds partial words,
+    snippets are escaped and highlighted, and edits/deletes reach the index.
+    """
+    tag = uuid.uuid4().hex[:6]
+    word = f"zorblax{tag}"
+    db = FigureSessionLocal()
+    named = models.HistoricalFigure(name=f"{word.title()} the Bold", slug=f"named-{tag}", short_summary="A ruler.")
+    summary = models.HistoricalFigure(name=f"Other {tag}", slug=f"summary-{tag}", short_summary=f"Rival of {word} & <friends>.")
+    db.add_all([named, summary])
+    db.commit()
+    try:
+        r = client.get("/figures/search", params={"q": word, "mode": "fulltext"})
+        assert r.status_code == 200, r.text
+        hits = r.json()
+        assert [h["slug"] for h in hits] == [f"named-{tag}", f"summary-{tag}"]
+        assert "<mark>" in hits[1]["snippet"] and "&lt;friends&gt;" in hits[1]["snippet"]
+
+        assert client.get("/figures/search", params={"q": word[:-2], "mode": "fulltext"}).json() == []
+        prefix = client.get("/figures/search", params={"q": word[:-2], "mode": "prefix"}).json()
+        assert {h["slug"] for h in prefix} == {f"named-{tag}", f"summary-{tag}"}
+
+        named.name = f"Renamed {tag}"
+        db.commit()
+        assert [h["slug"] for h in client.get("/figures/search", params={"q": word}).json()] == [f"summary-{tag}"]
+    finally:
+        db.query(models.HistoricalFigure).filter(models.HistoricalFigure.slug.in_([f"named-{tag}", f"summary-{tag}"])).delete()
+        db.commit()
+        db.close()
+    assert client.get("/figures/search", params={"q": word}).json() == []
@@ -0,0 +1,116 @@
+"""
+Guest quota tests: atomic reservation, release on LLM failure, and one-transaction turns.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.database import get_db_chat
+from app.main import app
+from app.routers import guest as guest_router
+from app.services import rate_limit
+
+SLUG = "guest-quota-figure"
+
+
+@pytest.fixture
+def guest_client(monkeypatch):
+    """Start a guest session against a temporary figure and attach its cookie."""
+    from app.figures_database import FigureSessionLocal
+
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+    fig_db = FigureSessionLocal()
+    if not fig_db.query(models.HistoricalFigure).filter_by(slug=SLUG).first():
+        fig_db.add(models.HistoricalFigure(slug=SLUG, name="Quota Test"))
+        fig_db.commit()
+    client = TestClient(app)
+    r = client.post(f"/guest/start/{SLUG}")
+    assert r.status_code == 200, r.text
+    # The cookie is Secure, so the http test client will not resend it by itself.
+    token = r.cookies["guest_session"]
+    client.cookies.clear()
+    client.cookies.set("guest_session", token)
+    yield client
+    fig_db.query(models.HistoricalFigure).filter_by(slug=SLUG).delete()
+    fig_db.commit()
+    fig_db.close()
+    rate_limit.reset()
+
+
+def _answer(*_, **__):
+    return {"choices": [{"message": {"content": "An answer."}}], "usage": {}}
+
+
+def test_quota_is_enforced_and_released_on_failure(guest_client, monkeypatch) -> None:
+    """
+    A failing LLM call does not consume quota; successful turns do, up to the limit.
+    """
+    monkeypatch.setattr(guest_router, "build_prompt", lambda **kw: ([{"role": "user", "content": kw["user_message"]}], []))
+
+    def boom(*_, **__):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(guest_router.llm_client, "generate", boom)
+    with pytest.raises(RuntimeError):
+        guest_client.post("/guest/ask", json={"message": "q0"})
+
+    monkeypatch.setattr(guest_router.llm_client, "generate", _answer)
+    remaining = [guest_client.post("/guest/ask", json={"message": f"q{i}"}).json()["remaining_questions"] for i in range(3)]
+    assert remaining == [2, 1, 0]
+    r = guest_client.post("/guest/ask", json={"message": "q4"})
+    assert r.status_code == 403
+
+    gen = app.dependency_overrides.get(get_db_chat, get_db_chat)()
+    db = next(gen)
+    try:
+        session = db.query(models.GuestSession).filter_by(session_token=guest_client.cookies["guest_session"]).one()
+        assert session.question_count == 3
+        assert [m.role for m in session.messages] == ["user", "assistant"] * 3
+    finally:
+        gen.close()
+
+
+def test_upgrade_moves_transcript_in_one_transaction(guest_client, monkeypatch) -> None:
+    """
+    Upgrading copies every guest message with its timestamp, in order, and removes the session.
+    """
+    import uuid
+
+    from app.utils.security import create_access_token
+
+    monkeypatch.setattr(guest_router, "build_prompt", lambda **kw: ([{"role": "user", "content": kw["user_message"]}], []))
+    monkeypatch.setattr(guest_router.llm_client, "generate", _answer)
+    for i in range(2):
+        assert guest_client.post("/guest/ask", json={"message": f"q{i}"}).status_code == 200
+
+    gen = app.dependency_overrides.get(get_db_chat, get_db_chat)()
+    db = next(gen)
+    username = f"upgrade_{uuid.uuid4().hex[:8]}@example.com"
+    user_id = None
+    try:
+        user = models.User(username=username, hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        token = guest_client.cookies["guest_session"]
+        session = db.query(models.GuestSession).filter_by(session_token=token).one()
+        originals = [(m.role, m.message, m.timestamp) for m in sorted(session.messages, key=lambda m: m.id)]
+        db.expunge_all()
+
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+        r = guest_client.post("/guest/upgrade", headers=headers)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        assert body["transferred_messages"] == 4
+
+        chats = db.query(models.Chat).filter_by(thread_id=body["thread_id"]).order_by(models.Chat.id).all()
+        assert [(c.role, c.message, c.timestamp) for c in chats] == originals
+        assert all(c.user_id == user_id for c in chats)
+        assert db.query(models.GuestSession).filter_by(session_token=token).first() is None
+        assert guest_client.post("/guest/upgrade", headers=headers).status_code == 400
+    finally:
+        db.query(models.Chat).filter(models.Chat.user_id == user_id).delete()
+        db.query(models.Thread).filter(models.Thread.user_id == user_id).delete()
+        db.query(models.User).filter_by(username=username).delete()
+        db.commit()
+        gen.close()
@@ -0,0 +1,47 @@
+"""
+Guest sweeper tests: batched deletion of expired sessions and incremental vacuum.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base
+from app.services.guest_sweeper import ensure_incremental_auto_vacuum, sweep_expired
+
+
+def test_sweep_removes_only_expired_sessions_in_batches(tmp_path) -> None:
+    """
+    Expired sessions past retention and their messages are removed; live ones stay.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    Base.metadata.create_all(bind=engine)
+    assert ensure_incremental_auto_vacuum(engine)
+    now = datetime.utcnow()
+    db = sessionmaker(bind=engine)()
+    for i in range(25):
+        expired = i < 20
+        s = models.GuestSession(
+            session_token=f"tok-{i}",
+            question_count=0,
+            expires_at=now - timedelta(hours=2) if expired else now + timedelta(hours=2),
+        )
+        db.add(s)
+        db.flush()
+        db.add_all(
+            models.GuestMessage(session_id=s.id, role="user", message="x" * 2000) for _ in range(3)
+        )
+    db.commit()
+    db.close()
+
+    report = sweep_expired(engine, now=now, retention=timedelta(hours=1), batch_size=7, vacuum_pages=10_000)
+
+    assert report.sessions == 20
+    assert report.messages == 60
+    assert report.batches == 3
+    assert report.bytes_reclaimed > 0
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM guest_sessions").scalar() == 5
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM guest_messages").scalar() == 15
+    assert sweep_expired(engine, now=now, retention=timedelta(hours=1)).sessions == 0
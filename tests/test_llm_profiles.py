@@ -0,0 +1,170 @@
+"""
+Shared LLM profile tests: changes made by another process reach this worker's llm_config.
+"""
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.config.llm_config import llm_config, llm_config_snapshot, update_llm_config
+from app.database import SessionLocal, engine
+from app.main import app
+from app.models_llm_profile import LlmProfile
+from app.services import llm_profiles
+
+client = TestClient(app)
+
+
+def _deactivate_all() -> None:
+    with SessionLocal() as db:
+        db.query(LlmProfile).update({LlmProfile.is_active: False})
+        db.commit()
+    llm_profiles.cache.refresh(engine, force=True)
+
+
+def test_refresh_applies_profile_written_elsewhere_only_when_revision_moves() -> None:
+    """
+    A write from another session bumps the revision; an unchanged revision costs no reload.
+    """
+    try:
+        llm_profiles.cache.refresh(engine, force=True)
+        assert llm_profiles.cache.refresh(engine) is False
+
+        # Simulates another worker (or a SQL shell) switching provider
+        with SessionLocal() as db:
+            llm_profiles.upsert_profile(db, "incident", {"provider": "openrouter", "model": "fallback-model"})
+            llm_profiles.activate_profile(db, "incident")
+            db.commit()
+        assert llm_profiles.cache.refresh(engine) is True
+        assert (llm_config.provider, llm_config.model) == ("openrouter", "fallback-model")
+        assert llm_profiles.cache.active == "incident"
+    finally:
+        _deactivate_all()
+    assert llm_profiles.cache.active is None
+    assert llm_config.provider != "openrouter"
+
+
+def test_profile_switch_is_never_seen_half_applied() -> None:
+    """
+    Snapshots taken while profiles flip always pair each provider with its own model.
+    """
+    pairs = {("openai", "model-a"), ("openrouter", "model-b")}
+    stop = threading.Event()
+    seen = set()
+    update_llm_config({"provider": "openai", "model": "model-a"})
+
+    def reader() -> None:
+        while not stop.is_set():
+            cfg = llm_config_snapshot()
+            seen.add((cfg.provider, cfg.model))
+
+    t = threading.Thread(target=reader)
+    t.start()
+    try:
+        for i in range(2000):
+            provider, model = sorted(pairs)[i % 2]
+            update_llm_config({"provider": provider, "model": model})
+    finally:
+        stop.set()
+        t.join()
+        _deactivate_all()
+    assert seen <= pairs
+
+
+def test_poller_picks_up_activation(monkeypatch) -> None:
+    monkeypatch.setenv("LLM_PROFILE_POLL_SECONDS", "0.05")
+    cache = llm_profiles.ProfileCache()
+    cache.start(engine)
+    try:
+        with SessionLocal() as db:
+            llm_profiles.upsert_profile(db, "polled", {"model": "polled-model"})
+            llm_profiles.activate_profile(db, "polled")
+            db.commit()
+        deadline = time.monotonic() + 5
+        while cache.active != "polled" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert cache.active == "polled"
+        assert llm_config.model == "polled-model"
+    finally:
+        cache.stop()
+        _deactivate_all()
+
+
+def test_admin_profile_endpoints(monkeypatch) -> None:
+    monkeypatch.setenv("ENVIRONMENT", "dev")
+    try:
+        r = client.put("/admin/llm/profiles/backup", json={"provider": "openrouter", "model": "backup-model"})
+        assert r.status_code == 200, r.text
+        assert r.json()["is_active"] is False
+        assert client.post("/admin/llm/profiles/missing/activate").status_code == 404
+
+        r = client.post("/admin/llm/profiles/backup/activate")
+        assert r.status_code == 200
+        assert client.get("/admin/llm").json()["config"]["model"] == "backup-model"
+        listing = client.get("/admin/llm/profiles").json()
+        assert listing["active"] == "backup"
+
+        # The API base decides where the server's key is sent; it is not writable over HTTP
+        api_base = llm_config.api_base
+        r = client.patch("/admin/llm", json={"model": "x", "api_base": "https://attacker.example/v1"})
+        assert r.status_code == 422
+        assert client.put("/admin/llm/profiles/evil", json={"api_base": "https://attacker.example/v1"}).status_code == 422
+        assert llm_config.api_base == api_base
+    finally:
+        _deactivate_all()
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"provider": "nonsense"},
+        {"temperature": 7},
+        {"max_tokens": -5},
+        {"top_p": 1.5},
+        {"model": ""},
+        {"temperature": "hot"},
+    ],
+)
+def test_admin_profile_endpoints_reject_invalid_settings(monkeypatch, payload) -> None:
+    monkeypatch.setenv("ENVIRONMENT", "dev")
+    before = llm_config_snapshot()
+    try:
+        assert client.patch("/admin/llm", json=payload).status_code == 422
+        assert client.put("/admin/llm/profiles/invalid", json={"model": "m", **payload}).status_code == 422
+    finally:
+        _deactivate_all()
+    with SessionLocal() as db:
+        assert db.get(LlmProfile, "invalid") is None
+    assert llm_config_snapshot() == before
+
+
+def test_invalid_profile_written_by_sql_is_ignored() -> None:
+    """
+    upsert_profile refuses bad values; a bad row written directly keeps the current settings.
+    """
+    with SessionLocal() as db:
+        with pytest.raises(ValueError):
+            llm_profiles.upsert_profile(db, "broken", {"provider": "openai", "model": "m", "temperature": 7})
+        db.rollback()
+    try:
+        llm_profiles.cache.refresh(engine, force=True)
+        before = llm_config_snapshot()
+        with SessionLocal() as db:
+            db.query(LlmProfile).update({LlmProfile.is_active: False})
+            db.execute(
+                text(
+                    "INSERT INTO llm_profiles (name, provider, model, max_tokens, is_active) "
+                    "VALUES ('broken', 'nonsense', 'm', -5, 1)"
+                )
+            )
+            db.commit()
+        assert llm_profiles.cache.refresh(engine) is False
+        assert llm_config_snapshot() == before
+        assert llm_profiles.cache.refresh(engine) is False  # recorded; not retried every poll
+    finally:
+        with SessionLocal() as db:
+            db.query(LlmProfile).filter(LlmProfile.name == "broken").delete()
+            db.commit()
+        _deactivate_all()
@@ -0,0 +1,85 @@
+"""
+/metrics tests: exposition format, per-route latency, LLM usage, and multi-process merging.
+"""
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import metrics
+
+client = TestClient(app)
+
+
+def _sample(body: str, prefix: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix!r} not found in /metrics output")
+
+
+def test_metrics_exposes_route_latency_and_domain_gauges(monkeypatch) -> None:
+    """
+    Requests are labelled by route template, and DB-backed gauges are present.
+    """
+    monkeypatch.delenv("METRICS_MULTIPROC_DIR", raising=False)
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert client.get("/health").status_code == 200
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = r.text
+    assert "# TYPE pit_http_request_duration_seconds histogram" in body
+    assert _sample(body, 'pit_http_request_duration_seconds_count{method="GET",route="/health",status="200"}') >= 1
+    assert 'pit_guest_sessions{state="active"}' in body
+    # The first scrape's guest-session query checked out a chat connection.
+    assert 'pit_db_pool_checkout_seconds_bucket{db="chat"' in client.get("/metrics").text
+
+
+def test_llm_usage_is_counted_by_provider_and_model() -> None:
+    """
+    Token counts come from the provider's ``usage`` block.
+    """
+    metrics.observe_llm_call("openai", "test-model", 0.4, {"prompt_tokens": 12, "completion_tokens": 5})
+    body = metrics.registry.render()
+    assert _sample(body, 'pit_llm_tokens_total{provider="openai",model="test-model",kind="prompt"}') >= 12
+    assert _sample(body, 'pit_llm_request_duration_seconds_count{provider="openai",model="test-model",outcome="ok"}') >= 1
+
+
+def test_metrics_token_is_enforced(monkeypatch) -> None:
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+def test_multiprocess_merge_sums_counters_and_drops_dead_gauges(monkeypatch, tmp_path) -> None:
+    """
+    Another worker's snapshot adds to counters; once marked dead its gauges disappear.
+    """
+    monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path))
+    own = metrics.registry.collect()
+    key = 'pit_llm_tokens_total{provider="other",model="m",kind="completion"}'
+    other = {
+        "pid": 999999,
+        "families": {
+            "pit_llm_tokens_total": {
+                "type": "counter",
+                "help": "",
+                "samples": [[{"provider": "other", "model": "m", "kind": "completion"}, 7]],
+            },
+            "pit_write_behind_pending_rows": {"type": "gauge", "help": "", "samples": [[{}, 40]]},
+        },
+    }
+    (tmp_path / "metrics_999999.json").write_text(json.dumps(other))
+    own_pending = own["pit_write_behind_pending_rows"]["samples"][0][1]
+
+    body = metrics.registry.render()
+    assert os.path.exists(tmp_path / f"metrics_{os.getpid()}.json")
+    assert _sample(body, key) == 7
+    assert _sample(body, "pit_write_behind_pending_rows ") == own_pending + 40
+
+    metrics.mark_process_dead(999999)
+    body = metrics.registry.render()
+    assert _sample(body, key) == 7
+    assert _sample(body, "pit_write_behind_pending_rows ") == own_pending
@@ -0,0 +1,96 @@
+"""
+Admin profiler tests: whole-process sampling output and per-request capture.
+"""
+import io
+import pstats
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.profiler import profiler
+from app.utils.security import get_admin_user
+
+client = TestClient(app)
+
+
+def _spin_for_profiler(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(2000))
+
+
+def _wait_finished(timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get("/admin/profile").json()
+        if status["state"] not in ("armed", "collecting"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError("profiling session did not finish")
+
+
+def test_process_profile_finds_busy_thread_and_exports_pstats(monkeypatch, tmp_path) -> None:
+    """
+    A busy thread shows up in the collapsed stacks, and the pstats file loads.
+    """
+    monkeypatch.setenv("PROFILER_ENABLED", "true")
+    app.dependency_overrides[get_admin_user] = lambda: None
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_for_profiler, args=(stop,), daemon=True)
+    worker.start()
+    try:
+        r = client.post("/admin/profile/process", params={"seconds": 0.5, "interval_ms": 2})
+        assert r.status_code == 202
+        assert client.post("/admin/profile/process", params={"seconds": 1}).status_code == 409
+        status = _wait_finished()
+        assert status["state"] == "done" and status["ticks"] > 0
+
+        collapsed = client.get("/admin/profile/result", params={"format": "collapsed"}).text
+        assert "_spin_for_profiler" in collapsed
+        line = next(l for l in collapsed.splitlines() if "_spin_for_profiler" in l)
+        assert int(line.rsplit(" ", 1)[1]) > 0
+
+        r = client.get("/admin/profile/result", params={"format": "pstats", "weight": "cpu"})
+        assert r.headers["content-disposition"].endswith('.pstats"')
+        dump = tmp_path / "profile.pstats"
+        dump.write_bytes(r.content)
+        stats = pstats.Stats(str(dump), stream=io.StringIO())
+        stats.sort_stats("cumulative").print_stats(5)
+        assert any(name == "_spin_for_profiler" for (_, _, name) in stats.stats)
+
+        top = client.get("/admin/profile/result", params={"format": "top"}).json()
+        assert top["by_cumulative"] and top["by_self"]
+    finally:
+        stop.set()
+        worker.join()
+        profiler.stop()
+        app.dependency_overrides.clear()
+
+
+def test_request_profile_captures_only_matching_requests(monkeypatch) -> None:
+    monkeypatch.setenv("PROFILER_ENABLED", "true")
+    app.dependency_overrides[get_admin_user] = lambda: None
+    try:
+        r = client.post("/admin/profile/requests", params={"route": "/health", "count": 2, "timeout": 30})
+        assert r.status_code == 202 and r.json()["state"] == "armed"
+        client.get("/figures/")
+        client.get("/health")
+        client.get("/health")
+        status = _wait_finished()
+        assert status["state"] == "done"
+        assert status["requests_captured"] == 2
+        assert {req["path"] for req in status["requests"]} == {"/health"}
+    finally:
+        profiler.stop()
+        app.dependency_overrides.clear()
+
+
+def test_profiler_disabled_and_admin_only(monkeypatch) -> None:
+    monkeypatch.setenv("PROFILER_ENABLED", "false")
+    app.dependency_overrides[get_admin_user] = lambda: None
+    try:
+        assert client.post("/admin/profile/process", params={"seconds": 1}).status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+    assert client.get("/admin/profile").status_code == 401
@@ -0,0 +1,134 @@
+"""
+Admission control tests: token buckets, shared SQLite buckets, LLM gate and 429 responses.
+"""
+import threading
+
+import pytest
+
+from app.services import rate_limit
+from app.services.rate_limit import LlmGate, MemoryBucketStore, RateLimited, SqliteBucketStore
+
+
+@pytest.mark.parametrize("factory", [MemoryBucketStore, "sqlite"])
+def test_bucket_admits_capacity_then_limits(factory, tmp_path) -> None:
+    """
+    A bucket admits ``capacity`` requests, then reports a positive retry delay.
+    """
+    store = SqliteBucketStore(str(tmp_path / "rl.db")) if factory == "sqlite" else factory()
+    results = [store.take("user:1", capacity=3, refill=0.5) for _ in range(4)]
+    assert [ok for ok, _ in results] == [True, True, True, False]
+    assert results[-1][1] == pytest.approx(2.0, abs=0.1)
+    assert store.take("user:2", capacity=3, refill=0.5)[0]
+
+
+def test_llm_gate_rejects_when_queue_full() -> None:
+    """
+    With one slot busy and no queue, the next caller is rejected immediately.
+    """
+    gate = LlmGate(max_inflight=1, max_queue=0, timeout=1.0)
+    gate.acquire()
+    with pytest.raises(RateLimited):
+        gate.acquire()
+    gate.release()
+    gate.acquire()
+    gate.release()
+
+
+def test_llm_gate_queued_caller_gets_released_slot() -> None:
+    """
+    A queued caller proceeds once the running call releases its slot.
+    """
+    gate = LlmGate(max_inflight=1, max_queue=1, timeout=2.0)
+    gate.acquire()
+    got = threading.Event()
+
+    def waiter() -> None:
+        gate.acquire()
+        got.set()
+        gate.release()
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    assert not got.wait(0.1)
+    gate.release()
+    t.join(2)
+    assert got.is_set()
+
+
+def test_llm_gate_leaves_half_the_threadpool_free(monkeypatch) -> None:
+    """
+    Running plus queued gate callers are capped at half the sync threadpool.
+    """
+    monkeypatch.setenv("LLM_MAX_INFLIGHT", "8")
+    monkeypatch.setenv("LLM_MAX_QUEUE", "32")
+    try:
+        rate_limit.fit_to_threadpool(40)
+        llm = rate_limit.stats()["llm"]
+        assert (llm["max_inflight"], llm["max_queue"]) == (8, 12)
+        monkeypatch.setenv("LLM_MAX_INFLIGHT", "30")
+        rate_limit.fit_to_threadpool(40)
+        llm = rate_limit.stats()["llm"]
+        assert (llm["max_inflight"], llm["max_queue"]) == (20, 0)
+    finally:
+        rate_limit._gate_thread_budget = None
+        rate_limit.reset()
+
+
+def test_guest_ask_returns_429_with_retry_after(monkeypatch) -> None:
+    """
+    Exceeding the guest bucket yields 429 and Retry-After before any session lookup.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    monkeypatch.setenv("RATE_LIMIT_GUEST", "2/60")
+    rate_limit.reset()
+    try:
+        client = TestClient(app)
+        client.cookies.set("guest_session", "rate-limit-test-token")
+        codes = [client.post("/guest/ask", json={"message": "hi"}).status_code for _ in range(3)]
+        assert codes[:2] == [400, 400]
+        assert codes[2] == 429
+        r = client.post("/guest/ask", json={"message": "hi"})
+        assert int(r.headers["Retry-After"]) >= 1
+        assert rate_limit.stats()["counters"]["guest_limited"] >= 2
+    finally:
+        rate_limit.reset()
+
+
+def test_rejected_session_does_not_spend_shared_ip_tokens(monkeypatch) -> None:
+    """
+    A guest past its own limit is turned away without draining the IP bucket others share.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    monkeypatch.setenv("RATE_LIMIT_GUEST", "1/60")
+    monkeypatch.setenv("RATE_LIMIT_IP", "3/60")
+    rate_limit.reset()
+    try:
+        noisy = TestClient(app)
+        noisy.cookies.set("guest_session", "noisy-guest-token")
+        codes = [noisy.post("/guest/ask", json={"message": "hi"}).status_code for _ in range(6)]
+        assert codes.count(429) == 5
+        neighbour = TestClient(app)
+        neighbour.cookies.set("guest_session", "neighbour-token")
+        assert neighbour.post("/guest/ask", json={"message": "hi"}).status_code != 429
+    finally:
+        rate_limit.reset()
+
+
+def test_client_ip_trusts_proxy_on_render_and_ignores_spoofed_hops(monkeypatch) -> None:
+    from starlette.requests import Request
+
+    def request(xff: str) -> Request:
+        return Request({"type": "http", "headers": [(b"x-forwarded-for", xff.encode())], "client": ("10.0.0.1", 1234)})
+
+    monkeypatch.delenv("RATE_LIMIT_TRUST_PROXY", raising=False)
+    monkeypatch.delenv("RENDER", raising=False)
+    assert rate_limit.client_ip(request("203.0.113.7")) == "10.0.0.1"
+
+    monkeypatch.setenv("RENDER", "true")
+    assert rate_limit.client_ip(request("203.0.113.7")) == "203.0.113.7"
+    # A client-supplied entry sits left of the one the proxy appended
+    assert rate_limit.client_ip(request("1.2.3.4, 203.0.113.7")) == "203.0.113.7"
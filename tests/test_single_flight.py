@@ -0,0 +1,183 @@
+"""
+LLM request coalescing tests: shared upstream calls, the temperature rule, bounded waits and errors.
+"""
+import threading
+import time
+
+import pytest
+
+from app.services import llm_client, rate_limit, single_flight
+from app.services.llm_client import LlmClient
+from app.utils import metrics
+
+
+def _followers_counted() -> float:
+    prefix = 'pit_llm_coalesced_calls_total{provider="openai",role="follower"} '
+    line = next((l for l in metrics.registry.render().splitlines() if l.startswith(prefix)), None)
+    return float(line.rsplit(" ", 1)[1]) if line else 0.0
+
+
+def _wait_for_followers(flights: single_flight.SingleFlight, n: int) -> None:
+    deadline = time.monotonic() + 5
+    while flights.stats()["waiting"] < n and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def _run_concurrently(n: int, fn):
+    results, errors = [None] * n, []
+
+    def worker(i: int) -> None:
+        try:
+            results[i] = fn()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_identical_deterministic_calls_share_one_upstream_request(monkeypatch) -> None:
+    """
+    Five concurrent temperature-0 requests make one provider call and get equal, separate results.
+    """
+    monkeypatch.setenv("LLM_COALESCE", "auto")
+    release = threading.Event()
+    calls = []
+
+    def fake_upstream(self, cfg, messages, temperature, top_p, max_tokens, model):
+        calls.append(messages)
+        release.wait(5)
+        return {"model": "m", "usage": {"prompt_tokens": 3, "completion_tokens": 2}, "choices": [{"message": {"content": "Hi"}}]}
+
+    monkeypatch.setattr(LlmClient, "_gen_openai", fake_upstream)
+    client = LlmClient()
+    before = _followers_counted()
+    messages = [{"role": "user", "content": "Who are you?"}]
+    threads, results, errors = _run_concurrently(5, lambda: client.generate(messages=messages, temperature=0, model="m"))
+    _wait_for_followers(single_flight.llm_flights, 4)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    assert len({id(r) for r in results}) == 5
+    assert _followers_counted() == before + 4
+
+
+def test_followers_do_not_hold_llm_gate_slots(monkeypatch) -> None:
+    """
+    A herd larger than LLM_MAX_INFLIGHT + LLM_MAX_QUEUE still shares one call and nobody gets 429.
+    """
+    monkeypatch.setenv("LLM_COALESCE", "auto")
+    monkeypatch.setenv("LLM_MAX_INFLIGHT", "2")
+    monkeypatch.setenv("LLM_MAX_QUEUE", "0")
+    rate_limit.reset()
+    release = threading.Event()
+    calls = []
+
+    def fake_upstream(self, cfg, messages, temperature, top_p, max_tokens, model):
+        calls.append(messages)
+        release.wait(5)
+        return {"model": "m", "usage": {}, "choices": [{"message": {"content": "Hello class"}}]}
+
+    monkeypatch.setattr(LlmClient, "_gen_openai", fake_upstream)
+    client = LlmClient()
+    messages = [{"role": "user", "content": "What was your greatest battle?"}]
+    try:
+        threads, results, errors = _run_concurrently(10, lambda: client.generate(messages=messages, temperature=0, model="m"))
+        _wait_for_followers(single_flight.llm_flights, 9)
+        assert rate_limit.stats()["llm"]["inflight"] == 1
+        release.set()
+        for t in threads:
+            t.join()
+    finally:
+        release.set()
+        rate_limit.reset()
+    assert not errors
+    assert len(calls) == 1
+    assert all(r["choices"][0]["message"]["content"] == "Hello class" for r in results)
+
+
+def test_sampled_calls_are_not_coalesced_unless_opted_in(monkeypatch) -> None:
+    calls = []
+
+    def fake_upstream(self, cfg, messages, temperature, top_p, max_tokens, model):
+        calls.append(temperature)
+        time.sleep(0.05)
+        return {"model": "m", "usage": {}, "choices": []}
+
+    monkeypatch.setattr(LlmClient, "_gen_openai", fake_upstream)
+    client = LlmClient()
+    messages = [{"role": "user", "content": "Tell me a story"}]
+
+    monkeypatch.setenv("LLM_COALESCE", "auto")
+    threads, _, _ = _run_concurrently(3, lambda: client.generate(messages=messages, temperature=0.7, model="m"))
+    for t in threads:
+        t.join()
+    assert len(calls) == 3
+
+    monkeypatch.setenv("LLM_COALESCE", "always")
+    calls.clear()
+    release = threading.Event()
+
+    def slow_upstream(self, cfg, messages, temperature, top_p, max_tokens, model):
+        calls.append(temperature)
+        release.wait(5)
+        return {"model": "m", "usage": {}, "choices": []}
+
+    monkeypatch.setattr(LlmClient, "_gen_openai", slow_upstream)
+    threads, _, _ = _run_concurrently(3, lambda: client.generate(messages=messages, temperature=0.7, model="m"))
+    _wait_for_followers(single_flight.llm_flights, 2)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+
+
+def test_followers_stop_waiting_after_timeout() -> None:
+    flights = single_flight.SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flights.do, args=("k", lambda: release.wait(5), 1.0))
+    leader.start()
+    while not flights.stats()["inflight_keys"]:
+        time.sleep(0.005)
+    result, role = flights.do("k", lambda: "own", wait_timeout=0.05)
+    release.set()
+    leader.join()
+    assert (result, role) == ("own", "timeout")
+    assert flights.stats()["timeout"] == 1
+
+
+def test_follower_wait_outlasts_the_leaders_worst_case(monkeypatch) -> None:
+    """
+    By default followers wait out a full gate queue wait plus the HTTP timeout.
+    """
+    monkeypatch.delenv("LLM_COALESCE_WAIT_SECONDS", raising=False)
+    monkeypatch.setenv("LLM_QUEUE_TIMEOUT", "15")
+    budget = rate_limit.llm_queue_timeout() + llm_client.HTTP_TIMEOUT
+    assert single_flight.llm_wait_timeout(budget) > 45
+    monkeypatch.setenv("LLM_COALESCE_WAIT_SECONDS", "7")
+    assert single_flight.llm_wait_timeout(budget) == 7
+
+
+def test_leader_error_is_shared_with_followers() -> None:
+    flights = single_flight.SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("upstream 503")
+
+    threads, _, errors = _run_concurrently(3, lambda: flights.do("k", failing, wait_timeout=5))
+    _wait_for_followers(flights, 2)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(errors) == 3 and all(str(e) == "upstream 503" for e in errors)
+    assert flights.stats()["leader"] == 1
+    with pytest.raises(RuntimeError):
+        flights.do("k", failing, wait_timeout=5)
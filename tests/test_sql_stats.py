@@ -0,0 +1,75 @@
+"""
+SQL accounting tests: per-request query counts, the slow-query log, and query budgets.
+"""
+import logging
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import crud, schemas
+from app.database import SessionLocal
+from app.main import app
+from app.utils.sql_stats import assert_max_queries, capture
+
+client = TestClient(app)
+
+
+def _user_with_threads(n: int):
+    reg = client.post("/register", json={"username": f"sql_user_{uuid4().hex[:8]}", "password": "pw"})
+    user_id = reg.json()["user_id"]
+    headers = {"Authorization": f"Bearer {reg.json()['access_token']}"}
+    with SessionLocal() as db:
+        for i in range(n):
+            thread = crud.create_thread(db, schemas.ThreadCreate(user_id=user_id, title=f"T{i}"))
+            first_role = "user" if i % 2 == 0 else "assistant"
+            for role, msg in ((first_role, f"opening {i}"), ("assistant", f"reply {i}")):
+                crud.create_chat_message(
+                    db, schemas.ChatMessageCreate(user_id=user_id, role=role, message=msg, thread_id=thread.id)
+                )
+    return user_id, headers
+
+
+def test_list_threads_query_count_does_not_grow_with_threads(monkeypatch) -> None:
+    """
+    Listing threads costs the same number of statements for 1 or 8 threads.
+    """
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+    few_id, few_headers = _user_with_threads(1)
+    many_id, many_headers = _user_with_threads(8)
+
+    with capture() as few:
+        assert client.get(f"/threads/user/{few_id}", headers=few_headers).status_code == 200
+    with assert_max_queries(few.count):
+        r = client.get(f"/threads/user/{many_id}", headers=many_headers)
+    assert r.status_code == 200
+    previews = {t["title"]: t["first_user_message"] for t in r.json()}
+    assert previews["T0"] == "opening 0"
+    assert previews["T1"] is None  # opened by the assistant
+
+
+def test_request_reports_db_time_in_server_timing(monkeypatch) -> None:
+    monkeypatch.setenv("TIMING_ENABLED", "true")
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+    user_id, headers = _user_with_threads(2)
+    r = client.get(f"/threads/user/{user_id}", headers=headers)
+    db_part = next(p for p in r.headers["server-timing"].split(", ") if p.startswith("db;"))
+    assert 'queries"' in db_part
+
+
+def test_slow_query_is_logged_with_plan(monkeypatch, caplog) -> None:
+    monkeypatch.setenv("SQL_SLOW_MS", "0.000001")
+    with caplog.at_level(logging.WARNING, logger="app.sql"):
+        with SessionLocal() as db:
+            db.execute(text("SELECT id FROM chats WHERE thread_id = :t"), {"t": 1}).all()
+    line = next(r.getMessage() for r in caplog.records if r.name == "app.sql")
+    assert "db=chat" in line and "plan=[" in line and "chats" in line
+
+
+def test_assert_max_queries_lists_statements_when_over_budget() -> None:
+    with pytest.raises(AssertionError, match="at most 1 SQL statements, got 2"):
+        with assert_max_queries(1):
+            with SessionLocal() as db:
+                db.execute(text("SELECT 1")).all()
+                db.execute(text("SELECT 2")).all()
@@ -0,0 +1,42 @@
+"""
+Static asset serving tests: compression negotiation, validators and cache policy.
+"""
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_admin_shell_is_gzipped_and_revalidates_with_304() -> None:
+    """
+    The admin page shell is served gzipped on request, and its ETag yields 304 on revalidation.
+    """
+    plain = client.get("/admin/ui", headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["cache-control"] == "no-cache"
+    assert "last-modified" in plain.headers
+
+    gz = client.get("/admin/ui", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers.get("content-encoding") == "gzip"
+    assert gz.content == plain.content  # client transparently decodes
+    assert gz.headers["etag"] != plain.headers["etag"]
+    assert "Accept-Encoding" in gz.headers["vary"]
+
+    again = client.get("/admin/ui", headers={"Accept-Encoding": "gzip", "If-None-Match": gz.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_hashed_assets_are_immutable_and_traversal_is_rejected() -> None:
+    """
+    Fingerprinted build output gets a year-long immutable policy; paths outside the root 404.
+    """
+    r = client.get("/static/assets/index-CIFbwSOb.js")
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert r.headers["content-type"].startswith("application/javascript")
+
+    assert client.get("/static/main.js").headers["cache-control"] == "no-cache"
+    assert client.get("/static/..%2Fapp%2Fmain.py").status_code == 404
+    assert client.get("/static/missing.js").status_code == 404
@@ -0,0 +1,43 @@
+"""
+Stage timing tests: Server-Timing header on /ask, histograms, and the disabled path.
+"""
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import timing
+
+client = TestClient(app)
+
+
+def _ask(monkeypatch, username: str):
+    import app.routers.ask as ask_module
+    monkeypatch.setattr(ask_module, "generate_answer", lambda context, prompt, **_: ("Timed", {"total_tokens": 1}))
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+    reg = client.post("/register", json={"username": username, "password": "pw"})
+    headers = {"Authorization": f"Bearer {reg.json()['access_token']}"}
+    payload = {"user_id": reg.json()["user_id"], "figure_slug": "alexander-the-great", "message": "How long?"}
+    return client.post("/ask", json=payload, headers=headers)
+
+
+def test_ask_emits_server_timing_and_feeds_histograms(monkeypatch) -> None:
+    """
+    /ask reports its stages in Server-Timing and each stage lands in the histograms.
+    """
+    monkeypatch.setenv("TIMING_ENABLED", "true")
+    before = timing.stats().get("prompt_build", {}).get("count", 0)
+    r = _ask(monkeypatch, "timing_user_on")
+    assert r.status_code == 200, r.text
+    names = [part.split(";")[0].strip() for part in r.headers["server-timing"].split(",")]
+    for stage in ("validate_user", "figure_load", "prompt_build", "llm", "persist", "total"):
+        assert stage in names
+    assert timing.stats()["prompt_build"]["count"] == before + 1
+
+
+def test_timing_disabled_sends_no_header(monkeypatch) -> None:
+    """
+    With TIMING_ENABLED=false nothing is recorded and no header is added.
+    """
+    monkeypatch.setenv("TIMING_ENABLED", "false")
+    r = _ask(monkeypatch, "timing_user_off")
+    assert r.status_code == 200, r.text
+    assert "server-timing" not in r.headers
@@ -0,0 +1,50 @@
+"""
+Streaming upload tests: spooling, hashing, and duplicate-file detection.
+"""
+import hashlib
+import io
+import os
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.security import get_admin_user
+from app.utils.uploads import spool_file
+
+
+def test_spool_file_hashes_and_sizes_in_chunks() -> None:
+    """
+    Spools a payload larger than the chunk size and checks digest, size and cleanup.
+    """
+    payload = b"%PDF-1.4\n" + os.urandom(10_000)
+    with spool_file(io.BytesIO(payload), "doc.pdf", chunk_size=1024) as spooled:
+        assert spooled.size == len(payload)
+        assert spooled.sha256 == hashlib.sha256(payload).hexdigest()
+        assert spooled.looks_like_pdf()
+        with open(spooled.path, "rb") as fh:
+            assert fh.read() == payload
+        path = spooled.path
+    assert not os.path.exists(path)
+
+
+def test_figure_upload_skips_duplicate_files() -> None:
+    """
+    Uploads the same text file twice in one request; the second copy is reported as a duplicate.
+    """
+    app.dependency_overrides[get_admin_user] = lambda: None
+    try:
+        client = TestClient(app)
+        body = b"Duplicate detection relies on hashing while streaming. " * 20
+        files = [
+            ("files", ("a.txt", body, "text/plain")),
+            ("files", ("b.txt", body, "text/plain")),
+        ]
+        r = client.post("/admin/rag/figure/upload-test-figure/upload", files=files)
+    finally:
+        app.dependency_overrides.pop(get_admin_user, None)
+    assert r.status_code == 200, r.text
+    results = r.json()["results"]
+    dupes = [x for x in results if x["type"] == "file"]
+    assert len(dupes) == 1
+    assert dupes[0]["ok"] is False
+    assert dupes[0]["sha256"] == hashlib.sha256(body).hexdigest()
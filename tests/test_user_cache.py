@@ -0,0 +1,41 @@
+"""
+Authenticated-user cache tests: hits skip the user query, role changes and deletes evict.
+"""
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app import crud, models, schemas
+from app.database import get_db_chat
+from app.main import app
+from app.utils.security import create_access_token, user_cache
+
+
+def test_cached_user_is_evicted_on_role_change_and_delete() -> None:
+    """
+    Repeated requests hit the cache; updating the role or deleting the user evicts it.
+    """
+    username = f"cache_{uuid.uuid4().hex[:8]}@example.com"
+    gen = app.dependency_overrides.get(get_db_chat, get_db_chat)()
+    db = next(gen)
+    client = TestClient(app)
+    try:
+        user = crud.create_user(db, schemas.UserCreate(username=username, hashed_password="x"))
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+
+        hits = user_cache.hits
+        assert client.get("/auth/me", headers=headers).json()["role"] == "user"
+        assert client.get("/auth/me", headers=headers).json()["role"] == "user"
+        assert user_cache.hits == hits + 1
+
+        user.role = "admin"
+        db.commit()
+        assert client.get("/auth/me", headers=headers).json()["role"] == "admin"
+
+        db.delete(user)
+        db.commit()
+        assert client.get("/auth/me", headers=headers).status_code == 401
+    finally:
+        db.query(models.User).filter_by(username=username).delete()
+        db.commit()
+        gen.close()
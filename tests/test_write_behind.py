@@ -0,0 +1,101 @@
+"""
+Write-behind queue tests: batching, read-your-writes, overflow and flush on stop.
+"""
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+
+from app import crud, models
+from app.database import Base, get_db_chat
+from app.main import app
+from app.services import write_behind
+from app.services.write_behind import WriteBehindQueue
+
+
+def _audit_count(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(models.AuditLog)).scalar_one()
+
+
+def test_queue_batches_overflows_inline_and_flushes_on_stop(tmp_path, monkeypatch) -> None:
+    """
+    Queued rows wait for a flush, overflow writes inline, and stop() drains the queue.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'wb.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setenv("WRITE_BEHIND_MODE", "async")
+    monkeypatch.setenv("WRITE_BEHIND_FLUSH_MS", "60000")
+    monkeypatch.setenv("WRITE_BEHIND_MAX_PENDING", "3")
+    q = WriteBehindQueue()
+    row = {"actor_user_id": 1, "action": "update", "object_type": "test", "object_id": None, "diff_json": None, "ip": None}
+
+    assert q.write(engine, models.AuditLog, [row, row]) is True
+    assert _audit_count(engine) == 0
+    assert q.write(engine, models.AuditLog, [row, row]) is False  # over capacity: written inline
+    assert _audit_count(engine) == 2
+
+    q.stop()
+    assert _audit_count(engine) == 4
+    stats = q.stats()
+    assert stats["flushed_rows"] == 2 and stats["inline_rows"] == 2 and stats["overflow"] == 1
+    assert stats["pending_rows"] == 0
+    engine.dispose()
+
+
+def test_async_ask_defers_messages_but_reads_its_writes(monkeypatch) -> None:
+    """
+    In async mode /ask on an existing thread commits nothing; the next read still sees both messages.
+    """
+    monkeypatch.setenv("WRITE_BEHIND_MODE", "async")
+    monkeypatch.setenv("WRITE_BEHIND_FLUSH_MS", "60000")
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+    import app.routers.ask as ask_module
+    monkeypatch.setattr(ask_module, "generate_answer", lambda context, prompt, **_: ("Deferred", {"total_tokens": 1}))
+
+    client = TestClient(app)
+    reg = client.post("/register", json={"username": f"wb_{uuid.uuid4().hex[:8]}@example.com", "password": "pw"})
+    assert reg.status_code == 200, reg.text
+    user_id = reg.json()["user_id"]
+    headers = {"Authorization": f"Bearer {reg.json()['access_token']}"}
+    thread_id = client.post("/threads", json={"user_id": user_id, "title": "WB"}, headers=headers).json()["thread_id"]
+
+    gen = app.dependency_overrides.get(get_db_chat, get_db_chat)()
+    db = next(gen)
+    engine = db.get_bind()
+    commits = []
+    listener = lambda conn: commits.append(1)  # noqa: E731
+    event.listen(engine, "commit", listener)
+    try:
+        r = client.post("/ask", json={"user_id": user_id, "thread_id": thread_id, "message": "Later?"}, headers=headers)
+        event.remove(engine, "commit", listener)
+        assert r.status_code == 200, r.text
+        assert r.json()["id"] is None
+        assert commits == []
+        assert write_behind.queue.stats()["pending_rows"] == 2
+
+        roles = [m.role for m in crud.get_messages_by_thread(db, thread_id)]
+        assert roles == ["user", "assistant"]
+        assert write_behind.queue.stats()["pending_rows"] == 0
+    finally:
+        if event.contains(engine, "commit", listener):
+            event.remove(engine, "commit", listener)
+        write_behind.queue.flush()
+        gen.close()
+
+
+def test_async_mode_is_refused_with_several_workers(tmp_path, monkeypatch) -> None:
+    """
+    Read-your-writes is per process, so async falls back to sync under multiple workers.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'wb.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setenv("WRITE_BEHIND_MODE", "async")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    q = WriteBehindQueue()
+    row = {"actor_user_id": 1, "action": "update", "object_type": "test", "object_id": None, "diff_json": None, "ip": None}
+
+    assert q.is_async is False
+    assert q.write(engine, models.AuditLog, [row]) is False
+    assert _audit_count(engine) == 1
+    assert q.stats()["mode"] == "sync"